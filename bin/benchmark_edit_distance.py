@@ -0,0 +1,53 @@
+import os
+import sys
+import random
+import timeit
+base = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0,base)
+from corpustools.symbolsim.edit_distance import (banded_edit_distance,
+                                    bit_parallel_edit_distance)
+
+def full_edit_distance(s1, s2):
+    #The edit distance as calculated before banding and bit vectors
+    if len(s1) >= len(s2):
+        longer = s1
+        shorter = s2
+    else:
+        longer = s2
+        shorter = s1
+    previous_row = range(len(shorter) + 1)
+    for i, c1 in enumerate(longer):
+        current_row = [i + 1]
+        for j, c2 in enumerate(shorter):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+    return previous_row[-1]
+
+def random_pairs(num_pairs, min_length, max_length, num_segments = 40, seed = 0):
+    r = random.Random(seed)
+    def sequence():
+        return tuple(r.randint(1, num_segments)
+                    for _ in range(r.randint(min_length, max_length)))
+    return [(sequence(), sequence()) for _ in range(num_pairs)]
+
+def bit_parallel(s1, s2):
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    if not s1:
+        return len(s2)
+    return bit_parallel_edit_distance(s1, s2)
+
+if __name__ == '__main__':
+    functions = [('full', full_edit_distance),
+                ('banded (k=1)', lambda s1, s2: banded_edit_distance(s1, s2, 1)),
+                ('banded (k=2)', lambda s1, s2: banded_edit_distance(s1, s2, 2)),
+                ('bit-parallel', bit_parallel)]
+    for min_length, max_length in [(2, 8), (8, 16), (32, 64)]:
+        pairs = random_pairs(2000, min_length, max_length)
+        print('Sequences of {} to {} segments:'.format(min_length, max_length))
+        for name, function in functions:
+            t = timeit.timeit(lambda: [function(s1, s2) for s1, s2 in pairs], number = 3) / 3
+            print('    {:<14}{:.2f} us per pair'.format(name, t / len(pairs) * 1e6))
@@ -0,0 +1,179 @@
+import os
+import hashlib
+
+from numpy import load, save
+
+DEFAULT_CACHE_SIZE = 500 * 1024 * 1024
+
+class RepresentationCache(object):
+    """Cache of the representations of .wav files in a directory, so that
+    they are only computed once across runs.
+
+    Each representation is kept in a .npy file named for a hash of the
+    contents of the .wav file and the parameters of the representation,
+    so that editing or replacing the file, or changing any parameter,
+    leads to a new entry.  Reading an entry marks it as recently used, and
+    once the files of the cache take up more than `max_size` bytes, the
+    least recently used ones are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Full path of the directory to keep the representations in, it is
+        created if it does not exist.
+    max_size : int, optional
+        Maximum total size in bytes of the files of the cache, defaults
+        to 500 MB.
+
+    """
+    def __init__(self, directory, max_size = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._hashes = dict()
+        self._size = None
+
+    def file_hash(self, path):
+        """Returns a hash of the contents of a file, which is only computed
+        again if the file has changed since"""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        if key not in self._hashes:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+    def entry_path(self, path, params):
+        """
+        Get the path of the entry of a .wav file
+
+        Parameters
+        ----------
+        path : str
+            Full path of the .wav file.
+        params : dict
+            Parameters of the representation.
+
+        Returns
+        -------
+        str
+            Full path of the .npy file of the entry.
+
+        """
+        digest = hashlib.sha1()
+        digest.update(self.file_hash(path).encode('utf-8'))
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+        return os.path.join(self.directory, digest.hexdigest() + '.npy')
+
+    def get(self, path, params):
+        """
+        Get the cached representation of a .wav file
+
+        Parameters
+        ----------
+        path : str
+            Full path of the .wav file.
+        params : dict
+            Parameters of the representation.
+
+        Returns
+        -------
+        2D array
+            The representation, or None if it is not in the cache.
+
+        """
+        entry = self.entry_path(path, params)
+        try:
+            rep = load(entry, allow_pickle = False)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return rep
+
+    def put(self, path, params, rep):
+        """
+        Add the representation of a .wav file to the cache, and remove the
+        least recently used entries if the cache is too big
+
+        Parameters
+        ----------
+        path : str
+            Full path of the .wav file.
+        params : dict
+            Parameters of the representation.
+        rep : 2D array
+            The representation.
+
+        """
+        entry = self.entry_path(path, params)
+        #Written to a temporary file first, so that other runs never read
+        #a partial entry
+        temp_path = entry[:-4] + '.{}.tmp'.format(os.getpid())
+        with open(temp_path, 'wb') as f:
+            save(f, rep, allow_pickle = False)
+        os.replace(temp_path, entry)
+        #The size of the directory is only checked again once the entries
+        #added since the last check could have made it too big
+        if self._size is None:
+            self.evict()
+        else:
+            self._size += os.path.getsize(entry)
+            if self._size > self.max_size:
+                self.evict()
+
+    def load(self, path, params, to_rep):
+        """
+        Get the representation of a .wav file from the cache, computing and
+        adding it if it is not there
+
+        Parameters
+        ----------
+        path : str
+            Full path of the .wav file.
+        params : dict
+            Parameters of the representation.
+        to_rep : callable
+            Function that computes the representation from the path.
+
+        Returns
+        -------
+        2D array
+            The representation.
+
+        """
+        rep = self.get(path, params)
+        if rep is None:
+            rep = to_rep(path)
+            self.put(path, params, rep)
+        return rep
+
+    def evict(self):
+        """Removes the least recently used entries until the files of the
+        cache take up at most `max_size` bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+            total += stat.st_size
+        for mtime, name, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+        self._size = total
@@ -1,7 +1,12 @@
-import operator
-from numpy import (zeros, floor, sqrt, sum, correlate, argmax, abs,inf)
+from numpy import (zeros, floor, sqrt, sum, correlate, argmax, abs,inf,
+                    full, cumsum, arange, minimum, maximum, pad)
 
-from scipy.spatial.distance import euclidean
+from scipy.spatial.distance import cdist
+from scipy.ndimage import minimum_filter1d, maximum_filter1d
+
+#Relative margin added to thresholds, so that rounding errors in
+#unnormalizing them never abandon a path exactly at the threshold
+BOUND_TOLERANCE = 1e-9
 
 def xcorr_distance(rep_one,rep_two):
     """Computes the cross-correlation distance between two representations
@@ -47,7 +52,7 @@ def xcorr_distance(rep_one,rep_two):
     matchVal = abs(matchSum[maxInd]/num_features)
     return 1/matchVal
 
-def dtw_distance(rep_one, rep_two,norm=True):
+def dtw_distance(rep_one, rep_two,norm=True,window=None,threshold=None):
     """Computes the distance between two representations with the same
     number of filters using Dynamic Time Warping.
 
@@ -59,17 +64,28 @@ def dtw_distance(rep_one, rep_two,norm=True):
     rep_two : 2D array
         Second representation to compare. First dimension is time in frames
         or samples and second dimension is the features.
+    norm : bool, optional
+        If true (default), the distance is divided by the total number of
+        frames of the two representations.
+    window : int, optional
+        Width in frames of a Sakoe-Chiba band around the diagonal that the
+        warping path has to stay in, widened to the difference in length
+        of the representations if needed.  Defaults to no band.
+    threshold : float, optional
+        Distance above which the calculation is abandoned.  Defaults to
+        no threshold.
 
     Returns
     -------
     float
-        Distance of dynamically time warping `rep_one` to `rep_two`.
+        Distance of dynamically time warping `rep_one` to `rep_two`,
+        infinite if it is above `threshold`.
 
     """
 
     assert(rep_one.shape[1] == rep_two.shape[1])
     distMat = generate_distance_matrix(rep_one,rep_two)
-    return regularDTW(distMat,norm=norm)
+    return regularDTW(distMat,norm=norm,window=window,threshold=threshold)
 
 def generate_distance_matrix(source,target):
     """Generates a local distance matrix for use in dynamic time warping.
@@ -88,52 +104,161 @@ def generate_distance_matrix(source,target):
 
     """
 
-    sLen = source.shape[0]
-    tLen = target.shape[0]
-    distMat = zeros((sLen,tLen))
-    for i in range(sLen):
-        for j in range(tLen):
-            distMat[i,j] = euclidean(source[i,:],target[j,:])
-    return distMat
+    return cdist(source,target,'euclidean')
 
-def regularDTW(distMat,norm=True):
+def regularDTW(distMat,norm=True,window=None,threshold=None):
     """Use a local distance matrix to perform dynamic time warping.
 
+    Cells of the cost matrix only depend on cells of the two anti-diagonals
+    before them, so the cost matrix is filled one anti-diagonal at a time.
+
     Parameters
     ----------
     distMat : 2D array
         Local distance matrix.
+    norm : bool, optional
+        If true (default), the distance is divided by the sum of the
+        dimensions of the local distance matrix.
+    window : int, optional
+        Width of a Sakoe-Chiba band around the diagonal that the path has
+        to stay in, widened to the difference between the dimensions of the
+        local distance matrix if needed.  Defaults to no band.
+    threshold : float, optional
+        Distance (normalized if `norm` is true) above which the calculation
+        is abandoned, once every path to the end costs more than it.
+        Defaults to no threshold.
 
     Returns
     -------
     float
         Total unweighted distance of the optimal path through the
-        local distance matrix.
+        local distance matrix, infinite if it is above `threshold`.
 
     """
     sLen,tLen = distMat.shape
-    totalDistance = zeros((sLen,tLen))
-    totalDistance[0:sLen,0:tLen] = distMat
+    if window is None:
+        window = max(sLen,tLen)
+    else:
+        window = max(window,abs(sLen-tLen))
+    limit = inf
+    if threshold is not None:
+        limit = threshold
+        if norm:
+            limit = threshold * (sLen+tLen)
+        limit += BOUND_TOLERANCE * (abs(limit) + 1)
 
-    minDirection = zeros((sLen,tLen))
+    totalDistance = full((sLen,tLen),inf)
+    rows = min(sLen,window+1)
+    cols = min(tLen,window+1)
+    totalDistance[:rows,0] = cumsum(distMat[:rows,0])
+    totalDistance[0,:cols] = cumsum(distMat[0,:cols])
 
-    for i in range(1,sLen):
-        totalDistance[i,0] = totalDistance[i,0] + totalDistance[i-1,0]
+    #Every path goes through one of any two consecutive anti-diagonals,
+    #so it costs at least the smaller of their minimums
+    previousMin = totalDistance[0,0]
+    for k in range(1,sLen+tLen-1):
+        start = max(1,k-tLen+1,(k-window+1)//2)
+        end = min(sLen-1,k-1,(k+window)//2)
+        i = arange(start,end+1)
+        j = k - i
+        local = distMat[i,j]
+        totalDistance[i,j] = minimum(minimum(totalDistance[i-1,j-1] + 2*local,
+                                            totalDistance[i-1,j] + local),
+                                    totalDistance[i,j-1] + local)
+        if limit < inf:
+            currentMin = totalDistance[i,j].min() if len(i) else inf
+            if k < rows:
+                currentMin = min(currentMin,totalDistance[k,0])
+            if k < cols:
+                currentMin = min(currentMin,totalDistance[0,k])
+            if min(previousMin,currentMin) > limit:
+                return inf
+            previousMin = currentMin
+    distance = totalDistance[sLen-1,tLen-1]
+    if distance > limit:
+        return inf
+    if norm:
+        return distance / (sLen+tLen)
+    return distance
 
-    for j in range(1,tLen):
-        totalDistance[0,j] = totalDistance[0,j] + totalDistance[0,j-1]
+def lb_kim(rep_one, rep_two, norm=True):
+    """Computes a lower bound of the Dynamic Time Warping distance between
+    two representations from their first and last frames, which every
+    warping path goes through.
 
+    Parameters
+    ----------
+    rep_one : 2D array
+        First representation to compare. First dimension is time in frames
+        or samples and second dimension is the features.
+    rep_two : 2D array
+        Second representation to compare. First dimension is time in frames
+        or samples and second dimension is the features.
+    norm : bool, optional
+        If true (default), the bound is normalized like `dtw_distance`.
 
+    Returns
+    -------
+    float
+        Lower bound of `dtw_distance` between `rep_one` and `rep_two`.
 
-    for i in range(1,sLen):
-        for j in range(1,tLen):
-            #direction,minPrevDistance = min(enumerate([totalDistance[i,j],totalDistance[i,j+1],totalDistance[i+1,j]]), key=operator.itemgetter(1))
-            #totalDistance[i+1,j+1] = totalDistance[i+1,j+1] + minPrevDistance
-            #minDirection[i,j] = direction
-            minDirection[i,j],totalDistance[i,j] = min(enumerate([totalDistance[i-1,j-1] + 2*totalDistance[i,j],
-                                                            totalDistance[i-1,j] + totalDistance[i,j],
-                                                            totalDistance[i,j-1] + totalDistance[i,j]]), key=operator.itemgetter(1))
+    """
+    sLen = rep_one.shape[0]
+    tLen = rep_two.shape[0]
+    bound = sqrt(sum((rep_one[0,:] - rep_two[0,:])**2))
+    if sLen > 1 or tLen > 1:
+        bound += sqrt(sum((rep_one[-1,:] - rep_two[-1,:])**2))
     if norm:
-        return totalDistance[sLen-1,tLen-1] / (sLen+tLen)
-    return totalDistance[sLen-1,tLen-1]
+        return bound / (sLen+tLen)
+    return bound
+
+def lb_keogh(rep_one, rep_two, window=None, norm=True):
+    """Computes a lower bound of the Dynamic Time Warping distance between
+    two representations from the envelope of `rep_two` around each frame
+    of `rep_one`.
 
+    Every frame of `rep_one` is matched to at least one frame of `rep_two`
+    within the band, so the distance of each frame to the box of the
+    minimum and maximum of every feature of those frames adds up to a
+    lower bound.
+
+    Parameters
+    ----------
+    rep_one : 2D array
+        First representation to compare. First dimension is time in frames
+        or samples and second dimension is the features.
+    rep_two : 2D array
+        Second representation to compare. First dimension is time in frames
+        or samples and second dimension is the features.
+    window : int, optional
+        Width of the Sakoe-Chiba band, as for `dtw_distance`.  Defaults
+        to no band.
+    norm : bool, optional
+        If true (default), the bound is normalized like `dtw_distance`.
+
+    Returns
+    -------
+    float
+        Lower bound of `dtw_distance` between `rep_one` and `rep_two` with
+        the same `window`.
+
+    """
+    sLen = rep_one.shape[0]
+    tLen = rep_two.shape[0]
+    if window is None or window >= max(sLen,tLen):
+        lower = rep_two.min(axis=0)
+        upper = rep_two.max(axis=0)
+    else:
+        window = max(window,abs(sLen-tLen))
+        #Repeating the last frame stands in for the frames of rep_one
+        #past the end of rep_two, whose bands end at the last frame
+        padded = pad(rep_two,((window,window+max(0,sLen-tLen)),(0,0)),mode='edge')
+        size = 2*window+1
+        lower = minimum_filter1d(padded,size,axis=0)[window:window+sLen]
+        upper = maximum_filter1d(padded,size,axis=0)[window:window+sLen]
+    above = maximum(rep_one - upper,0)
+    below = maximum(lower - rep_one,0)
+    bound = sum(sqrt(sum(above**2 + below**2,axis=1)))
+    if norm:
+        return bound / (sLen+tLen)
+    return bound
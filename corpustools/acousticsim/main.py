@@ -1,14 +1,52 @@
 import os
-from numpy import zeros
+import bisect
+from numpy import zeros, inf
 
 from functools import partial
 from corpustools.acousticsim.representations import to_envelopes, to_mfcc
-from corpustools.acousticsim.distance_functions import dtw_distance, xcorr_distance
+from corpustools.acousticsim.distance_functions import (dtw_distance, xcorr_distance,
+                                                        lb_kim, lb_keogh)
+from corpustools.acousticsim.cache import RepresentationCache, DEFAULT_CACHE_SIZE
 
 
 class AcousticSimError(Exception):
     pass
 
+def _rep_params(**kwargs):
+    params = {'rep': kwargs.get('rep', 'mfcc'),
+            'num_filters': kwargs.get('num_filters', None),
+            'num_coeffs': kwargs.get('num_coeffs', 20),
+            'freq_lims': tuple(kwargs.get('freq_lims', (80, 7800))),
+            'win_len': kwargs.get('win_len', 0.025),
+            'time_step': kwargs.get('time_step', 0.01),
+            'use_power': kwargs.get('use_power', True)}
+    if params['num_filters'] is None:
+        if params['rep'] == 'envelopes':
+            params['num_filters'] = 8
+        else:
+            params['num_filters'] = 26
+    #Settings that envelopes do not use
+    if params['rep'] == 'envelopes':
+        for k in ['num_coeffs', 'win_len', 'time_step', 'use_power']:
+            del params[k]
+    return params
+
+def _build_rep_loader(**kwargs):
+    to_rep = _build_to_rep(**kwargs)
+    params = _rep_params(**kwargs)
+    cache = kwargs.get('cache', None)
+    if isinstance(cache, str):
+        cache = RepresentationCache(cache, kwargs.get('cache_size', DEFAULT_CACHE_SIZE))
+    reps = dict()
+    def load_rep(path):
+        if path not in reps:
+            if cache is None:
+                reps[path] = to_rep(path)
+            else:
+                reps[path] = cache.load(path, params, to_rep)
+        return reps[path]
+    return load_rep
+
 def _build_to_rep(**kwargs):
     rep = kwargs.get('rep', 'mfcc')
 
@@ -76,9 +114,25 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
         A tuple of the minimum frequency and maximum frequency in Hertz to use
         for computing representations.  Defaults to (80, 7800) following
         Lewandowski's dissertation (2012).
+    window : int, optional
+        Width in frames of the Sakoe-Chiba band that limits how far Dynamic
+        Time Warping can stretch one representation against the other
+        (only used for 'dtw').  Defaults to no band.
+    threshold : float, optional
+        Distance above which Dynamic Time Warping is abandoned and the
+        distance is infinite (a similarity of 0), for skipping mappings
+        that are too far apart (only used for 'dtw').  Defaults to no
+        threshold.
     output_sim : bool, optional
         If true (default), the function will return similarities (inverse distance).
         If false, distance measures will be returned instead.
+    cache : str or RepresentationCache, optional
+        Directory (or RepresentationCache) to keep the representations of
+        the files in, so that they are not computed again in later runs.
+        Defaults to computing them for every run.
+    cache_size : int, optional
+        Maximum size in bytes of the cache directory, after which the least
+        recently used representations are removed.  Defaults to 500 MB.
     verbose : bool, optional
         If true, command line progress will be displayed after every 50
         mappings have been processed.  Defaults to false.
@@ -94,20 +148,19 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
 
     stop_check = kwargs.get('stop_check',None)
     call_back = kwargs.get('call_back',None)
-    to_rep = _build_to_rep(**kwargs)
+    load_rep = _build_rep_loader(**kwargs)
 
     num_cores = kwargs.get('num_cores', 1)
     output_sim = kwargs.get('output_sim', True)
 
     match_function = kwargs.get('match_function', 'dtw')
-    cache = kwargs.get('cache',None)
     if match_function == 'xcorr':
         dist_func = xcorr_distance
     elif match_function == 'dct':
         dist_func = dct_distance
     else:
-        dist_func = dtw_distance
-    cache = dict()
+        dist_func = partial(dtw_distance, window = kwargs.get('window', None),
+                            threshold = kwargs.get('threshold', None))
     asim = dict()
     if call_back is not None:
         call_back('Calculating acoustic similarity...')
@@ -121,17 +174,9 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
             if cur % 2 == 0:
                 call_back(cur)
         basetup = tuple(os.path.basename(x) for x in pm)
-        allgood = False
-        for filepath in pm:
-            if not filepath.lower().endswith('.wav'):
-                break
-            if filepath not in cache:
-                cache[os.path.basename(filepath)] = to_rep(filepath)
-        else:
-            allgood = True
-        if not allgood:
+        if not all(filepath.lower().endswith('.wav') for filepath in pm):
             continue
-        dist_val = dist_func(cache[basetup[0]],cache[basetup[1]])
+        dist_val = dist_func(load_rep(pm[0]),load_rep(pm[1]))
         if output_sim:
             try:
                 dist_val = 1/dist_val
@@ -142,6 +187,133 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
         raise(AcousticSimError("The path mapping does not contain any wav files"))
     return asim
 
+def acoustic_nearest_neighbors(query_paths, candidate_paths = None, **kwargs):
+    """Finds the closest .wav files to each of a set of .wav files by
+    Dynamic Time Warping, without computing the full distance for every
+    pair.
+
+    Candidates are checked in order of a lower bound of their distance from
+    the first and last frames (LB_Kim), and are skipped once the bound is
+    no better than the current k-th closest file.  The remaining ones are
+    skipped if a lower bound from the envelopes of the representations
+    (LB_Keogh) is no better, and otherwise their distance is computed,
+    abandoning it once it gets worse than the k-th closest file.
+
+    Parameters
+    ----------
+    query_paths : list
+        Full paths of the .wav files to find the closest files to.
+    candidate_paths : list, optional
+        Full paths of the .wav files to look for them in, defaults to
+        `query_paths`.  Files are never compared to themselves.
+    num_neighbors : int, optional
+        Number of closest files to find for each file, defaults to 1.
+    rep : {'envelopes','mfcc'}, optional
+        The type of representation to convert the wav files into before
+        comparing for similarity.  Amplitude envelopes will be computed
+        when 'envelopes' is specified, and MFCCs will be computed when
+        'mfcc' is specified.
+    num_filters : int, optional
+        The number of frequency filters to use when computing representations.
+        Defaults to 8 for amplitude envelopes and 26 for MFCCs.
+    num_coeffs : int, optional
+        The number of coefficients to use for MFCCs (not used for
+        amplitude envelopes).  Default is 20, which captures speaker-
+        specific information, whereas 12 would be more speaker-independent.
+    freq_lims : tuple, optional
+        A tuple of the minimum frequency and maximum frequency in Hertz to use
+        for computing representations.  Defaults to (80, 7800) following
+        Lewandowski's dissertation (2012).
+    window : int, optional
+        Width in frames of the Sakoe-Chiba band that limits how far Dynamic
+        Time Warping can stretch one representation against the other.
+        Defaults to no band.
+    output_sim : bool, optional
+        If true (default), the function will return similarities (inverse distance).
+        If false, distance measures will be returned instead.
+    cache : str or RepresentationCache, optional
+        Directory (or RepresentationCache) to keep the representations of
+        the files in, so that they are not computed again in later runs.
+        Defaults to computing them for every run.
+    cache_size : int, optional
+        Maximum size in bytes of the cache directory, after which the least
+        recently used representations are removed.  Defaults to 500 MB.
+
+    Returns
+    -------
+    dict
+        The closest files to each file, keyed by file name, as lists of
+        tuples of a file name and its similarity/distance, closest first.
+    dict
+        Number of comparisons ('comparisons'), of those skipped by
+        LB_Kim ('lb_kim') and by LB_Keogh ('lb_keogh'), of those abandoned
+        during Dynamic Time Warping or no closer than the k-th closest
+        file ('abandoned') and of those that were closer ('dtw').
+
+    """
+    stop_check = kwargs.get('stop_check',None)
+    call_back = kwargs.get('call_back',None)
+    get_rep = _build_rep_loader(**kwargs)
+
+    num_neighbors = kwargs.get('num_neighbors', 1)
+    window = kwargs.get('window', None)
+    output_sim = kwargs.get('output_sim', True)
+
+    if candidate_paths is None:
+        candidate_paths = query_paths
+    query_paths = [x for x in query_paths if x.lower().endswith('.wav')]
+    candidate_paths = [x for x in candidate_paths if x.lower().endswith('.wav')]
+    if len(query_paths) == 0 or len(candidate_paths) == 0:
+        raise(AcousticSimError("There are no wav files to compare"))
+
+    stats = {'comparisons': 0, 'lb_kim': 0, 'lb_keogh': 0, 'abandoned': 0, 'dtw': 0}
+    neighbors = dict()
+    if call_back is not None:
+        call_back('Finding nearest neighbors...')
+        call_back(0,len(query_paths))
+    for cur, query in enumerate(query_paths):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            call_back(cur)
+        query_rep = get_rep(query)
+        bounds = sorted((lb_kim(query_rep, get_rep(x)), x)
+                        for x in candidate_paths if x != query)
+        best = []
+        for bound, candidate in bounds:
+            stats['comparisons'] += 1
+            kth = best[-1][0] if len(best) == num_neighbors else inf
+            if bound >= kth:
+                stats['lb_kim'] += 1
+                continue
+            candidate_rep = get_rep(candidate)
+            bound = max(lb_keogh(query_rep, candidate_rep, window),
+                        lb_keogh(candidate_rep, query_rep, window))
+            if bound >= kth:
+                stats['lb_keogh'] += 1
+                continue
+            dist_val = dtw_distance(query_rep, candidate_rep, window = window,
+                                    threshold = kth if kth < inf else None)
+            if dist_val >= kth:
+                stats['abandoned'] += 1
+                continue
+            stats['dtw'] += 1
+            bisect.insort(best, (float(dist_val), candidate))
+            del best[num_neighbors:]
+        results = list()
+        for dist_val, candidate in best:
+            if output_sim:
+                try:
+                    dist_val = 1/dist_val
+                except ZeroDivisionError:
+                    dist_val = 1
+            results.append((os.path.basename(candidate), dist_val))
+        neighbors[os.path.basename(query)] = results
+    if call_back is not None and stats['comparisons']:
+        call_back('Skipped Dynamic Time Warping for {:.0%} of comparisons'.format(
+                    (stats['comparisons'] - stats['dtw']) / stats['comparisons']))
+    return neighbors, stats
+
 def acoustic_similarity_directories(directory_one,directory_two,**kwargs):
     """Computes acoustic similarity across two directories of .wav files.
 
@@ -177,18 +349,40 @@ def acoustic_similarity_directories(directory_one,directory_two,**kwargs):
         A tuple of the minimum frequency and maximum frequency in Hertz to use
         for computing representations.  Defaults to (80, 7800) following
         Lewandowski's dissertation (2012).
+    window : int, optional
+        Width in frames of the Sakoe-Chiba band that limits how far Dynamic
+        Time Warping can stretch one representation against the other
+        (only used for 'dtw').  Defaults to no band.
+    threshold : float, optional
+        Distance above which Dynamic Time Warping is abandoned and the
+        distance is infinite (a similarity of 0), for skipping mappings
+        that are too far apart (only used for 'dtw').  Defaults to no
+        threshold.
     output_sim : bool, optional
         If true (default), the function will return similarities (inverse distance).
         If false, distance measures will be returned instead.
+    cache : str or RepresentationCache, optional
+        Directory (or RepresentationCache) to keep the representations of
+        the files in, so that they are not computed again in later runs.
+        Defaults to computing them for every run.
+    cache_size : int, optional
+        Maximum size in bytes of the cache directory, after which the least
+        recently used representations are removed.  Defaults to 500 MB.
     verbose : bool, optional
         If true, command line progress will be displayed after every 50
         mappings have been processed.  Defaults to false.
+    num_neighbors : int, optional
+        If specified, the closest files in the second directory to each
+        file in the first one are found with `acoustic_nearest_neighbors`
+        and returned instead.
 
     Returns
     -------
-    float
+    float or tuple
         Average distance/similarity of all the comparisons that were done
-        between the two directories.
+        between the two directories.  If `num_neighbors` is specified, the
+        two dicts returned by `acoustic_nearest_neighbors` are returned
+        instead as a tuple of the closest files and the statistics.
 
     """
 
@@ -201,6 +395,10 @@ def acoustic_similarity_directories(directory_one,directory_two,**kwargs):
     files_two = [x for x in os.listdir(directory_two) if x.lower().endswith('.wav')]
     if len(files_two) == 0:
         raise(AcousticSimError("The second directory does not contain any wav files"))
+    if kwargs.get('num_neighbors', None) is not None:
+        return acoustic_nearest_neighbors([os.path.join(directory_one,x) for x in files_one],
+                                        [os.path.join(directory_two,x) for x in files_two],
+                                        **kwargs)
     if call_back is not None:
         call_back('Mapping directories...')
         call_back(0,len(files_one)*len(files_two))
@@ -280,6 +478,31 @@ def analyze_directories(directories, **kwargs):
     return result
 
 def analyze_directory(directory, **kwargs):
+    """Computes acoustic similarity between all the .wav files in a
+    directory, or in its subdirectories if it does not contain any.
+
+    Parameters
+    ----------
+    directory : str
+        Full path to the directory.
+    num_neighbors : int, optional
+        If specified, the closest files to each .wav file in the directory
+        are found with `acoustic_nearest_neighbors` and returned instead.
+        Not used when the files are in subdirectories.
+
+    Other keyword arguments are passed on to `acoustic_similarity_mapping`
+    or `acoustic_nearest_neighbors`.
+
+    Returns
+    -------
+    list of tuples or tuple
+        List of tuples of the two file paths and their similarity/distance,
+        for every pair of different files.  If `num_neighbors` is
+        specified, the two dicts returned by `acoustic_nearest_neighbors`
+        are returned instead as a tuple of the closest files and the
+        statistics.
+
+    """
     stop_check = kwargs.get('stop_check',None)
     call_back = kwargs.get('call_back',None)
 
@@ -295,6 +518,8 @@ def analyze_directory(directory, **kwargs):
             directories.append(f)
     if not wavs:
         return analyze_directories(directories, **kwargs)
+    if kwargs.get('num_neighbors', None) is not None:
+        return acoustic_nearest_neighbors(wavs, **kwargs)
 
 
     if call_back is not None:
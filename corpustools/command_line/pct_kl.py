@@ -6,7 +6,7 @@ from codecs import open
 
 from corpustools.corpus.classes import Corpus
 from corpustools.corpus.io import load_binary
-from corpustools.kl.kl import KullbackLeibler
+from corpustools.kl.kl import KullbackLeibler, all_pairs_kl
 from corpustools.contextmanagers import *
 
 def main():
@@ -14,9 +14,10 @@ def main():
     #### Parse command-line arguments
     parser = argparse.ArgumentParser(description = 'Phonological CorpusTools: Kullback-Leibler CL interface')
     parser.add_argument('corpus_file_name', help='Path to corpus file. This can just be the file name if it\'s in the same directory as CorpusTools')
-    parser.add_argument('seg1', help='First segment')
-    parser.add_argument('seg2', help='Second segment')
+    parser.add_argument('seg1', nargs='?', help='First segment')
+    parser.add_argument('seg2', nargs='?', help='Second segment')
     parser.add_argument('side', help='Context to check. Options are \'right\', \'left\' and \'both\'. You can enter just the first letter.')
+    parser.add_argument('-l', '--all_pairs', action='store_true', help='Calculate KL for every pair of segments in the inventory instead of seg1 and seg2, ranked from the highest to the lowest KL')
     parser.add_argument('-s', '--sequence_type', default='transcription', help="The attribute of Words to calculate KL over. Normally this will be the transcription, but it can also be the spelling or a user-specified tier.")
     parser.add_argument('-t', '--type_or_token', default='token', help='Specifies whether entropy is based on type or token frequency.')
     parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
@@ -40,8 +41,6 @@ def main():
     elif args.context_type == 'Weighted':
         corpus = WeightedVariantContext(corpus, args.sequence_type, args.type_or_token)
 
-    results = KullbackLeibler(corpus, args.seg1, args.seg2, args.side, outfile=None)
-
     outfile = args.outfile
     if outfile is not None:
         if not os.path.isfile(outfile):
@@ -49,17 +48,29 @@ def main():
         if not outfile.endswith('.txt'):
             outfile += '.txt'
 
+    if args.all_pairs:
+        results = all_pairs_kl(corpus, args.side)
+        header = 'Seg1,Seg2,Seg1 entropy,Seg2 entropy,KL,Possible UR,Spurious UR'
+        if outfile is not None:
+            with open(outfile, mode='w', encoding='utf-8') as f:
+                print(header, file=f)
+                for r in results:
+                    print(','.join([str(x) for x in r]), file=f)
+            print('Done!')
+        else:
+            print(header)
+            for r in results:
+                print(','.join([str(x) for x in r]))
+        return
+    elif args.seg1 is None or args.seg2 is None:
+        raise Exception('Please provide two segments, or use the option -l to calculate KL for all pairs of segments.')
+
+    results = KullbackLeibler(corpus, args.seg1, args.seg2, args.side, outfile=None)
+
+    if outfile is not None:
         with open(outfile, mode='w', encoding='utf-8') as f:
-            print('Seg1,Seg2,Seg1 entropy,Seg2 entropy,Possible UR, Spurious UR\n\r',file=f)
+            print('Seg1 entropy,Seg2 entropy,KL,Possible UR,Spurious UR\n\r',file=f)
             print(','.join([str(r) for r in results]), file=f)
-            print('\n\rContext,Context frequency,{} frequency in context,{} frequency in context\n\r'.format(seg1,seg2), file=f)
-            for context,result in allC.items():
-                cfrequency = freq_c[context]/totalC
-                print('{},{},{},{}\n\r'.format(context,
-                                cfrequency,
-                                result.seg1/result.sum(),
-                                result.seg2/result.sum()),
-                        file=f)
         print('Done!')
 
     else:
@@ -17,6 +17,7 @@ def main():
     group.add_argument('-q', '--query', help='bigram or segment pair, as str separated by comma')
     group.add_argument('-l', '--all_pairwise_mis', action='store_true', help="Calculate MI for all orders of all pairs of segments")
     parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
+    parser.add_argument('-t', '--type_or_token', default='type', help="If 'type', unigram and bigram probabilities are based on type frequencies. If 'token', they are based on token frequencies.")
     parser.add_argument('-s', '--sequence_type', default='transcription', help="The attribute of Words to calculate MI over. Normally this will be the transcription, but it can also be the spelling or a user-specified tier.")
     parser.add_argument('-w', '--in_word', action='store_true', help="Flag: domain for counting unigrams/bigrams set to the word rather than the unigram/bigram; ignores adjacency and word edges (#)")
     parser.add_argument('-e', '--halve_edges', action='store_true', help="Flag: make the number of edge characters (#) equal to the size of the corpus + 1, rather than double the size of the corpus - 1")
@@ -28,13 +29,13 @@ def main():
 
     corpus = load_binary(args.corpus_file_name)
     if args.context_type == 'Canonical':
-        corpus = CanonicalVariantContext(corpus, args.sequence_type)
+        corpus = CanonicalVariantContext(corpus, args.sequence_type, args.type_or_token)
     elif args.context_type == 'MostFrequent':
-        corpus = MostFrequentVariantContext(corpus, args.sequence_type)
+        corpus = MostFrequentVariantContext(corpus, args.sequence_type, args.type_or_token)
     elif args.context_type == 'SeparatedTokens':
-        corpus = SeparatedTokensVariantContext(corpus, args.sequence_type)
+        corpus = SeparatedTokensVariantContext(corpus, args.sequence_type, args.type_or_token)
     elif args.context_type == 'Weighted':
-        corpus = WeightedVariantContext(corpus, args.sequence_type)
+        corpus = WeightedVariantContext(corpus, args.sequence_type, args.type_or_token)
 
 
     if args.all_pairwise_mis:
@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+
+from corpustools.corpus.io.binary import load_binary
+from corpustools.phonoprob.phonotactic_probability import iter_phonotactic_probability
+from corpustools.contextmanagers import *
+
+
+def split_query(query, trans_delimiter):
+    if trans_delimiter == '':
+        return list(query)
+    return query.split(trans_delimiter)
+
+
+def iter_queries_file(path):
+    #Queries are the first column of each line, read one line at a time
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            yield line.split('\t')[0]
+
+
+def main():
+
+    #### Parse command-line arguments
+    parser = argparse.ArgumentParser(description = \
+             'Phonological CorpusTools: phonotactic probability CL interface')
+    parser.add_argument('corpus_file_name', help='Name of corpus file')
+    parser.add_argument('query', help='Word to score, or name of file with a word to score on each line')
+    parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
+    parser.add_argument('-a', '--algorithm', default='vitevitch', help="The algorithm of phonotactic probability to use, currently only 'vitevitch'")
+    parser.add_argument('-p', '--probability_type', default='unigram', help="Either 'unigram' or 'bigram' probability")
+    parser.add_argument('-s', '--sequence_type', default = 'transcription', help="The name of the tier on which to calculate probabilities")
+    parser.add_argument('-w', '--count_what', default ='type', help="If 'type', probabilities are based on type frequencies. If 'token', they are based on token frequencies.")
+    parser.add_argument('-e', '--trans_delimiter', default='', help="If not empty string, splits each query by this str to make its transcription/spelling list, otherwise each character is a segment.")
+    parser.add_argument('-b', '--batch_size', type=int, default=1000, help='Number of words to score at once')
+    parser.add_argument('-j', '--num_cores', type=int, default=-1, help='Number of processes to use, -1 to use no multiprocessing')
+    parser.add_argument('-o', '--outfile', help='Name of output file, scores are written to standard output if not given')
+
+    args = parser.parse_args()
+
+    ####
+
+    corpus = load_binary(args.corpus_file_name)
+    if args.context_type == 'Canonical':
+        corpus = CanonicalVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'MostFrequent':
+        corpus = MostFrequentVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'SeparatedTokens':
+        corpus = SeparatedTokensVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'Weighted':
+        corpus = WeightedVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+
+    if os.path.isfile(args.query):
+        queries = iter_queries_file(args.query)
+    else:
+        queries = [args.query]
+
+    #Queries are read, scored and written in batches, so memory use does
+    #not grow with the number of queries
+    results = iter_phonotactic_probability(corpus,
+                            (split_query(q, args.trans_delimiter) for q in queries),
+                            algorithm = args.algorithm,
+                            probability_type = args.probability_type,
+                            batch_size = args.batch_size,
+                            num_cores = args.num_cores)
+
+    if args.outfile:
+        outfile = open(args.outfile, 'w', encoding='utf-8')
+    else:
+        outfile = sys.stdout
+    try:
+        for query, score, missing in results:
+            if args.trans_delimiter == '':
+                query = ''.join(query)
+            else:
+                query = args.trans_delimiter.join(query)
+            if score is None:
+                score = ''
+            outfile.write('{}\t{}\t{}\n'.format(query, score, missing))
+    finally:
+        if args.outfile:
+            outfile.close()
+
+
+if __name__ == '__main__':
+    main()
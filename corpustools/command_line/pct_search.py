@@ -3,6 +3,7 @@ import os
 import csv
 import re
 import sys
+import itertools
 
 from corpustools.corpus.io import load_binary
 from corpustools.corpus.classes.lexicon import EnvironmentFilter
@@ -23,6 +24,7 @@ def main():
     parser.add_argument('-s', '--sequence_type', default='transcription', 
         help="The attribute of Words to search within. Normally this will be the transcription, but it can also be the spelling or a user-specified tier.")
     parser.add_argument('-o', '--outfile', help='Name of output file')
+    parser.add_argument('-i', '--index_file', help='Name of a file to keep a suffix array of the corpus in, for faster searches of the same corpus. It is made if it does not exist yet.')
 
     args = parser.parse_args()
 
@@ -39,21 +41,31 @@ def main():
     if len(rhs) == 0:
         rhs = None
 
-    ef = EnvironmentFilter(middle, None, rhs)
+    if args.index_file:
+        #Every combination of the segments of each position is a sequence
+        #to look up in the suffix array
+        index = corpus.get_suffix_array(args.sequence_type, args.index_file)
+        word_ids = set()
+        for sequence in itertools.product(*split_sequence):
+            word_ids.update(index.word_ids(sequence).tolist())
+        words = [index.words[i] for i in sorted(word_ids)]
+    else:
+        ef = EnvironmentFilter(middle, None, rhs)
 
-    results = phonological_search(corpus, [ef], sequence_type=args.sequence_type)
+        results = phonological_search(corpus, [ef], sequence_type=args.sequence_type)
+        words = [result[0] for result in results]
 
     if args.outfile:
         with open(args.outfile, 'w') as outfile:
-            for result in results:
-                outfile.write(' '.join(getattr(result[0], args.sequence_type))+'\n')
+            for word in words:
+                outfile.write(' '.join(getattr(word, args.sequence_type))+'\n')
         print('Search results written to output file.')
     else:
         print('No output file name provided.')
         print('Your search produced the results below:')
-        for result in results:
-            print('{}'.format(result[0]))
-        print('Total number of results: {}'.format(str(len(results))))
+        for word in words:
+            print('{}'.format(word))
+        print('Total number of results: {}'.format(str(len(words))))
         print('Please specify an output file name with -o to save these results.')
 
 
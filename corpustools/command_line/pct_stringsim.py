@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+
+from corpustools.corpus.classes import Word
+from corpustools.corpus.io.binary import load_binary
+from corpustools.symbolsim.string_similarity import (string_similarity,
+                                            iter_string_similarity)
+from corpustools.symbolsim.io import iter_pairs_file
+from corpustools.symbolsim.all_pairs import all_pairs_similarity
+from corpustools.contextmanagers import *
+
+
+def ensure_query_is_word(query, corpus, sequence_type, trans_delimiter):
+    if isinstance(query, Word):
+        query_word = query
+    else:
+        try:
+            query_word = corpus.corpus.find(query)
+        except KeyError:
+            if trans_delimiter == '':
+                query_word = Word(**{sequence_type: list(query)})
+            else:
+                query_word = Word(**{sequence_type: query.split(trans_delimiter)})
+    return query_word
+
+
+def main():
+
+    #### Parse command-line arguments
+    parser = argparse.ArgumentParser(description = \
+             'Phonological CorpusTools: string similarity CL interface')
+    parser.add_argument('corpus_file_name', help='Name of corpus file')
+    parser.add_argument('query', nargs='?', help='Word to compare to every word in the corpus, or name of a tab-delimited file of word pairs')
+    parser.add_argument('-l', '--all_pairs', action='store_true', help='Calculate the similarity of every pair of words in the corpus instead of a query, requires an output file')
+    parser.add_argument('-f', '--output_format', default='matrix', help="For all pairs: 'matrix' to write a NumPy matrix (.npy) of every pair, or 'edges' to write the indices and similarity of the pairs within min_rel and max_rel")
+    parser.add_argument('-j', '--num_cores', type=int, default=-1, help='For all pairs: number of processes to use, -1 to use no multiprocessing')
+    parser.add_argument('-c', '--context_type', type=str, default='Canonical', help="How to deal with variable pronunciations. Options are 'Canonical', 'MostFrequent', 'SeparatedTokens', or 'Weighted'. See documentation for details.")
+    parser.add_argument('-a', '--algorithm', default='edit_distance', help="The algorithm of string similarity to use: 'khorsi', 'edit_distance' or 'phono_edit_distance'")
+    parser.add_argument('-s', '--sequence_type', default = 'transcription', help="The name of the tier on which to calculate similarity")
+    parser.add_argument('-w', '--count_what', default ='type', help="If 'type', segment frequencies (for Khorsi) are type frequencies. If 'token', they are token frequencies.")
+    parser.add_argument('-e', '--trans_delimiter', default='', help="If not empty string, splits the query by this str to make a transcription/spelling list for the query's Word object.")
+    parser.add_argument('-n', '--min_rel', type=float, default=None, help='Filter out scores lower than this')
+    parser.add_argument('-x', '--max_rel', type=float, default=None, help='Filter out scores higher than this')
+    parser.add_argument('-k', '--top_k', type=int, default=None, help='Only output this many of the words most similar to the query, sorted from most to least similar. Otherwise, scores are output unsorted as they are calculated.')
+    parser.add_argument('-o', '--outfile', help='Name of output file, scores are written to standard output if not given')
+
+    args = parser.parse_args()
+
+    ####
+
+    corpus = load_binary(args.corpus_file_name)
+    if args.context_type == 'Canonical':
+        corpus = CanonicalVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'MostFrequent':
+        corpus = MostFrequentVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'SeparatedTokens':
+        corpus = SeparatedTokensVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+    elif args.context_type == 'Weighted':
+        corpus = WeightedVariantContext(corpus, args.sequence_type, type_or_token=args.count_what)
+
+    if args.all_pairs:
+        if not args.outfile:
+            raise Exception('In order to calculate the similarity of all pairs, you must provide an output file name using the option -o.')
+        #Interrupted calculations are resumed when run again
+        words = all_pairs_similarity(corpus, args.algorithm, args.outfile,
+                                output_format = args.output_format,
+                                min_rel = args.min_rel, max_rel = args.max_rel,
+                                num_cores = args.num_cores)
+        with open(args.outfile + '.words', 'w', encoding='utf-8') as f:
+            for w in words:
+                f.write('{}\n'.format(w))
+        return
+    elif args.query is None:
+        raise Exception('Please provide a query, or use the option -l to calculate the similarity of all pairs.')
+
+    def to_word(query):
+        return ensure_query_is_word(query, corpus, args.sequence_type, args.trans_delimiter)
+
+    if os.path.isfile(args.query):
+        query = ((to_word(w1), to_word(w2)) for w1, w2 in iter_pairs_file(args.query))
+    else:
+        query = to_word(args.query)
+
+    if args.top_k is not None and isinstance(query, Word):
+        results = string_similarity(corpus, query, args.algorithm,
+                                min_rel = args.min_rel, max_rel = args.max_rel,
+                                top_k = args.top_k)
+    else:
+        #Scores are written as they are calculated, so memory use does
+        #not grow with the size of the corpus
+        results = iter_string_similarity(corpus, query, args.algorithm,
+                                min_rel = args.min_rel, max_rel = args.max_rel)
+
+    if args.outfile:
+        outfile = open(args.outfile, 'w', encoding='utf-8')
+    else:
+        outfile = sys.stdout
+    try:
+        for w1, w2, score in results:
+            outfile.write('{}\t{}\t{}\n'.format(w1, w2, score))
+    finally:
+        if args.outfile:
+            outfile.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,22 @@
 from corpustools.exceptions import PCTError, PCTPythonError
+import os
 import math
 import collections
 import copy
 import operator
 
 from corpustools.corpus.classes.lexicon import Word
-
-from corpustools.exceptions import PCTContextError
+from corpustools.neighdens.deletion_index import DeletionIndex, SubstitutionIndex
+from corpustools.neighdens.bktree import BKTree, relaxation_factor
+from corpustools.neighdens.neighbor_graph import NeighborGraph, build_neighbor_graph
+from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
+from corpustools.symbolsim.edit_distance import LengthBuckets
+from corpustools.symbolsim.khorsi import surprisal_list, SurprisalIndex
+from corpustools.phonoprob.prob_table import PhonoProbTable
+from corpustools.mutualinfo.incidence import SegmentIncidence
+from corpustools.kl.kl import ContextCounts
+
+from corpustools.exceptions import PCTContextError, NeighDenError
 
 def ensure_context(context):
     if not isinstance(context, BaseCorpusContext):
@@ -37,6 +47,8 @@ class BaseCorpusContext(object):
         self.corpus = corpus
         self.attribute = attribute
         self._freq_base = {}
+        self._segment_ids = None
+        self._indexes = {}
         self.length = None
         self.frequency_threshold = frequency_threshold
 
@@ -63,7 +75,8 @@ class BaseCorpusContext(object):
             self.length = counter
             return self.length
 
-    def get_frequency_base(self, gramsize = 1, halve_edges = False, probability = False):
+    def get_frequency_base(self, gramsize = 1, halve_edges = False, probability = False,
+                            stop_check = None):
         """
         Generate (and cache) frequencies for each segment in the Corpus.
 
@@ -80,15 +93,20 @@ class BaseCorpusContext(object):
             If True, frequency counts will be normalized by total frequency,
             defaults to False
 
+        stop_check : callable, optional
+            Optional function to check whether to gracefully terminate early
+
         Returns
         -------
         dict
             Keys are segments (or sequences of segments) and values are
-            their frequency in the Corpus
+            their frequency in the Corpus, or None if stopped early
         """
         if (gramsize) not in self._freq_base:
             freq_base = collections.defaultdict(float)
             for word in self:
+                if stop_check is not None and stop_check():
+                    return None
                 tier = getattr(word, self.sequence_type)
                 if self.sequence_type == 'spelling':
                     seq = ['#'] + [x for x in tier] + ['#']
@@ -111,6 +129,226 @@ class BaseCorpusContext(object):
             return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
         return return_dict
 
+    def get_segment_ids(self, words = None):
+        """
+        Generate (and cache) integer IDs for each segment of the sequence
+        type in the Corpus.
+
+        IDs start at 1, so that 0 can be used for padding integer-encoded
+        sequences.
+
+        Parameters
+        ----------
+        words : list, optional
+            Words of the context, to avoid iterating over the context
+            again when they have already been collected
+
+        Returns
+        -------
+        dict
+            Keys are segments and values are their integer IDs
+        """
+        if self._segment_ids is None:
+            if words is None:
+                words = self
+            segments = set()
+            for word in words:
+                segments.update(getattr(word, self.sequence_type))
+            self._segment_ids = {s: i + 1 for i, s in enumerate(sorted(segments))}
+        return self._segment_ids
+
+    def encode_sequence(self, word):
+        """
+        Integer-encode the sequence type of a Word.
+
+        Segments that do not occur in the Corpus are given new IDs, so
+        they never match a segment of the Corpus.
+
+        Parameters
+        ----------
+        word : Word or sequence
+            Word to encode, or the sequence itself
+
+        Returns
+        -------
+        tuple
+            Integer IDs of the segments in the sequence
+        """
+        if isinstance(word, Word):
+            word = getattr(word, self.sequence_type)
+        segment_ids = self.get_segment_ids()
+        encoded = []
+        for s in word:
+            try:
+                encoded.append(segment_ids[s])
+            except KeyError:
+                segment_ids[s] = len(segment_ids) + 1
+                encoded.append(segment_ids[s])
+        return tuple(encoded)
+
+    def get_surprisal(self, word_boundaries = True):
+        """
+        Generate (and cache) the surprisal of each segment in the Corpus,
+        indexed by the IDs from ``get_segment_ids``.
+
+        Parameters
+        ----------
+        word_boundaries : boolean
+            If False, word boundary symbols ('#') are not counted in the
+            total frequency.  Defaults to True.
+
+        Returns
+        -------
+        list
+            Surprisal, log(1/p), of each segment at the index of its ID
+        """
+        key = ('surprisal', word_boundaries)
+        if key not in self._indexes:
+            self._indexes[key] = surprisal_list(self.get_frequency_base(),
+                                    self.get_segment_ids(), word_boundaries)
+        return self._indexes[key]
+
+    def get_surprisal_index(self, word_boundaries = True):
+        """
+        Generate (and cache) the integer-encoded sequences of every word,
+        sorted by their total surprisal, for finding words whose Khorsi
+        similarity to a query can reach a threshold.
+
+        Parameters
+        ----------
+        word_boundaries : boolean
+            If False, word boundary symbols ('#') are not counted in the
+            total frequency.  Defaults to True.
+
+        Returns
+        -------
+        SurprisalIndex
+            Sequences of the words of the context
+        """
+        key = ('surprisal_index', word_boundaries)
+        if key not in self._indexes:
+            self._indexes[key] = SurprisalIndex(self, word_boundaries)
+        return self._indexes[key]
+
+    def get_deletion_index(self, max_distance):
+        """
+        Generate (and cache) an index of the deletion variants of every word,
+        for finding words within an edit distance of a query.
+
+        Parameters
+        ----------
+        max_distance : int
+            Maximum edit distance that the index will be queried with
+
+        Returns
+        -------
+        DeletionIndex
+            Index over the words of the context
+        """
+        key = ('deletion', max_distance)
+        if key not in self._indexes:
+            self._indexes[key] = DeletionIndex(self, max_distance)
+        return self._indexes[key]
+
+    def get_substitution_index(self):
+        """
+        Generate (and cache) an index of every word with each position
+        masked, for finding words that differ from a query by exactly one
+        substitution.
+
+        Returns
+        -------
+        SubstitutionIndex
+            Index over the words of the context
+        """
+        key = ('substitution',)
+        if key not in self._indexes:
+            self._indexes[key] = SubstitutionIndex(self)
+        return self._indexes[key]
+
+    def get_length_buckets(self):
+        """
+        Generate (and cache) the integer-encoded sequences of every word,
+        grouped by length, for calculating the edit distance from a query
+        to every word at once.
+
+        Returns
+        -------
+        LengthBuckets
+            Sequences of the words of the context
+        """
+        key = ('length_buckets',)
+        if key not in self._indexes:
+            self._indexes[key] = LengthBuckets(self)
+        return self._indexes[key]
+
+    def get_bk_tree(self):
+        """
+        Generate (and cache) a BK-tree of every word using phonological
+        edit distance, for finding words within a phonological edit
+        distance of a query.
+
+        Returns
+        -------
+        BKTree
+            Tree over the words of the context
+        """
+        key = ('bk_tree', 'phono_edit_distance')
+        if key not in self._indexes:
+            def distance(w1, w2):
+                return phono_edit_distance(w1, w2, self.sequence_type, self.specifier)
+            tree = BKTree(distance, relaxation_factor(self.specifier))
+            for w in self:
+                tree.add(w)
+            self._indexes[key] = tree
+        return self._indexes[key]
+
+    def get_neighbor_graph(self, algorithm = 'edit_distance', max_distance = 1,
+                            stop_check = None, call_back = None, path = None):
+        """
+        Generate (and cache) the graph of every word's neighbors.
+
+        Parameters
+        ----------
+        algorithm : str
+            The algorithm used to determine distance
+        max_distance : float
+            Maximum distance between neighbors
+        stop_check : callable, optional
+            Optional function to check whether to gracefully terminate early
+        call_back : callable, optional
+            Optional function to supply progress information during the function
+        path : str, optional
+            File to keep the graph in between sessions, it is loaded from
+            there if it was saved for the same words, algorithm and
+            maximum distance, and saved there otherwise
+
+        Returns
+        -------
+        NeighborGraph
+            Graph over the words of the context, or None if stopped early
+        """
+        key = ('neighbor_graph', algorithm, max_distance)
+        if key not in self._indexes:
+            graph = None
+            if path is not None and os.path.exists(path):
+                try:
+                    graph = NeighborGraph.load(path, self)
+                except NeighDenError:
+                    graph = None
+                if graph is not None and (graph.algorithm != algorithm or
+                                        graph.max_distance != max_distance):
+                    graph = None
+            if graph is None:
+                graph = build_neighbor_graph(self, algorithm, max_distance,
+                                            stop_check, call_back)
+                if graph is None:
+                    return None
+                if path is not None:
+                    graph.save(path, self)
+            self._indexes[key] = graph
+        return self._indexes[key]
+
     def get_phone_probs(self, gramsize = 1, probability = True, preserve_position = True, log_count = True):
         """
         Generate (and cache) phonotactic probabilities for segments in
@@ -170,6 +408,59 @@ class BaseCorpusContext(object):
             return_dict = { k:v/freq_base['total'][k[1]] for k,v in return_dict.items() if k != 'total'}
         return return_dict
 
+    def get_phone_prob_table(self, gramsize = 1):
+        """
+        Generate (and cache) the phonotactic probabilities of
+        ``get_phone_probs`` as an array of positions by n-gram IDs, for
+        scoring every word at once.
+
+        Parameters
+        ----------
+        gramsize : integer
+            Size of n-gram, defaults to 1 (unigram)
+
+        Returns
+        -------
+        PhonoProbTable
+            Positional n-gram probabilities of the context
+        """
+        key = ('phone_prob_table', gramsize)
+        if key not in self._indexes:
+            self._indexes[key] = PhonoProbTable(self, gramsize)
+        return self._indexes[key]
+
+    def get_segment_incidence(self):
+        """
+        Generate (and cache) a sparse matrix of which segments occur in
+        which words, for counting the words that contain each pair of
+        segments.
+
+        Returns
+        -------
+        SegmentIncidence
+            Incidence of the segments in the words of the context
+        """
+        key = ('segment_incidence',)
+        if key not in self._indexes:
+            self._indexes[key] = SegmentIncidence(self)
+        return self._indexes[key]
+
+    def get_context_counts(self):
+        """
+        Generate (and cache) the frequency of every segment in every
+        context, for the Kullback-Leibler divergence of every pair of
+        segments.
+
+        Returns
+        -------
+        ContextCounts
+            Frequencies of the segments in the contexts of each side
+        """
+        key = ('context_counts',)
+        if key not in self._indexes:
+            self._indexes[key] = ContextCounts(self)
+        return self._indexes[key]
+
     def __exit__(self, exc_type, exc, exc_tb):
         if exc_type is None:
             return True
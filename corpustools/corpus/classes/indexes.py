@@ -0,0 +1,489 @@
+import numpy as np
+
+from corpustools.exceptions import CorpusIntegrityError
+
+class PositionalIndex(object):
+    """
+    Positions of every segment in the words of a corpus on one tier, for
+    finding the words and positions that match EnvironmentFilters without
+    going through every word.
+
+    Sequences are indexed with their word boundaries, so that '#' is
+    looked up like any other segment. Each occurrence of a segment is
+    stored as a single code, ``word_id * self.stride + position``, where
+    positions count from the initial word boundary, so the occurrences of
+    a segment are sorted by word and then by position, and an occurrence
+    some number of segments away in the same word is the code plus that
+    number.
+
+    Parameters
+    ----------
+    corpus : Corpus
+        Corpus to index, or any other iterable of words
+    sequence_type : str
+        Name of the tier to index
+
+    Attributes
+    ----------
+    words : list
+        Words of the corpus, their positions are their word IDs
+    lengths : numpy.ndarray
+        Length of the sequence of each word, with word boundaries
+    stride : int
+        Multiplier of the word IDs in the codes, greater than any length
+    """
+    def __init__(self, corpus, sequence_type):
+        self.sequence_type = sequence_type
+        self.words = []
+        lengths = []
+        positions = {}
+        for word in corpus:
+            tier = getattr(word, sequence_type)
+            if tier is None:
+                continue
+            word_id = len(self.words)
+            self.words.append(word)
+            bounded = tier.with_word_boundaries()
+            lengths.append(len(bounded))
+            for p, s in enumerate(bounded):
+                positions.setdefault(s, []).append((word_id, p))
+        self.lengths = np.array(lengths, dtype = np.int64)
+        self.stride = int(self.lengths.max()) + 1 if len(lengths) else 1
+        self._postings = {}
+        for s, occurrences in positions.items():
+            occurrences = np.array(occurrences, dtype = np.int64)
+            self._postings[s] = occurrences[:, 0] * self.stride + occurrences[:, 1]
+
+    def __len__(self):
+        return len(self.words)
+
+    def postings(self, segments):
+        """
+        Get the occurrences of any of a set of segments
+
+        Parameters
+        ----------
+        segments : iterable
+            Segment symbols, '#' for word boundaries
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted codes of the occurrences
+        """
+        found = [self._postings[s] for s in segments if s in self._postings]
+        if not found:
+            return np.zeros(0, dtype = np.int64)
+        if len(found) == 1:
+            return found[0]
+        return np.unique(np.concatenate(found))
+
+    def word_ids(self, segments):
+        """
+        Get the words that contain any of a set of segments
+
+        Parameters
+        ----------
+        segments : iterable
+            Segment symbols
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted IDs of the words
+        """
+        return np.unique(self.postings(segments) // self.stride)
+
+    def match(self, environment):
+        """
+        Find the positions of the middle segments of every match of an
+        EnvironmentFilter, from the occurrences of the segments of each of
+        its slots, without looking at the words themselves
+
+        Parameters
+        ----------
+        environment : EnvironmentFilter
+            EnvironmentFilter to search for
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted codes of the middle segments of the matches
+        """
+        #As for Transcription.find, a word has to contain a middle segment
+        #other than a word boundary to match at all
+        codes = self.postings(environment._middle)
+        if '#' in environment._middle:
+            words = self.word_ids(environment._middle - {'#'})
+            codes = codes[np.isin(codes // self.stride, words)]
+        lhs = environment.lhs if environment.lhs is not None else ()
+        rhs = environment.rhs if environment.rhs is not None else ()
+        #Matches have to fit in the sequence, which also keeps the codes of
+        #the other slots in the same word
+        positions = codes % self.stride
+        lengths = self.lengths[codes // self.stride]
+        codes = codes[(positions >= len(lhs)) & (positions + len(rhs) < lengths)]
+        slots = list(zip(range(-len(lhs), 0), lhs)) + list(zip(range(1, len(rhs) + 1), rhs))
+        for offset, segments in slots:
+            if not len(codes):
+                break
+            codes = codes[np.isin(codes + offset, self.postings(segments))]
+        return codes
+
+def build_suffix_array(text):
+    """
+    Sort the suffixes of an integer sequence by prefix doubling, ranking
+    suffixes by their first 2, 4, 8, ... elements until every rank is
+    different
+
+    Parameters
+    ----------
+    text : numpy.ndarray
+        Non-negative integers
+
+    Returns
+    -------
+    numpy.ndarray
+        Start of each suffix, in sorted order
+    """
+    n = len(text)
+    if n == 0:
+        return np.zeros(0, dtype = np.int64)
+    rank = np.unique(text, return_inverse = True)[1].astype(np.int64)
+    k = 1
+    while True:
+        #Suffixes shorter than k + 1 come before longer ones that they start
+        second = np.zeros(n, dtype = np.int64)
+        second[:n - k] = rank[k:] + 1
+        keys = rank * (n + 1) + second
+        suffixes = np.argsort(keys, kind = 'stable')
+        sorted_keys = keys[suffixes]
+        rank = np.empty(n, dtype = np.int64)
+        rank[suffixes] = np.concatenate([[0], np.cumsum(sorted_keys[1:] != sorted_keys[:-1])])
+        if rank[suffixes[-1]] == n - 1 or k >= n:
+            return suffixes
+        k *= 2
+
+def build_lcp(text, suffixes):
+    """
+    Find the length of the common prefix of each suffix and the one
+    before it in sorted order, with Kasai's algorithm
+
+    Common prefixes stop at the first 0, so that they never run from one
+    word into the next.
+
+    Parameters
+    ----------
+    text : numpy.ndarray
+        Integer sequence, with 0 between words
+    suffixes : numpy.ndarray
+        Start of each suffix, in sorted order
+
+    Returns
+    -------
+    numpy.ndarray
+        Length of the common prefix, 0 for the first suffix
+    """
+    n = len(text)
+    text = text.tolist()
+    suffixes = suffixes.tolist()
+    rank = [0] * n
+    for i, p in enumerate(suffixes):
+        rank[p] = i
+    lcp = [0] * n
+    h = 0
+    for p in range(n):
+        r = rank[p]
+        if r == 0:
+            h = 0
+            continue
+        q = suffixes[r - 1]
+        while p + h < n and q + h < n and text[p + h] == text[q + h] and text[p + h] != 0:
+            h += 1
+        lcp[r] = h
+        if h > 0:
+            h -= 1
+    return np.array(lcp, dtype = np.int64)
+
+class SuffixArray(object):
+    """
+    Suffix array over the sequences of the words of a corpus on one tier,
+    for finding the words that contain a sequence of segments, and how
+    often they do, without going through every word.
+
+    The sequences are encoded as integers and concatenated with a 0, for
+    the word boundary, before each word and after the last one. Every
+    occurrence of a sequence of segments is the start of a suffix of this
+    text, and the suffixes that start with a sequence are next to each
+    other in sorted order, so they are found with two binary searches.
+    The LCP array has the number of segments that each suffix has in
+    common with the one before it, up to the next word boundary.
+
+    Parameters
+    ----------
+    corpus : Corpus
+        Corpus to index, or any other iterable of words
+    sequence_type : str
+        Name of the tier to index
+    suffixes : numpy.ndarray, optional
+        Previously built suffix array of the same words, such as from
+        ``load``
+    lcp : numpy.ndarray, optional
+        Previously built LCP array of the same words
+
+    Attributes
+    ----------
+    words : list
+        Words of the corpus, their positions are their word IDs
+    segments : list
+        Segment symbols, indexed by their integer codes, 0 is the word
+        boundary
+    text : numpy.ndarray
+        Concatenated integer-encoded sequences
+    owners : numpy.ndarray
+        Word ID of each position of the text, word boundaries belong to
+        the word after them
+    suffixes : numpy.ndarray
+        Start of each suffix of the text, in sorted order
+    lcp : numpy.ndarray
+        Length of the common prefix of each suffix and the one before it
+    """
+    def __init__(self, corpus, sequence_type, suffixes = None, lcp = None):
+        self.sequence_type = sequence_type
+        self.words = []
+        sequences = []
+        for word in corpus:
+            tier = getattr(word, sequence_type)
+            if tier is None:
+                continue
+            self.words.append(word)
+            sequences.append(list(tier))
+        self.segments = ['#'] + sorted(set(s for sequence in sequences for s in sequence))
+        self._codes = {s: i for i, s in enumerate(self.segments) if i > 0}
+        text = []
+        owners = []
+        for i, sequence in enumerate(sequences):
+            text.append(0)
+            text.extend(self._codes[s] for s in sequence)
+            owners.extend([i] * (len(sequence) + 1))
+        text.append(0)
+        owners.append(len(self.words))
+        self.text = np.array(text, dtype = np.int32)
+        self.owners = np.array(owners, dtype = np.int64)
+        self.frequencies = np.array([w.frequency for w in self.words], dtype = float)
+        if suffixes is None:
+            suffixes = build_suffix_array(self.text)
+            lcp = build_lcp(self.text, suffixes)
+        self.suffixes = suffixes
+        self.lcp = lcp
+        self._text = text
+
+    def __len__(self):
+        return len(self.words)
+
+    def encode(self, sequence):
+        """
+        Get the integer codes of a sequence of segments
+
+        Parameters
+        ----------
+        sequence : list
+            Segment symbols, with '#' for a word boundary at either end
+
+        Returns
+        -------
+        list
+            Codes of the segments, or None if the sequence cannot occur,
+            because it has a segment that is not in the corpus or a word
+            boundary in the middle
+        """
+        codes = []
+        for i, s in enumerate(sequence):
+            if s == '#':
+                if 0 < i < len(sequence) - 1:
+                    return None
+                codes.append(0)
+            elif s in self._codes:
+                codes.append(self._codes[s])
+            else:
+                return None
+        return codes
+
+    def _bound(self, codes, upper):
+        #First suffix that starts with something greater than the codes
+        #(or equal to them, if not upper)
+        m = len(codes)
+        lo = 0
+        hi = len(self.suffixes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            p = int(self.suffixes[mid])
+            prefix = self._text[p:p + m]
+            if prefix < codes or (upper and prefix == codes):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, sequence):
+        """
+        Find the suffixes that start with a sequence of segments
+
+        Parameters
+        ----------
+        sequence : list
+            Segment symbols, with '#' for a word boundary at either end
+
+        Returns
+        -------
+        tuple
+            Positions in the suffix array of the first suffix that starts
+            with the sequence and of the one after the last
+        """
+        codes = self.encode(sequence)
+        if not codes:
+            return 0, 0
+        return self._bound(codes, False), self._bound(codes, True)
+
+    def occurrences(self, sequence):
+        """
+        Find every occurrence of a sequence of segments
+
+        Parameters
+        ----------
+        sequence : list
+            Segment symbols, with '#' for a word boundary at either end
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted positions in the text where the sequence starts
+        """
+        lo, hi = self.range(sequence)
+        positions = np.sort(self.suffixes[lo:hi])
+        #Only the final word boundary has no word after it
+        return positions[self.owners[positions] < len(self.words)]
+
+    def word_ids(self, sequence):
+        """
+        Find the words that contain a sequence of segments
+
+        Parameters
+        ----------
+        sequence : list
+            Segment symbols, with '#' for a word boundary at either end
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted IDs of the words
+        """
+        return np.unique(self.owners[self.occurrences(sequence)])
+
+    def count(self, sequence, weighted = False):
+        """
+        Count the occurrences of a sequence of segments
+
+        Parameters
+        ----------
+        sequence : list
+            Segment symbols, with '#' for a word boundary at either end
+        weighted : bool
+            If True, each occurrence counts for the frequency of its word
+
+        Returns
+        -------
+        float
+            Number of occurrences
+        """
+        positions = self.occurrences(sequence)
+        if weighted:
+            return float(self.frequencies[self.owners[positions]].sum())
+        return float(len(positions))
+
+    def substring_counts(self, length, weighted = False):
+        """
+        Count the occurrences of every sequence of segments of a length,
+        from the runs of suffixes in the LCP array that have at least that
+        many segments in common
+
+        Parameters
+        ----------
+        length : int
+            Number of segments in the sequences, without word boundaries
+        weighted : bool
+            If True, each occurrence counts for the frequency of its word
+
+        Returns
+        -------
+        dict
+            Number of occurrences of each sequence that occurs, keyed by
+            tuples of segments
+        """
+        n = len(self.suffixes)
+        if length < 1 or n == 0:
+            return {}
+        boundaries = np.flatnonzero(self.text == 0)
+        #Segments from each position to the next word boundary
+        remaining = boundaries[np.searchsorted(boundaries, np.arange(n))] - np.arange(n)
+        starts = np.ones(n, dtype = bool)
+        starts[1:] = self.lcp[1:] < length
+        groups = np.cumsum(starts) - 1
+        valid = remaining[self.suffixes] >= length
+        group_ids, first, group_index = np.unique(groups[valid], return_index = True,
+                                                return_inverse = True)
+        if weighted:
+            counts = np.bincount(group_index,
+                        self.frequencies[self.owners[self.suffixes[valid]]])
+        else:
+            counts = np.bincount(group_index).astype(float)
+        positions = self.suffixes[valid][first]
+        return {tuple(self.segments[c] for c in self._text[p:p + length]): float(count)
+                for p, count in zip(positions.tolist(), counts.tolist())}
+
+    def save(self, path):
+        """
+        Save the suffix and LCP arrays to a NumPy (.npz) file
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        """
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, text = self.text, suffixes = self.suffixes,
+                    lcp = self.lcp, segments = np.array(self.segments, dtype = str),
+                    sequence_type = np.array(self.sequence_type, dtype = str))
+
+    @classmethod
+    def load(cls, path, corpus, sequence_type):
+        """
+        Load the suffix array of a corpus saved with ``save``
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        corpus : Corpus
+            Corpus of the words, with the same sequences as when the
+            suffix array was saved
+        sequence_type : str
+            Name of the indexed tier
+
+        Returns
+        -------
+        SuffixArray
+            The loaded suffix array
+
+        Raises
+        ------
+        CorpusIntegrityError
+            If the file was saved for different sequences
+        """
+        with np.load(path) as data:
+            index = cls(corpus, sequence_type, data['suffixes'], data['lcp'])
+            if (str(data['sequence_type']) != sequence_type or
+                    data['segments'].tolist() != index.segments or
+                    not np.array_equal(data['text'], index.text)):
+                raise(CorpusIntegrityError('The suffix array in {} was made for different words.'.format(path)))
+        return index
@@ -5,8 +5,12 @@ import collections
 import operator
 import math
 import locale
+import os
+
+import numpy as np
 
 from corpustools.exceptions import CorpusIntegrityError
+from corpustools.corpus.classes.indexes import PositionalIndex, SuffixArray
 
 import pdb
 
@@ -483,6 +487,7 @@ class FeatureMatrix(object):
         self.possible_values = set()
         self.matrix = {}
         self._default_value = 'n'
+        self._segment_distances = {}
         for s in feature_entries:
             if self._features is None:
                 self._features = {k for k in s.keys() if k != 'symbol'}
@@ -652,9 +657,26 @@ class FeatureMatrix(object):
                 segments.append(k)
         return segments
 
+    def __getstate__(self):
+        #Segment distances are saved with the feature system, as lists
+        #so that loading them does not depend on the NumPy version.
+        #Besides the default ones, the distances with an underspecification
+        #cost of 1 (numbers of different features) are used for checking
+        #spurious allophones
+        self.segment_distances()
+        self.segment_distances(underspec_cost = 1)
+        state = self.__dict__.copy()
+        state['_segment_distances'] = {k: (indices, distances.tolist())
+                        for k, (indices, distances) in self._segment_distances.items()}
+        return state
+
     def __setstate__(self,state):
         if '_features' not in state:
             state['_features'] = state['features']
+        if '_segment_distances' not in state:
+            state['_segment_distances'] = {}
+        state['_segment_distances'] = {k: (indices, np.array(distances))
+                        for k, (indices, distances) in state['_segment_distances'].items()}
         for k,v in state['matrix'].items():
             if not isinstance(v,Segment):
                 s = Segment(k)
@@ -687,6 +709,7 @@ class FeatureMatrix(object):
             for f in self._features:
                 if f not in v:
                     self.matrix[k][f] = self._default_value
+        self._segment_distances = {}
 
     @property
     def default_value(self):
@@ -723,6 +746,7 @@ class FeatureMatrix(object):
         s = Segment(seg)
         s.specify(feat_spec)
         self.matrix[seg] = s
+        self._segment_distances = {}
 
     def add_feature(self,feature, default = None):
         """
@@ -745,6 +769,7 @@ class FeatureMatrix(object):
                 for f in self._features:
                     if f not in v:
                         self.matrix[k][f] = default
+        self._segment_distances = {}
 
 
     def valid_feature_strings(self):
@@ -882,14 +907,57 @@ class FeatureMatrix(object):
         elif isinstance(item,tuple):
             return self.matrix[item[0]][item[1]]
 
+    def segment_distances(self, underspec_cost = 0.25):
+        """
+        Generate (and cache) the feature-based distance between every pair
+        of segments, and between every segment and an empty segment (all of
+        whose features are unspecified).
+
+        The distance between two segments is the number of features with
+        different values, where a difference between a specified and an
+        unspecified ('0') value counts as ``underspec_cost``.
+
+        Parameters
+        ----------
+        underspec_cost : float
+            Distance of a specified value from an unspecified one
+
+        Returns
+        -------
+        dict
+            Mapping of segment symbols to rows and columns of the distance
+            matrix, 'empty' is mapped to the last row and column
+        numpy.ndarray
+            Matrix of distances between segments
+        """
+        if underspec_cost not in self._segment_distances:
+            symbols = sorted(k for k in self.matrix.keys() if k != '#')
+            features = self.features
+            values = np.array([[self.matrix[k].features.get(f, self._default_value)
+                                    for f in features] for k in symbols] +
+                                [['0'] * len(features)]).reshape(len(symbols) + 1, len(features))
+            distances = np.zeros((len(symbols) + 1, len(symbols) + 1))
+            for i in range(len(features)):
+                column = values[:, i]
+                unspecified = column == '0'
+                different = column[:, None] != column[None, :]
+                distances += np.where(unspecified[:, None] | unspecified[None, :],
+                                        underspec_cost, 1.0) * different
+            indices = {k: i for i, k in enumerate(symbols)}
+            indices['empty'] = len(symbols)
+            self._segment_distances[underspec_cost] = (indices, distances)
+        return self._segment_distances[underspec_cost]
+
     def __delitem__(self,item):
         del self.matrix[item]
+        self._segment_distances = {}
 
     def __contains__(self,item):
         return item in list(self.matrix.keys())
 
     def __setitem__(self,key,value):
         self.matrix[key] = value
+        self._segment_distances = {}
 
     def __len__(self):
         return len(self.matrix)
@@ -2024,6 +2092,7 @@ class Corpus(object):
         self._attributes = [Attribute('spelling','spelling'),
                             Attribute('transcription','tier'),
                             Attribute('frequency','numeric')]
+        self._indexes = {}
 
     @property
     def has_transcription(self):
@@ -2173,6 +2242,67 @@ class Corpus(object):
             features = self.specifier.matrix[seg.symbol]
         return features
 
+    def get_positional_index(self, sequence_type = 'transcription'):
+        """
+        Generate (and cache) an index of the positions of every segment in
+        the words of the Corpus, for phonological searches.
+
+        The index is remade after words or tiers are added or removed, but
+        not after Words are edited directly.
+
+        Parameters
+        ----------
+        sequence_type : string
+            Name of the tier to index
+
+        Returns
+        -------
+        PositionalIndex
+            Positions of the segments of the tier
+        """
+        key = ('positional_index', sequence_type)
+        if key not in self._indexes:
+            self._indexes[key] = PositionalIndex(self, sequence_type)
+        return self._indexes[key]
+
+    def get_suffix_array(self, sequence_type = 'transcription', path = None):
+        """
+        Generate (and cache) a suffix array of the sequences of the words
+        of the Corpus, for finding the words that contain a sequence of
+        segments.
+
+        As with ``get_positional_index``, the suffix array is remade after
+        words or tiers are added or removed.
+
+        Parameters
+        ----------
+        sequence_type : string
+            Name of the tier to index
+        path : str, optional
+            File to keep the suffix array in between sessions, it is
+            loaded from there if it was saved for the same sequences, and
+            saved there otherwise
+
+        Returns
+        -------
+        SuffixArray
+            Suffix array of the tier
+        """
+        key = ('suffix_array', sequence_type)
+        if key not in self._indexes:
+            index = None
+            if path is not None and os.path.exists(path):
+                try:
+                    index = SuffixArray.load(path, self, sequence_type)
+                except CorpusIntegrityError:
+                    index = None
+            if index is None:
+                index = SuffixArray(self, sequence_type)
+                if path is not None:
+                    index.save(path)
+            self._indexes[key] = index
+        return self._indexes[key]
+
     def add_abstract_tier(self, attribute, spec):
         """
         Add a abstract tier (currently primarily for generating CV skeletons
@@ -2202,6 +2332,7 @@ class Corpus(object):
         for word in self:
             word.add_abstract_tier(attribute.name,spec)
             attribute.update_range(getattr(word,attribute.name))
+        self._indexes = {}
 
     def add_attribute(self, attribute, initialize_defaults = False):
         """
@@ -2225,6 +2356,7 @@ class Corpus(object):
         if initialize_defaults:
             for word in self:
                 word.add_attribute(attribute.name,attribute.default_value)
+        self._indexes = {}
 
     def add_count_attribute(self, attribute, sequence_type, spec):
         """
@@ -2294,6 +2426,7 @@ class Corpus(object):
         attribute._range = tier_segs
         for word in self:
             word.add_tier(attribute.name,tier_segs)
+        self._indexes = {}
 
     def remove_word(self, word_key):
         """
@@ -2310,6 +2443,7 @@ class Corpus(object):
             del self.wordlist[word_key]
         except KeyError:
             pass
+        self._indexes = {}
 
     def remove_attribute(self, attribute):
         """
@@ -2334,9 +2468,12 @@ class Corpus(object):
             return
         for word in self:
             word.remove_attribute(name)
+        self._indexes = {}
 
     def __getstate__(self):
         state = self.__dict__.copy()
+        #Indexes are remade when needed rather than saved
+        state.pop('_indexes', None)
         return state
 
     def __setstate__(self,state):
@@ -2364,6 +2501,7 @@ class Corpus(object):
                 except KeyError:
                     pass
             self.__dict__.update(state)
+            self._indexes = {}
             self._specify_features()
             #Backwards compatability
             for k,w in self.wordlist.items():
@@ -2482,6 +2620,7 @@ class Corpus(object):
 
         """
         word._corpus = self
+        self._indexes = {}
         #If the word doesn't exist, add it
         try:
             check = self.find(word.spelling, keyerror=True)
@@ -2684,6 +2823,7 @@ class Corpus(object):
 
     def __setitem__(self,item,value):
         self.wordlist[item] = value
+        self._indexes = {}
 
     def __getitem__(self,item):
         return self.wordlist[item]
@@ -1,20 +1,273 @@
 #fun times with morphological relatedness
 import time
 import os
+import math
 from codecs import open
+from multiprocessing import Pool
+
+import numpy as np
 
 import corpustools.symbolsim.phono_align as pam
-from corpustools.symbolsim.string_similarity import (string_similarity,
-                                                    )
+from corpustools.symbolsim.khorsi import encoded_khorsi, BOUND_TOLERANCE
+from corpustools.symbolsim.edit_distance import batch_edit_distance
+from corpustools.neighdens.deletion_index import MAX_INDEXED_DISTANCE
 
 from .io import print_freqalt_results
 
 from corpustools.exceptions import FreqAltError
 
+#Longest substrings that candidates for Khorsi similarity are required
+#to share, longer substrings are too specific to be worth indexing
+MAX_SUBSTRING_LENGTH = 3
+
+#Scorer of the current process, set by init_scorer so that the words
+#are only sent once to each worker process
+_scorer = None
+
+class AlternationScorer(object):
+    """
+    Scores candidate pairs of words for frequency of alternation, keeping
+    the pairs that are related enough and pass the minimal pair and
+    alignment checks.
+
+    Parameters
+    ----------
+    algorithm : str
+        'khorsi', 'edit_distance' or 'phono_edit_distance'
+    sequences : list
+        Sequences of the words, integer-encoded for 'khorsi' and
+        'edit_distance' and lists of segments for 'phono_edit_distance'
+    transcriptions : list
+        Transcriptions of the words as lists of segments
+    seg1 : str
+        First segment
+    seg2 : str
+        Second segment
+    surprisal : list, optional
+        Surprisal of each segment indexed by segment ID, for 'khorsi'
+    features : FeatureMatrix, optional
+        Feature system, for 'phono_edit_distance' and alignment
+    min_rel : float, optional
+        Pairs less related than min_rel are filtered out
+    max_rel : float, optional
+        Pairs more related than max_rel are filtered out
+    phono_align : bool
+        If True, only pairs that are likely phonologically aligned are kept
+    min_pairs_okay : bool
+        If False, minimal pairs are filtered out
+    """
+    def __init__(self, algorithm, sequences, transcriptions, seg1, seg2,
+                surprisal = None, features = None, min_rel = None, max_rel = None,
+                phono_align = False, min_pairs_okay = False):
+        self.algorithm = algorithm
+        self.sequences = sequences
+        self.transcriptions = transcriptions
+        self.seg1 = seg1
+        self.seg2 = seg2
+        self.surprisal = surprisal
+        self.min_rel = min_rel
+        self.max_rel = max_rel
+        self.min_pairs_okay = min_pairs_okay
+        if algorithm == 'edit_distance':
+            #Distances to every candidate of a word are calculated at once
+            self.lengths = np.array([len(x) for x in sequences], dtype = int)
+            self.padded = np.zeros((len(sequences), max(self.lengths, default = 0)), dtype = int)
+            for k, x in enumerate(sequences):
+                self.padded[k, :len(x)] = x
+        elif algorithm == 'phono_edit_distance':
+            self.distance_aligner = pam.Aligner(features_tf = True, features = features)
+        self.aligner = None
+        if phono_align:
+            self.aligner = pam.Aligner(features = features)
+
+    def relatedness(self, i, candidates):
+        """Returns the string similarities of a word to its candidates,
+        which are only exact for pairs that are within min_rel and
+        max_rel"""
+        if self.algorithm == 'edit_distance':
+            candidates = np.array(candidates, dtype = int)
+            distances = batch_edit_distance(self.sequences[i], self.padded[candidates],
+                                            self.lengths[candidates])
+            return [int(d) for d in distances]
+        if self.algorithm == 'khorsi':
+            #Pairs below min_rel are filtered out, so the calculation can
+            #stop once the similarity falls below it
+            return [encoded_khorsi(self.sequences[i], self.sequences[j],
+                                self.surprisal, max_distance = self.min_rel)
+                    for j in candidates]
+        return [self.distance_aligner.distance(self.sequences[i], self.sequences[j])
+                for j in candidates]
+
+    def is_minimal_pair(self, i, j):
+        """Returns True if the transcriptions of two words differ by a
+        single substitution"""
+        t1 = self.transcriptions[i]
+        t2 = self.transcriptions[j]
+        if len(t1) != len(t2):
+            return False
+        count_diff = 0
+        for x, y in zip(t1, t2):
+            if x != y:
+                count_diff += 1
+                if count_diff > 1:
+                    return False
+        return count_diff == 1
+
+    def score(self, i, candidates):
+        """
+        Score the candidates for alternating with a word
+
+        Parameters
+        ----------
+        i : int
+            Index of a word with the first segment
+        candidates : list
+            Indices of words with the second segment
+
+        Returns
+        -------
+        list
+            Tuples of the index and relatedness of each candidate that
+            alternates with the word
+        """
+        scores = []
+        if not candidates:
+            return scores
+        for j, ss in zip(candidates, self.relatedness(i, candidates)):
+            if self.min_rel is not None and ss < self.min_rel:
+                continue
+            if self.max_rel is not None and ss > self.max_rel:
+                continue
+            if not self.min_pairs_okay and self.is_minimal_pair(i, j):
+                continue
+            if self.aligner is not None:
+                alignment = self.aligner.align(self.transcriptions[i], self.transcriptions[j])
+                if not self.aligner.morpho_related(alignment, self.seg1, self.seg2):
+                    continue
+            scores.append((j, ss))
+        return scores
+
+def init_scorer(*args):
+    global _scorer
+    _scorer = AlternationScorer(*args)
+
+def score_candidates(block):
+    i, candidates = block
+    return i, _scorer.score(i, candidates)
+
+def substring_index(sequences, ids, length):
+    """Returns a mapping of each substring of a length to the indices of
+    the sequences that contain it"""
+    index = {}
+    for i in ids:
+        sequence = sequences[i]
+        for k in range(len(sequence) - length + 1):
+            index.setdefault(tuple(sequence[k:k + length]), set()).add(i)
+    return index
+
+def alternation_candidates(corpus_context, algorithm, ids1, ids2, sequences,
+                            min_rel = None, max_rel = None, features = None):
+    """
+    Find the words with the second segment that could be related enough
+    to each word with the first segment, skipping pairs that cannot reach
+    min_rel or max_rel without scoring them.
+
+    Words within an edit distance are found through a deletion index or,
+    for larger distances, bands of lengths; words within a Khorsi
+    similarity through bounds on their total surprisal and substrings
+    that they must share with the word; and words within a phonological
+    edit distance through bands of lengths, as every segment that is
+    inserted or deleted costs at least as much as the cheapest insertion
+    or deletion.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    algorithm : str
+        'khorsi', 'edit_distance' or 'phono_edit_distance'
+    ids1 : list
+        Indices of the words with the first segment, in the order of the
+        corpus context
+    ids2 : list
+        Indices of the words with the second segment, in the order of the
+        corpus context
+    sequences : list
+        Sequences of every word of the corpus context, as for
+        ``AlternationScorer``
+    min_rel : float, optional
+        Minimum relatedness
+    max_rel : float, optional
+        Maximum relatedness
+    features : FeatureMatrix, optional
+        Feature system, for 'phono_edit_distance'
+
+    Yields
+    ------
+    tuple
+        Index of each word with the first segment and the sorted indices
+        of its candidates, not including itself
+    """
+    lengths = [len(s) for s in sequences]
+    band = None
+    index = None
+    if algorithm == 'edit_distance' and max_rel is not None:
+        if 0 <= max_rel < MAX_INDEXED_DISTANCE + 1:
+            deletion_index = corpus_context.get_deletion_index(int(max_rel))
+            index = lambda i: deletion_index.candidates(sequences[i])
+        band = max_rel
+    elif algorithm == 'khorsi' and min_rel is not None:
+        surprisal_index = corpus_context.get_surprisal_index(word_boundaries = False)
+        totals = {j: surprisal_index.total(sequences[j]) for j in ids2}
+        surprisal = surprisal_index.surprisal
+        max_surprisal = max([surprisal[x] for j in ids2 for x in sequences[j]], default = 0)
+        substrings = {}
+        def index(i):
+            query = sequences[i]
+            q = surprisal_index.total(query)
+            #The similarity is 3 * S(lcs) - S(seq1) - S(seq2), so the
+            #longest common substring of a candidate must be at least
+            #long enough to reach min_rel with the least surprising
+            #candidate that the totals allow
+            needed = (min_rel + q + (min_rel + q) / 2) / 3
+            needed -= BOUND_TOLERANCE * (abs(needed) + 1)
+            length = 0
+            if max_surprisal > 0:
+                length = min(int(math.ceil(needed / max_surprisal)), MAX_SUBSTRING_LENGTH)
+            if length < 1:
+                return (surprisal_index.positions[k] for k in
+                        surprisal_index.candidates(query, min_rel))
+            if length not in substrings:
+                substrings[length] = substring_index(sequences, ids2, length)
+            shared = set()
+            for k in range(len(query) - length + 1):
+                shared.update(substrings[length].get(tuple(query[k:k + length]), []))
+            #The same bounds on the totals as SurprisalIndex.candidates
+            margin = BOUND_TOLERANCE * (abs(q) + abs(min_rel) + 1)
+            low = (min_rel + q) / 2 - margin
+            high = 2 * q - min_rel + margin
+            return (j for j in shared if low <= totals[j] <= high)
+    elif algorithm == 'phono_edit_distance' and max_rel is not None:
+        aligner = pam.Aligner(features_tf = True, features = features)
+        segment_indices, costs = aligner.segment_costs()
+        indel = min(min(row[-1] for row in costs[:-1]), min(costs[-1][:-1]))
+        if indel > 0:
+            band = max_rel / indel * (1 + 1e-9)
+
+    ids2_set = set(ids2)
+    for i in ids1:
+        if index is not None:
+            candidates = sorted(j for j in index(i) if j in ids2_set)
+        else:
+            candidates = ids2
+        if band is not None:
+            candidates = [j for j in candidates if abs(lengths[i] - lengths[j]) <= band]
+        yield i, [j for j in candidates if j != i]
+
 def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = None,
                     min_rel = None, max_rel = None, phono_align = False,
-                    min_pairs_okay = False, from_gui=False, stop_check = None,
-                    call_back = None):
+                    min_pairs_okay = False, from_gui=False, num_cores = -1,
+                    stop_check = None, call_back = None):
     """Returns a double that is a measure of the frequency of
     alternation of two sounds in a given corpus
 
@@ -39,6 +292,9 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
         True means allow minimal pairs (e.g. in English, 's' and 't' do not
         alternate in minimal pairs,
         so allowing minimal pairs may skew results)
+    num_cores : int, optional
+        Number of processes to score pairs of words with, -1 to score them
+        in this process
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
@@ -50,8 +306,9 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
         The frequency of alternation of two sounds in a given corpus
     """
 
-    list_seg1 = []
-    list_seg2 = []
+    words = []
+    ids1 = []
+    ids2 = []
     all_words = set()
     if call_back is not None:
         call_back('Finding instances of segments...')
@@ -66,66 +323,62 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
                 call_back(cur)
         tier = getattr(w, corpus_context.sequence_type)
         if seg1 in tier:
-            list_seg1.append(w)
+            ids1.append(len(words))
             all_words.add(w.spelling)
         if seg2 in tier:
-            list_seg2.append(w)
+            ids2.append(len(words))
             all_words.add(w.spelling)
+        words.append(w)
 
-
+    surprisal = None
+    features = None
+    if algorithm == 'khorsi':
+        #Word boundaries are not counted, as in string_similarity
+        surprisal = corpus_context.get_surprisal(word_boundaries = False)
+        sequences = [corpus_context.encode_sequence(w) for w in words]
+    elif algorithm == 'edit_distance':
+        sequences = [corpus_context.encode_sequence(w) for w in words]
+    elif algorithm == 'phono_edit_distance':
+        features = corpus_context.specifier
+        sequences = [list(getattr(w, corpus_context.sequence_type)) for w in words]
+    else:
+        raise(FreqAltError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+    if phono_align:
+        features = corpus_context.specifier
+    transcriptions = [list(w.transcription) for w in words]
 
     if call_back is not None:
         call_back('Calculating string similarities...')
-        call_back(0, len(list_seg1) * len(list_seg2))
+        call_back(0, len(ids1))
         cur = 0
     related_list = []
-    if phono_align:
-        al = pam.Aligner(features = corpus_context.specifier)
-    for w1 in list_seg1:
-        for w2 in list_seg2:
+    blocks = alternation_candidates(corpus_context, algorithm, ids1, ids2,
+                                    sequences, min_rel, max_rel, features)
+    args = (algorithm, sequences, transcriptions, seg1, seg2, surprisal,
+            features, min_rel, max_rel, phono_align, min_pairs_okay)
+    pool = None
+    try:
+        if num_cores == -1:
+            init_scorer(*args)
+            results = (score_candidates(b) for b in blocks)
+        else:
+            pool = Pool(num_cores, init_scorer, args)
+            results = pool.imap(score_candidates, blocks, chunksize = 20)
+        for i, scores in results:
             if stop_check is not None and stop_check():
                 return
             if call_back is not None:
                 cur += 1
-                if cur % 1000 == 0:
-                    #print(len(related_list))
+                if cur % 10 == 0:
                     call_back(cur)
-            if w1 == w2:
-                continue
-            ss = string_similarity(corpus_context, (w1,w2), algorithm)
-            if min_rel is not None and ss[0][-1] < min_rel:
-                continue
-            if max_rel is not None and ss[0][-1] > max_rel:
-                continue
-            if not min_pairs_okay:
-                if len(w1.transcription) == len(w2.transcription):
-                    count_diff = 0
-                    for i in range(len(w1.transcription)):
-                        if w1.transcription[i] != w2.transcription[i]:
-                            count_diff += 1
-                            if count_diff > 1:
-                                break
-                    if count_diff == 1:
-                        continue
-            if phono_align:
-                alignment = al.align(w1.transcription, w2.transcription)
-                if not al.morpho_related(alignment, seg1, seg2):
-                    continue
-
-            related_list.append(ss[0])
+            for j, score in scores:
+                related_list.append((words[i], words[j], score))
+    finally:
+        if pool is not None:
+            pool.terminate()
 
     words_with_alt = set()
-    if call_back is not None:
-        call_back('Calculating frequency of alternation...')
-        call_back(0, len(related_list))
-        cur = 0
     for w1, w2, score in related_list:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
         words_with_alt.add(w1.spelling) #Hacks
         words_with_alt.add(w2.spelling)
 
@@ -305,6 +305,10 @@ class ASDialog(FunctionDialog):
                 'return_all':True}
         if rep == 'mfcc':
             kwargs['num_coeffs'] = coeffs
+        if not real_acousticsim:
+            #Representations are kept between runs, so files that were
+            #already compared are not processed again
+            kwargs['cache'] = os.path.join(self.settings['storage'],'ACOUSTIC')
         if self.compType is None:
             reply = QMessageBox.critical(self,
                     "Missing information", "Please specify a comparison type.")
@@ -40,6 +40,7 @@ class FAWorker(FunctionWorker):
                                 min_pairs_okay=kwargs['include_minimal_pairs'],
                                 from_gui = True, phono_align=kwargs['phono_align'],
                                 output_filename=kwargs['output_filename'],
+                                num_cores = kwargs['num_cores'],
                                 stop_check = kwargs['stop_check'],
                                 call_back = kwargs['call_back'])
                     if self.stopped:
@@ -308,6 +309,7 @@ class FADialog(FunctionDialog):
         kwargs['max_rel'] = max_rel
         kwargs['pair_behavior'] = pairBehaviour
         kwargs['output_filename'] = out_file
+        kwargs['num_cores'] = self.settings['num_cores']
         return kwargs
 
     def setResults(self, results):
@@ -9,7 +9,7 @@ from .imports import *
 from .widgets import (SegmentPairSelectWidget, RadioSelectWidget, TierWidget,
                     ContextWidget)
 from .windows import FunctionWorker, FunctionDialog
-from corpustools.kl.kl import KullbackLeibler
+from corpustools.kl.kl import KullbackLeibler, all_pairs_kl
 
 from corpustools.exceptions import PCTError, PCTPythonError
 
@@ -34,16 +34,24 @@ class KLWorker(FunctionWorker):
             cm = WeightedVariantContext
         with cm(kwargs['corpus'], kwargs['sequence_type'], kwargs['type_token']) as c:
             try:
-                for pair in kwargs['segment_pairs']:
-                    res = KullbackLeibler(c,
-                                    pair[0], pair[1],
-                                    outfile = None,
-                                    side = kwargs['side'],
+                if kwargs.get('all_pairs', False):
+                    #Every pair is ranked from a single count of the contexts
+                    res = all_pairs_kl(c, kwargs['side'],
                                     stop_check = kwargs['stop_check'],
                                     call_back = kwargs['call_back'])
-                    if self.stopped:
-                        break
-                    self.results.append(res)
+                    if not self.stopped:
+                        self.results.extend(res)
+                else:
+                    for pair in kwargs['segment_pairs']:
+                        res = KullbackLeibler(c,
+                                        pair[0], pair[1],
+                                        outfile = None,
+                                        side = kwargs['side'],
+                                        stop_check = kwargs['stop_check'],
+                                        call_back = kwargs['call_back'])
+                        if self.stopped:
+                            break
+                        self.results.append(res)
             except PCTError as e:
                 self.errorEncountered.emit(e)
                 return
@@ -120,6 +128,9 @@ class KLDialog(FunctionDialog):
                                                         )
         optionLayout.addWidget(self.contextRadioWidget)
 
+        self.allPairsCheck = QCheckBox('Rank all pairs of segments')
+        optionLayout.addWidget(self.allPairsCheck)
+
         kllayout.addLayout(optionLayout)
         klframe.setLayout(kllayout)
         self.layout().insertWidget(0, klframe)
@@ -127,7 +138,8 @@ class KLDialog(FunctionDialog):
     def generateKwargs(self):
         kwargs = {}
         segPairs = self.segPairWidget.value()
-        if len(segPairs) == 0:
+        kwargs['all_pairs'] = self.allPairsCheck.isChecked()
+        if len(segPairs) == 0 and not kwargs['all_pairs']:
             reply = QMessageBox.critical(self,
                     "Missing information", "Please specify at least one segment pair.")
             return None
@@ -145,8 +157,13 @@ class KLDialog(FunctionDialog):
         seg_pairs = [tuple(y for y in x) for x in self.segPairWidget.value()]
         context = self.contextRadioWidget.displayValue()
         for i, r in enumerate(results):
+            if self.allPairsCheck.isChecked():
+                #Rows of all pairs start with their segments
+                pair, r = r[:2], r[2:]
+            else:
+                pair = seg_pairs[i]
             self.results.append([self.corpus.name,
-                                seg_pairs[i][0],seg_pairs[i][1],
+                                pair[0],pair[1],
                                 context,
                                 self.tierWidget.displayValue(),
                                 self.typeTokenWidget.value().title(),
@@ -6,7 +6,8 @@ from .imports import *
 
 from .config import Settings, PreferencesDialog
 from .views import (TableWidget, TreeWidget, DiscourseView, ResultsWindow,
-                    LexiconView,PhonoSearchResults, MutualInfoVowelHarmonyWindow)
+                    LexiconView,PhonoSearchResults, SSResults,
+                    MutualInfoVowelHarmonyWindow)
 
 from .models import (CorpusModel, ResultsModel, SpontaneousSpeechCorpusModel,
                     DiscourseModel)
@@ -149,12 +150,14 @@ class MainWindow(QMainWindow):
         self.PDWindow = None
         self.FAWindow = None
         self.SSWindow = None
+        self.SSRun = None
         self.ASWindow = None
         self.NDWindow = None
         self.PPWindow = None
         self.MIWindow = None
         self.KLWindow = None
         self.PhonoSearchWindow = None
+        self.PhonoSearchRun = None
         self.AutoWindow = None
         self.setMinimumWidth(self.menuBar().sizeHint().width())
 
@@ -411,17 +414,58 @@ class MainWindow(QMainWindow):
     @check_for_empty_corpus
     def stringSim(self):
         dialog = SSDialog(self, self.settings, self.corpusModel,self.showToolTips)
-        result = dialog.exec_()
-        if result:
-            if self.SSWindow is not None and dialog.update and self.SSWindow.isVisible():
-                self.SSWindow.table.model().addData(dialog.results)
-            else:
-                self.SSWindow = ResultsWindow('String similarity results',dialog,self)
-                self.SSWindow.show()
-                self.showSSResults.triggered.connect(self.SSWindow.raise_)
-                self.showSSResults.triggered.connect(self.SSWindow.activateWindow)
-                self.SSWindow.rejected.connect(lambda: self.showSSResults.setVisible(False))
-                self.showSSResults.setVisible(True)
+        #Results are shown as they are calculated, rather than once the
+        #calculation is over
+        dialog.resultsStarted.connect(lambda: self.startSSResults(dialog))
+        dialog.rowsFound.connect(lambda rows: self.SSWindow.table.model().addRows(rows))
+        dialog.rowsSorted.connect(lambda: self.sortSSRows(dialog))
+        dialog.rowsCancelled.connect(self.cancelSSRows)
+        dialog.exec_()
+
+    def startSSResults(self, dialog):
+        #The row where the results of the calculation start in the table,
+        #and the window and table to put back if it is cancelled
+        window = self.SSWindow
+        if window is not None and window.isVisible() and dialog.update:
+            self.SSRun = (window.table.model().rowCount(), window, None)
+        elif window is not None and window.isVisible() and window.dialog is dialog:
+            self.SSRun = (0, window, window.table.model())
+            window.setResults(dialog)
+        else:
+            self.SSRun = (0, window, None)
+            self.showSSResultsWindow(dialog)
+
+    def sortSSRows(self, dialog):
+        start = self.SSRun[0]
+        model = self.SSWindow.table.model()
+        model.layoutAboutToBeChanged.emit()
+        model.rows[start:] = dialog.results
+        model.layoutChanged.emit()
+
+    def cancelSSRows(self):
+        start, window, model = self.SSRun
+        self.SSRun = None
+        if self.SSWindow is not window:
+            #The window made for the calculation is removed
+            self.SSWindow.hide()
+            self.SSWindow = window
+            self.showSSResults.setVisible(window is not None and window.isVisible())
+        elif model is not None:
+            self.SSWindow.table.setModel(model)
+        else:
+            model = self.SSWindow.table.model()
+            if model.rowCount() > start:
+                model.beginRemoveRows(QModelIndex(), start, model.rowCount() - 1)
+                del model.rows[start:]
+                model.endRemoveRows()
+
+    def showSSResultsWindow(self, dialog):
+        self.SSWindow = SSResults('String similarity results',dialog,self)
+        self.SSWindow.show()
+        self.showSSResults.triggered.connect(self.SSWindow.raise_)
+        self.showSSResults.triggered.connect(self.SSWindow.activateWindow)
+        self.SSWindow.rejected.connect(lambda: self.showSSResults.setVisible(False))
+        self.showSSResults.setVisible(True)
 
     @check_for_empty_corpus
     @check_for_transcription
@@ -579,18 +623,44 @@ class MainWindow(QMainWindow):
 
     def phonoSearch(self):
         dialog = PhonoSearchDialog(self, self.settings, self.corpusModel.corpus, self.showToolTips)
-        result = dialog.exec_()
-        if result:
-            if self.PhonoSearchWindow is not None and dialog.update and self.PhonoSearchWindow.isVisible():
-                self.PhonoSearchWindow.table.model().addRows(dialog.results)
-            else:
-                self.PhonoSearchWindow = PhonoSearchResults(
-                                'Phonological search results',dialog,self)
-                self.PhonoSearchWindow.show()
-                self.showSearchResults.triggered.connect(self.PhonoSearchWindow.raise_)
-                self.showSearchResults.triggered.connect(self.PhonoSearchWindow.activateWindow)
-                self.PhonoSearchWindow.rejected.connect(lambda: self.showSearchResults.setVisible(False))
-                self.showSearchResults.setVisible(True)
+        #Results are shown as they are found, rather than once the search
+        #is over
+        dialog.resultsStarted.connect(lambda: self.startPhonoSearchResults(dialog))
+        dialog.rowsFound.connect(lambda rows: self.PhonoSearchWindow.table.model().addRows(rows))
+        dialog.rowsCancelled.connect(self.cancelPhonoSearchRows)
+        dialog.exec_()
+
+    def startPhonoSearchResults(self, dialog):
+        #The window and results to put back if the search is cancelled
+        window = self.PhonoSearchWindow
+        if window is not None and window.isVisible() and dialog.update:
+            self.PhonoSearchRun = (window, set(window.table.model().allData))
+        elif window is not None and window.isVisible() and window.dialog is dialog:
+            self.PhonoSearchRun = (window, set(window.table.model().allData))
+            window.setResults(dialog)
+        else:
+            self.PhonoSearchRun = (window, None)
+            self.showPhonoSearchResults(dialog)
+
+    def cancelPhonoSearchRows(self):
+        window, results = self.PhonoSearchRun
+        self.PhonoSearchRun = None
+        if self.PhonoSearchWindow is not window:
+            #The window made for the search is removed
+            self.PhonoSearchWindow.hide()
+            self.PhonoSearchWindow = window
+            self.showSearchResults.setVisible(window is not None and window.isVisible())
+        else:
+            self.PhonoSearchWindow.table.model().setAllData(results)
+
+    def showPhonoSearchResults(self, dialog):
+        self.PhonoSearchWindow = PhonoSearchResults(
+                        'Phonological search results',dialog,self)
+        self.PhonoSearchWindow.show()
+        self.showSearchResults.triggered.connect(self.PhonoSearchWindow.raise_)
+        self.showSearchResults.triggered.connect(self.PhonoSearchWindow.activateWindow)
+        self.PhonoSearchWindow.rejected.connect(lambda: self.showSearchResults.setVisible(False))
+        self.showSearchResults.setVisible(True)
 
     def createWord(self):
         dialog = AddWordDialog(self, self.corpusModel.corpus)
@@ -2,7 +2,7 @@
 
 from collections import OrderedDict
 
-from corpustools.mutualinfo.mutual_information import pointwise_mi
+from corpustools.mutualinfo.mutual_information import mi_matrix
 
 from .imports import *
 from .widgets import (BigramWidget, RadioSelectWidget, TierWidget, ContextWidget)
@@ -31,15 +31,18 @@ class MIWorker(FunctionWorker):
             cm = WeightedVariantContext
         with cm(kwargs['corpus'], kwargs['sequence_type'], kwargs['type_token']) as c:
             try:
-                for pair in kwargs['segment_pairs']:
-                    res = pointwise_mi(c, pair,
-                            halve_edges = kwargs['halve_edges'],
-                            in_word = kwargs['in_word'],
-                            stop_check = kwargs['stop_check'],
-                            call_back = kwargs['call_back'])
-                    if self.stopped:
-                        break
-                    self.results.append(res)
+                #Mutual information of every bigram is calculated at once
+                matrix = mi_matrix(c, halve_edges = kwargs['halve_edges'],
+                        in_word = kwargs['in_word'],
+                        stop_check = kwargs['stop_check'],
+                        call_back = kwargs['call_back'])
+                #The matrix is None if the calculation was stopped
+                if matrix is not None:
+                    for pair in kwargs['segment_pairs']:
+                        res = matrix[pair]
+                        if self.stopped:
+                            break
+                        self.results.append(res)
             except PCTError as e:
                 self.errorEncountered.emit(e)
                 return
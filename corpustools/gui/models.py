@@ -470,7 +470,9 @@ class ResultsModel(BaseTableModel):
         QAbstractTableModel.__init__(self,parent)
         self.settings = settings
         self.columns = header
-        self.rows = results
+        #Copied so that rows added to the results afterwards are only
+        #added through addRows
+        self.rows = list(results)
 
 class PhonoSearchResultsModel(BaseTableModel):
     def __init__(self, header, summary_header, results, settings, parent=None):
@@ -512,11 +514,22 @@ class PhonoSearchResultsModel(BaseTableModel):
             self.columns = self.header
         self.layoutChanged.emit()
 
+    def setAllData(self, rows):
+        self.layoutAboutToBeChanged.emit()
+        self.allData = set(rows)
+        if self.summarized:
+            self._summarize()
+        else:
+            self.rows = sorted(self.allData)
+        self.layoutChanged.emit()
+
     def addRows(self,rows):
         self.layoutAboutToBeChanged.emit()
         self.allData.update(rows)
         if self.summarized:
             self._summarize()
+        else:
+            self.rows = sorted(self.allData)
         self.layoutChanged.emit()
 
 class TreeItem(object):
@@ -7,7 +7,7 @@ from .widgets import (EnvironmentSelectWidget,
 from .windows import FunctionWorker, FunctionDialog
 import itertools
 
-from corpustools.prod.pred_of_dist import (calc_prod, calc_prod_all_envs)
+from corpustools.prod.pred_of_dist import calc_prod_pairs
 
 from corpustools.exceptions import PCTError, PCTPythonError
 
@@ -33,24 +33,15 @@ class PDWorker(FunctionWorker):
         with cm(kwargs['corpus'], kwargs['sequence_type'], kwargs['type_token']) as c:
             try:
                 envs = kwargs.pop('envs', None)
-                for pair in kwargs['segment_pairs']:
-                    if envs is not None:
-                        for env in envs:
-                            env.middle = set(pair)
-                        res = calc_prod(c,
-                                envs,
+                #The environments of every pair are counted in one pass
+                res = calc_prod_pairs(c, kwargs['segment_pairs'], envs,
                                 kwargs['strict'],
                                 all_info = True,
+                                num_cores = kwargs['num_cores'],
                                 stop_check = kwargs['stop_check'],
                                 call_back = kwargs['call_back'])
-                    else:
-                        res = calc_prod_all_envs(c, pair[0], pair[1],
-                            all_info = True,
-                            stop_check = kwargs['stop_check'],
-                            call_back = kwargs['call_back'])
-                    if self.stopped:
-                        break
-                    self.results.append(res)
+                if not self.stopped:
+                    self.results.extend(res)
             except PCTError as e:
                 self.errorEncountered.emit(e)
                 return
@@ -231,6 +222,7 @@ class PDDialog(FunctionDialog):
         kwargs['sequence_type'] = self.tierWidget.value()
         kwargs['strict'] = self.enforceCheck.isChecked()
         kwargs['type_token'] = self.typeTokenWidget.value()
+        kwargs['num_cores'] = self.settings['num_cores']
         return kwargs
 
     def setResults(self,results):
@@ -9,16 +9,31 @@ from .widgets import (EnvironmentSelectWidget, SegmentPairSelectWidget,
 from .windows import FunctionWorker, FunctionDialog
 
 from corpustools.corpus.classes.lexicon import EnvironmentFilter
-from corpustools.phonosearch import phonological_search
+from corpustools.phonosearch import iter_phonological_search
 
 from corpustools.exceptions import PCTError, PCTPythonError
 
 class PSWorker(FunctionWorker):
+    #Words are sent on in batches as they are found, so that the results
+    #table can be filled before the search is over
+    resultsFound = Signal(object)
+    batch_size = 100
+
     def run(self):
         time.sleep(0.1)
         kwargs = self.kwargs
+        self.results = []
         try:
-            self.results = phonological_search(**kwargs)
+            batch = []
+            for result in iter_phonological_search(**kwargs):
+                batch.append(result)
+                if len(batch) == self.batch_size and not self.stopped:
+                    self.results.extend(batch)
+                    self.resultsFound.emit(batch)
+                    batch = []
+            if batch and not self.stopped:
+                self.results.extend(batch)
+                self.resultsFound.emit(batch)
 
         except PCTError as e:
             self.errorEncountered.emit(e)
@@ -34,6 +49,13 @@ class PSWorker(FunctionWorker):
         self.dataReady.emit(self.results)
 
 class PhonoSearchDialog(FunctionDialog):
+    #Emitted before the first result rows of a search
+    resultsStarted = Signal()
+    #Emitted with each batch of result rows as they are found
+    rowsFound = Signal(object)
+    #Emitted when a search that has started its results is cancelled
+    rowsCancelled = Signal()
+
     header = ['Word',
                 'Transcription',
                 'Segment',
@@ -75,6 +97,10 @@ class PhonoSearchDialog(FunctionDialog):
         self.layout().insertWidget(0,psFrame)
         self.setWindowTitle('Phonological search')
         self.progressDialog.setWindowTitle('Searching')
+        self.thread.resultsFound.connect(self.addResults)
+        self.thread.finishedCancelling.connect(self.cancelResults)
+        self.results = []
+        self.started = False
 
     def generateKwargs(self):
         kwargs = {}
@@ -92,13 +118,42 @@ class PhonoSearchDialog(FunctionDialog):
         kwargs['sequence_type'] = self.tierWidget.value()
         return kwargs
 
-    def setResults(self,results):
+    def calc(self):
         self.results = []
+        self.started = False
+        FunctionDialog.calc(self)
+
+    def startResults(self):
+        if not self.started:
+            self.started = True
+            self.resultsStarted.emit()
+
+    def cancelResults(self):
+        if self.started:
+            self.rowsCancelled.emit()
+        self.results = []
+        self.started = False
+
+    def resultRows(self, results):
+        rows = []
         for w,f in results:
             segs = tuple(x.middle for x in f)
             try:
                 envs = tuple(str(x) for x in f)
             except IndexError:
                 envs = tuple()
-            self.results.append((w, str(getattr(w,self.tierWidget.value())), segs,
+            rows.append((w, str(getattr(w,self.tierWidget.value())), segs,
                                 envs))
+        return rows
+
+    def addResults(self, results):
+        rows = self.resultRows(results)
+        self.startResults()
+        self.results.extend(rows)
+        self.progressDialog.updateText('Found {} words...'.format(len(self.results)))
+        self.rowsFound.emit(rows)
+
+    def setResults(self, results):
+        #Rows are added by addResults as they are found, and searches
+        #without results still start a new results table
+        self.startResults()
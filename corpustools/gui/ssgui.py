@@ -3,7 +3,9 @@ from .imports import *
 
 from collections import OrderedDict
 
-from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.corpus.classes import Word
+from corpustools.symbolsim.string_similarity import (string_similarity,
+                                            iter_string_similarity, most_related)
 from corpustools.symbolsim.io import read_pairs_file
 from corpustools.exceptions import PCTError, PCTPythonError
 
@@ -18,6 +20,11 @@ from corpustools.contextmanagers import (CanonicalVariantContext,
                                         WeightedVariantContext)
 
 class SSWorker(FunctionWorker):
+    #Emitted with each batch of results as they are calculated
+    dataAdded = Signal(object)
+
+    batch_size = 500
+
     def run(self):
         time.sleep(0.1)
         kwargs = self.kwargs
@@ -33,8 +40,21 @@ class SSWorker(FunctionWorker):
             try:
                 query = kwargs.pop('query')
                 alg = kwargs.pop('algorithm')
-                self.results = string_similarity(c,
+                if isinstance(query, Word) and kwargs.get('top_k') is not None:
+                    self.results = string_similarity(c,
                                             query, alg,**kwargs)
+                else:
+                    #Results are sent to the dialog as they are
+                    #calculated, rather than all at the end
+                    self.results = None
+                    batch = []
+                    for result in iter_string_similarity(c, query, alg, **kwargs):
+                        batch.append(result)
+                        if len(batch) == self.batch_size and not self.stopped:
+                            self.dataAdded.emit(batch)
+                            batch = []
+                    if batch and not self.stopped:
+                        self.dataAdded.emit(batch)
             except PCTError as e:
                 self.errorEncountered.emit(e)
                 return
@@ -80,8 +100,21 @@ class SSDialog(FunctionDialog):
 
     name = 'string similarity'
 
+    #Emitted before the first result rows of a calculation
+    resultsStarted = Signal()
+    #Emitted with each batch of result rows as they are calculated
+    rowsFound = Signal(object)
+    #Emitted once the result rows have been sorted at the end
+    rowsSorted = Signal()
+    #Emitted when a calculation that has started its results is cancelled
+    rowsCancelled = Signal()
+
     def __init__(self, parent, settings, corpusModel, showToolTips):
         FunctionDialog.__init__(self, parent, settings, SSWorker())
+        self.results = list()
+        self.started = False
+        self.thread.dataAdded.connect(self.addResults)
+        self.thread.finishedCancelling.connect(self.cancelResults)
 
         self.corpusModel = corpusModel
         self.showToolTips = showToolTips
@@ -198,6 +231,17 @@ class SSDialog(FunctionDialog):
 
         optionLayout.addWidget(threshFrame)
 
+        topFrame = QGroupBox('Return only the most similar words...')
+
+        self.topEdit = QLineEdit()
+
+        vbox = QFormLayout()
+        vbox.addRow('Number of words:',self.topEdit)
+
+        topFrame.setLayout(vbox)
+
+        optionLayout.addWidget(topFrame)
+
         optionFrame.setLayout(optionLayout)
 
         sslayout.addWidget(optionFrame)
@@ -309,13 +353,20 @@ class SSDialog(FunctionDialog):
                 max_rel = float(self.maxEdit.text())
             except ValueError:
                 pass
+        top_k = None
+        if self.topEdit.text() != '':
+            try:
+                top_k = int(self.topEdit.text())
+            except ValueError:
+                pass
         kwargs = {'corpusModel':self.corpusModel,
                 'context': self.variantsWidget.value(),
                 'algorithm': self.algorithmWidget.value(),
                 'sequence_type':self.tierWidget.value(),
                 'type_token': self.typeTokenWidget.value(),
                 'min_rel':min_rel,
-                'max_rel':max_rel}
+                'max_rel':max_rel,
+                'top_k':top_k}
         #Error checking
         if self.compType is None:
             reply = QMessageBox.critical(self,
@@ -398,8 +449,24 @@ class SSDialog(FunctionDialog):
             kwargs['query'] = read_pairs_file(pairs_path)
         return kwargs
 
-    def setResults(self, results):
+    def calc(self):
+        self.results = list()
+        self.started = False
+        FunctionDialog.calc(self)
+
+    def startResults(self):
+        if not self.started:
+            self.started = True
+            self.resultsStarted.emit()
+
+    def cancelResults(self):
+        if self.started:
+            self.rowsCancelled.emit()
         self.results = list()
+        self.started = False
+
+    def addResults(self, results):
+        rows = []
         for result in results:
             w1, w2, similarity = result
             if not isinstance(w1,str):
@@ -410,12 +477,26 @@ class SSDialog(FunctionDialog):
                 typetoken = 'N/A'
             else:
                 typetoken = self.typeTokenWidget.value().title()
-            self.results.append([self.corpusModel.corpus.name, w1, w2,
+            rows.append([self.corpusModel.corpus.name, w1, w2,
                         self.algorithmWidget.displayValue(),
                         self.tierWidget.displayValue(),
                         typetoken,
                         self.variantsWidget.value().title(),
                          similarity ])
+        self.startResults()
+        self.results.extend(rows)
+        self.rowsFound.emit(rows)
+
+    def setResults(self, results):
+        if results is not None:
+            self.results = list()
+            self.addResults(results)
+        elif self.compType in ['one', 'nonword'] and self.results:
+            #Results added as they were calculated are not sorted yet
+            self.results[:] = most_related(self.results, self.algorithmWidget.value())
+            self.rowsSorted.emit()
+        #Calculations without results still start a new results table
+        self.startResults()
 
     def khorsiSelected(self):
         self.typeTokenWidget.enable()
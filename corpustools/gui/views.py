@@ -837,6 +837,19 @@ class ResultsWindow(QDialog):
                 for row in self.table.model().rows:
                     writer.writerow(row)
 
+class SSResults(ResultsWindow):
+    def setResults(self, dialog):
+        self.dialog = dialog
+        dataModel = ResultsModel(self.dialog.header,self.dialog.results, self._parent.settings)
+        self.table.setModel(dataModel)
+
+    def redo(self):
+        #Rows are added to the table by the main window as they are
+        #calculated
+        self.dialog.exec_()
+        self.raise_()
+        self.activateWindow()
+
 class PhonoSearchResults(ResultsWindow):
     def __init__(self, title, dialog, parent):
         ResultsWindow.__init__(self, title, dialog, parent)
@@ -860,14 +873,16 @@ class PhonoSearchResults(ResultsWindow):
             self.summaryButton.setText('Show individual results')
         self.summarized = not self.summarized
 
-    def redo(self):
-        if self.dialog.exec_():
-            if self.dialog.update:
-                self.table.model().addRows(self.dialog.results)
-            else:
-                dataModel = PhonoSearchResultsModel(self.dialog.header,
+    def setResults(self, dialog):
+        self.dialog = dialog
+        dataModel = PhonoSearchResultsModel(self.dialog.header,
                         self.dialog.summary_header,
-                                self.dialog.results, self._parent.settings)
-                self.table.setModel(dataModel)
+                        self.dialog.results, self._parent.settings)
+        dataModel.setSummarized(self.summarized)
+        self.table.setModel(dataModel)
+
+    def redo(self):
+        #Rows are added to the table by the main window as they are found
+        self.dialog.exec_()
         self.raise_()
         self.activateWindow()
@@ -5,6 +5,8 @@ from collections import defaultdict
 import os
 from codecs import open
 
+import numpy as np
+
 from corpustools.exceptions import KLError
 
 class Context(object):
@@ -143,24 +145,178 @@ def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
     return seg1_entropy, seg2_entropy, KL, ur, is_spurious
 
 
+class ContextCounts(object):
+    """
+    Frequencies of every segment in every context of a corpus context,
+    for the contexts of each side, counted in a single pass over the
+    corpus.
+
+    As in ``KullbackLeibler``, the context of the 'right' side is the
+    preceding symbol, the context of the 'left' side is the following
+    symbol and the context of 'both' sides is the pair of them, with word
+    boundaries as '#'.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+
+    Attributes
+    ----------
+    segments : list
+        Segment symbols, in the order of the columns
+    contexts : dict
+        Contexts of each side ('l', 'r' and 'b'), in the order of the rows
+    counts : dict
+        Array of the frequencies of each segment (columns) in each
+        context (rows) of each side
+    """
+    def __init__(self, corpus_context):
+        self.segments = []
+        segment_index = {}
+        self.contexts = {'l': [], 'r': [], 'b': []}
+        context_index = {'l': {}, 'r': {}, 'b': {}}
+        entries = {'l': [], 'r': [], 'b': []}
+        columns = []
+        frequencies = []
+        for word in corpus_context:
+            tier = getattr(word, corpus_context.sequence_type)
+            symbols = tier.with_word_boundaries()
+            for pos in range(1, len(symbols)-1):
+                seg = symbols[pos]
+                if seg not in segment_index:
+                    segment_index[seg] = len(self.segments)
+                    self.segments.append(seg)
+                columns.append(segment_index[seg])
+                frequencies.append(word.frequency)
+                for side, c in (('r', symbols[pos-1]), ('l', symbols[pos+1]),
+                                ('b', (symbols[pos-1], symbols[pos+1]))):
+                    index = context_index[side]
+                    if c not in index:
+                        index[c] = len(self.contexts[side])
+                        self.contexts[side].append(c)
+                    entries[side].append(index[c])
+        columns = np.array(columns, dtype = int)
+        frequencies = np.array(frequencies, dtype = float)
+        self.counts = {}
+        for side in entries:
+            rows = np.array(entries[side], dtype = int)
+            counts = np.zeros((len(self.contexts[side]), len(self.segments)))
+            np.add.at(counts, (rows, columns), frequencies)
+            self.counts[side] = counts
+
+    def divergences(self, segments, side):
+        """
+        Calculate the entropy of the distribution of each segment over the
+        contexts of a side, and the Kullback-Leibler divergence between
+        the distributions of every pair of segments
+
+        Parameters
+        ----------
+        segments : list
+            Segment symbols, segments that do not occur in the corpus
+            have frequencies of 0 in every context
+        side : str
+            One of 'right', 'left' or 'both'
+
+        Returns
+        -------
+        numpy.ndarray
+            Entropy of each segment
+        numpy.ndarray
+            Symmetric matrix of the divergences between segments
+        """
+        side = side[0] if side[:1] in ('l', 'r') else 'b'
+        counts = self.counts[side]
+        index = {s: i for i, s in enumerate(self.segments)}
+        selected = np.zeros((counts.shape[0], len(segments)))
+        for k, s in enumerate(segments):
+            if s in index:
+                selected[:, k] = counts[:, index[s]]
+        num_contexts = counts.shape[0]
+        #Probabilities of contexts given segments, with add-one smoothing
+        P = (selected + 1) / (selected.sum(axis = 0) + num_contexts)
+        #cross[i, j] is the sum over contexts of P(c|i) * log(P(c|j))
+        cross = P.T @ np.log(P)
+        own = np.diag(cross)
+        kl = own[:, None] + own[None, :] - cross - cross.T
+        entropies = own + log(num_contexts) * P.sum(axis = 0)
+        return entropies, kl
+
+def all_pairs_kl(corpus_context, side, stop_check = None, call_back = None):
+    """
+    Calculate the Kullback-Leibler divergence of every pair of segments in
+    the inventory, with the entropies and underlying form guesses of
+    ``KullbackLeibler``, from a single pass over the corpus.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    side : str
+        One of 'right', 'left' or 'both'
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list
+        Tuples of the first segment, the second segment, their entropies,
+        their divergence, the possible UR and whether the allophones may
+        be spurious, from the highest to the lowest divergence
+    """
+    if call_back is not None:
+        call_back('Counting contexts...')
+        call_back(0, 0)
+    counts = corpus_context.get_context_counts()
+    segments = []
+    for seg in corpus_context.inventory:
+        symbol = seg if isinstance(seg, str) else seg.symbol
+        if symbol != '#' and symbol not in segments:
+            segments.append(symbol)
+    entropies, kl = counts.divergences(segments, side)
+    if call_back is not None:
+        call_back('Checking for spurious allophones...')
+        call_back(0, len(segments))
+    results = []
+    for i in range(len(segments)):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            call_back(i)
+        for j in range(i + 1, len(segments)):
+            if entropies[i] < entropies[j]:
+                ur, sr = segments[i], segments[j]
+            else:
+                ur, sr = segments[j], segments[i]
+            results.append((segments[i], segments[j], float(entropies[i]),
+                            float(entropies[j]), float(kl[i, j]), ur,
+                            check_spurious([ur], [sr], corpus_context)))
+    results.sort(key = lambda x: -x[4])
+    return results
+
 def check_spurious(ur, sr, corpus_context):
     if len(ur) > 1: #Set of segments, probably supplied from GUI, hack until refactor
         return 'No'
     #returns a string, not a bool, for printing to a results table
     if corpus_context.specifier is None:
         return 'Maybe'
-    ur = corpus_context.corpus.segment_to_features(ur[0]).features
-    sr = corpus_context.corpus.segment_to_features(sr[0]).features
-    diff = lambda flist1,flist2: len([f1 for f1,f2 in zip(sorted(flist1.values()),
-                                                          sorted(flist2.values()))
-                                      if not f1==f2])
+    #With an underspecification cost of 1, distances are numbers of
+    #features with different values
+    indices, distances = corpus_context.specifier.segment_distances(underspec_cost = 1)
+    ur = indices[ur[0]]
+    sr = indices[sr[0]]
 
-    seg_diff = diff(ur, sr)
+    seg_diff = distances[ur, sr]
     if seg_diff == 1:
         return 'No' #minimally different, could be allophones
 
     for seg in corpus_context.inventory:
-        if diff(seg.features, ur) < seg_diff:
+        if seg.symbol not in indices or indices[seg.symbol] in (ur, sr):
+            continue
+        if distances[indices[seg.symbol], ur] < seg_diff:
             return 'Yes' #something else is more similar
 
     return 'Maybe' #nothing else is more similar
@@ -0,0 +1,83 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+class SegmentIncidence(object):
+    """
+    Which segments occur in which words of a corpus context, as a sparse
+    binary matrix of words by segments, for counting the words that
+    contain each segment or pair of segments regardless of position.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+
+    Attributes
+    ----------
+    segments : list
+        Segment symbols, in the order of the columns
+    incidence : scipy.sparse.csr_matrix
+        1 where the segment of the column occurs in the word of the row
+    frequencies : numpy.ndarray
+        Frequency of the word of each row
+    """
+    def __init__(self, corpus_context):
+        words = [w for w in corpus_context]
+        segment_ids = corpus_context.get_segment_ids(words)
+        self.segments = [None] * len(segment_ids)
+        for s, i in segment_ids.items():
+            self.segments[i - 1] = s
+        rows = []
+        columns = []
+        for i, w in enumerate(words):
+            ids = set(segment_ids[s] for s in getattr(w, corpus_context.sequence_type))
+            rows.extend([i] * len(ids))
+            columns.extend(x - 1 for x in ids)
+        self.incidence = csr_matrix((np.ones(len(rows)), (rows, columns)),
+                                    shape = (len(words), len(self.segments)))
+        self.frequencies = np.array([w.frequency for w in words], dtype = float)
+        self._index = {s: i for i, s in enumerate(self.segments)}
+        self._cooccurrence = None
+
+    def __len__(self):
+        return self.incidence.shape[0]
+
+    def cooccurrence(self):
+        """
+        Get the summed frequency of the words that contain each pair of
+        segments, from a single weighted product of the incidence matrix
+        with itself
+
+        Returns
+        -------
+        numpy.ndarray
+            Summed frequency of the words containing both the segment of
+            the row and the segment of the column, with the summed
+            frequency of the words containing each segment on the diagonal
+        """
+        if self._cooccurrence is None:
+            weighted = self.incidence.multiply(self.frequencies[:, None]).tocsr()
+            self._cooccurrence = (self.incidence.T @ weighted).toarray()
+        return self._cooccurrence
+
+    def frequency(self, segments):
+        """
+        Get the summed frequency of the words that contain one or two
+        segments
+
+        Parameters
+        ----------
+        segments : tuple
+            One segment, or a pair of segments
+
+        Returns
+        -------
+        float
+            Summed frequency of the words containing all the segments, 0
+            if any of them is not in the corpus context
+        """
+        try:
+            ids = [self._index[s] for s in segments]
+        except KeyError:
+            return 0.0
+        return float(self.cooccurrence()[ids[0], ids[-1]])
@@ -5,7 +5,7 @@ import math
 from collections import defaultdict
 from corpustools.corpus.classes.lexicon import CorpusIntegrityError
 
-import time
+import numpy as np
 
 from corpustools.exceptions import MutualInfoError
 
@@ -60,7 +60,7 @@ def pointwise_mi(corpus_context, query, halve_edges = False, in_word = False,
     try:
         prob_bg = bigram_dict[query]
     except KeyError:
-        raise MutualInfoError('The bigram {} was not found in the corpus using {}s'.format(''.join(query),sequence_type))
+        raise MutualInfoError('The bigram {} was not found in the corpus using {}s'.format(''.join(query),corpus_context.sequence_type))
 
 
     if unigram_dict[query[0]] == 0.0:
@@ -75,42 +75,178 @@ def pointwise_mi(corpus_context, query, halve_edges = False, in_word = False,
 
 
 def get_in_word_unigram_frequencies(corpus_context, query):
-    totals = [0 for x in query]
-    for word in corpus_context:
-        for i, q in enumerate(query):
-            if q in getattr(word, corpus_context.sequence_type):
-                totals[i] += word.frequency
-    return {k: totals[i] / len(corpus_context) for i, k in enumerate(query)}
+    incidence = corpus_context.get_segment_incidence()
+    return {k: incidence.frequency((k,)) / len(incidence) for k in query}
 
 def get_in_word_bigram_frequency(corpus_context, query):
-    total = 0
-    for word in corpus_context:
-        tier = getattr(word, corpus_context.sequence_type)
-        if all(x in tier for x in query):
-            total += word.frequency
-    return {query: total / len(corpus_context)}
+    incidence = corpus_context.get_segment_incidence()
+    return {query: incidence.frequency(query) / len(incidence)}
+
+class MutualInfoMatrix(object):
+    """
+    Pointwise mutual information of every ordered pair of segments in a
+    corpus context, as a matrix labelled with the segments.
+
+    Parameters
+    ----------
+    segments : list
+        Segment symbols, in the order of the rows and columns
+    values : numpy.ndarray
+        Mutual information of the bigram of the segment of each row
+        followed by the segment of each column, NaN for bigrams that do
+        not occur in the corpus
+    """
+    def __init__(self, segments, values):
+        self.segments = segments
+        self.values = values
+        self._index = {s: i for i, s in enumerate(segments)}
+
+    def __getitem__(self, query):
+        """
+        Get the mutual information of a bigram, raising the same errors as
+        ``pointwise_mi`` for bigrams that do not occur in the corpus
+
+        Parameters
+        ----------
+        query : tuple
+            Tuple of two strings, each a segment/letter
+
+        Returns
+        -------
+        float
+            Mutual information of the bigram
+        """
+        for s in query:
+            if s not in self._index:
+                raise(MutualInfoError('The segment {} was not found in the corpus'.format(s)))
+        value = self.values[self._index[query[0]], self._index[query[1]]]
+        if np.isnan(value):
+            raise(MutualInfoError('Warning! Mutual information could not be calculated because the bigram {} is not in the corpus.'.format(str(query))))
+        return float(value)
+
+    def pairs(self):
+        """
+        Get the mutual information of every bigram that occurs in the corpus
+
+        Returns
+        -------
+        list
+            Tuples of a bigram and its mutual information, from the lowest
+            to the highest mutual information
+        """
+        rows, columns = (~np.isnan(self.values)).nonzero()
+        order = np.argsort(self.values[rows, columns], kind = 'mergesort')
+        return [((self.segments[rows[k]], self.segments[columns[k]]),
+                    float(self.values[rows[k], columns[k]])) for k in order]
+
+def mi_matrix(corpus_context, halve_edges = False, in_word = False,
+                stop_check = None, call_back = None):
+    """
+    Calculate the mutual information of every ordered pair of segments at
+    once, from the unigram and bigram frequencies of the corpus
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    halve_edges : bool
+        Flag whether to only count word boundaries once per word rather than
+        twice, defaults to False
+    in_word : bool
+        Flag to calculate non-local, non-ordered mutual information from
+        the words that contain each segment and pair of segments,
+        defaults to False
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    MutualInfoMatrix
+        Mutual information of every bigram, with the segments of the
+        inventory that occur in the corpus (including word boundaries,
+        unless in_word is set), or None if stopped early
+    """
+    if call_back is not None:
+        call_back("Generating probabilities...")
+        call_back(0,0)
+    if in_word:
+        incidence = corpus_context.get_segment_incidence()
+        if stop_check is not None and stop_check():
+            return None
+        counts = incidence.cooccurrence()
+        present = np.diag(counts) > 0
+        unigram_dict = {s: counts[i, i] / len(incidence)
+                        for i, s in enumerate(incidence.segments) if present[i]}
+    else:
+        unigram_dict = corpus_context.get_frequency_base(gramsize = 1, halve_edges = halve_edges,
+                                            probability=True, stop_check = stop_check)
+        if unigram_dict is None:
+            return None
+        bigram_dict = corpus_context.get_frequency_base(gramsize = 2, halve_edges = halve_edges,
+                                            probability=True, stop_check = stop_check)
+        if bigram_dict is None:
+            return None
+    segments = []
+    for s in corpus_context.inventory:
+        if type(s) != str:
+            s = s.symbol
+        if s in unigram_dict and s not in segments:
+            segments.append(s)
+    segments.extend(sorted(s for s in unigram_dict if s != 'total' and s not in segments))
+    index = {s: i for i, s in enumerate(segments)}
+
+    unigrams = np.array([unigram_dict[s] for s in segments], dtype = float)
+    if in_word:
+        columns = [incidence.segments.index(s) for s in segments]
+        bigrams = counts[np.ix_(columns, columns)] / len(incidence)
+    else:
+        bigrams = np.zeros((len(segments), len(segments)))
+        for k, v in bigram_dict.items():
+            if stop_check is not None and stop_check():
+                return None
+            if k == 'total' or k[0] not in index or k[1] not in index:
+                continue
+            bigrams[index[k[0]], index[k[1]]] = v
+    expected = np.outer(unigrams, unigrams)
+    values = np.full(bigrams.shape, np.nan)
+    defined = (bigrams > 0) & (expected > 0)
+    values[defined] = np.log2(bigrams[defined] / expected[defined])
+    return MutualInfoMatrix(segments, values)
 
 def all_mis(corpus_context,
             halve_edges = False, in_word = False,
             stop_check = None, call_back = None):
-    mis = {}
-    total_calculations = ((len(corpus_context.inventory)**2)-len(corpus_context.inventory)/2)+1
-    ct = 1
-    t = time.time()
-    for s1 in corpus_context.inventory:
-        for s2 in corpus_context.inventory:
-                #print('Performing MI calculation {} out of {} possible'.format(str(ct), str(total_calculations)))
-                ct += 1
-                #print('Duration of last calculation: {}'.format(str(time.time() - t)))
-                t = time.time()
-                if type(s1) != str:
-                    s1 = s1.symbol
-                if type(s2) != str:
-                    s2 = s2.symbol
-                #print(s1,s2)
-                mi = pointwise_mi(corpus_context, (s1, s2), halve_edges = halve_edges, in_word = in_word)
-                mis[(s1,s2)] = mi
-
-    ordered_mis = sorted([(pair, str(mis[pair])) for pair in mis], key=lambda p: p[1])
-
-    return ordered_mis
+    """
+    Calculate the mutual information of every ordered pair of segments in
+    the inventory
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    halve_edges : bool
+        Flag whether to only count word boundaries once per word rather than
+        twice, defaults to False
+    in_word : bool
+        Flag to calculate non-local, non-ordered mutual information,
+        defaults to False
+    stop_check : callable or None
+        Optional function to check whether to gracefully terminate early
+    call_back : callable or None
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list
+        Tuples of each pair of segments and its mutual information (as a
+        string), from the lowest to the highest mutual information, for
+        pairs whose mutual information can be calculated, or None if
+        stopped early
+    """
+    matrix = mi_matrix(corpus_context, halve_edges = halve_edges, in_word = in_word,
+                        stop_check = stop_check, call_back = call_back)
+    if matrix is None:
+        return None
+    return [(pair, str(mi)) for pair, mi in matrix.pairs()]
@@ -0,0 +1,130 @@
+import numpy as np
+
+from corpustools.symbolsim.phono_align import Aligner
+
+def relaxation_factor(specifier, underspec_cost = 0.25):
+    """Returns how far the feature-based segment costs of a feature
+    system are from satisfying the triangle inequality.
+
+    The factor is the smallest C such that for all segments (and the
+    empty segment) x, y and z, cost(x, z) <= C * (cost(x, y) + cost(y, z)).
+    Costs of aligning two sequences are sums of segment costs, so the
+    phonological edit distance satisfies the same relaxed inequality.
+    Features that are unspecified ('0') in some segments can make the
+    factor greater than 1.
+
+    Parameters
+    ----------
+    specifier: FeatureMatrix
+        Feature system to evaluate
+    underspec_cost: float
+        Cost of a difference between a specified and an unspecified feature
+
+    Returns
+    -------
+    float
+        The relaxation factor, 1.0 for a true metric
+    """
+    aligner = Aligner(features_tf = True, features = specifier,
+                        underspec_cost = underspec_cost)
+    indices, costs = aligner.segment_costs()
+    costs = np.array(costs)
+    #A substitution is never more costly than a deletion plus an insertion
+    indel = costs[:, -1][:, None] + costs[-1, :][None, :]
+    costs = np.minimum(costs, indel)
+    factor = 1.0
+    for i in range(len(costs)):
+        #Triangles x -> y -> z through the ith segment
+        through = costs[:, i][:, None] + costs[i, :][None, :]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            ratios = np.where(through > 0, costs / through, 1.0)
+        if np.any((through == 0) & (costs > 0)):
+            return float('inf')
+        factor = max(factor, float(ratios.max()))
+    return factor
+
+class BKTree(object):
+    """
+    Burkhard-Keller tree for finding all items within a distance of a
+    query, using the triangle inequality to skip most of the items.
+
+    Distances that only satisfy a relaxed triangle inequality,
+    d(x, z) <= C * (d(x, y) + d(y, z)), are supported by widening the
+    range of subtrees that are searched.
+
+    Parameters
+    ----------
+    distance: callable
+        Function taking two items and returning the distance between them
+    relaxation: float
+        Factor C of the relaxed triangle inequality, 1.0 for a metric
+
+    Attributes
+    ----------
+    root: list or None
+        Root node, each node is a list of an item and a dictionary of
+        child nodes keyed by their distance to the item
+    """
+    def __init__(self, distance, relaxation = 1.0):
+        self.distance = distance
+        self.relaxation = relaxation
+        self.root = None
+        self.size = 0
+
+    def add(self, item):
+        """
+        Add an item to the tree
+
+        Parameters
+        ----------
+        item : object
+            Item to add
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [item, {}]
+            return
+        node = self.root
+        while True:
+            d = self.distance(item, node[0])
+            try:
+                node = node[1][d]
+            except KeyError:
+                node[1][d] = [item, {}]
+                break
+
+    def query(self, item, max_distance):
+        """
+        Find all items within a distance of a query item
+
+        Parameters
+        ----------
+        item : object
+            Query item
+        max_distance : float
+            Maximum distance from the query item
+
+        Returns
+        -------
+        list of tuples
+            Items within the distance and their distance to the query item
+        """
+        matches = []
+        if self.root is None:
+            return matches
+        c = self.relaxation
+        to_visit = [self.root]
+        while to_visit:
+            node = to_visit.pop()
+            d = self.distance(item, node[0])
+            if d <= max_distance:
+                matches.append((node[0], d))
+            low = d / c - max_distance
+            high = c * (d + max_distance)
+            for k, child in node[1].items():
+                if low <= k <= high:
+                    to_visit.append(child)
+        return matches
+
+    def __len__(self):
+        return self.size
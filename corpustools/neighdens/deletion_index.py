@@ -0,0 +1,248 @@
+from collections import defaultdict
+
+from corpustools.symbolsim.edit_distance import edit_distance
+
+#Largest edit distance answered with a DeletionIndex, the number of
+#deletion variants per word grows too quickly beyond this
+MAX_INDEXED_DISTANCE = 2
+
+def deletion_variants(sequence, max_deletions):
+    """Returns all sequences that can be made from a sequence by deleting
+    up to a number of its elements (including the sequence itself)
+
+    Parameters
+    ----------
+    sequence: tuple
+        Integer-encoded sequence of segments
+    max_deletions: int
+        Maximum number of elements to delete
+
+    Returns
+    -------
+    set
+        All deletion variants of the sequence
+    """
+    variants = {sequence}
+    current = {sequence}
+    for i in range(max_deletions):
+        following = set()
+        for v in current:
+            for j in range(len(v)):
+                following.add(v[:j] + v[j+1:])
+        variants.update(following)
+        current = following
+    return variants
+
+class DeletionIndex(object):
+    """
+    Index of the deletion variants of every word in a corpus context, for
+    finding all words within an edit distance of a query word (the
+    SymSpell approach).
+
+    Two sequences are within edit distance k of each other only if they
+    share a variant made by deleting at most k elements from each, so
+    candidates are found through shared variants and then checked with
+    the edit distance itself.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    max_distance : int
+        Maximum edit distance that the index can answer queries for
+
+    Attributes
+    ----------
+    words : list
+        Words of the corpus context, in the order they were indexed
+    sequences : list
+        Integer-encoded sequences of the words
+    variants : dict
+        Mapping of deletion variants to the indices of words that have them
+    """
+    def __init__(self, corpus_context, max_distance):
+        self.corpus_context = corpus_context
+        self.max_distance = max_distance
+        self.words = []
+        self.sequences = []
+        self.variants = defaultdict(list)
+        for w in corpus_context:
+            self.add(w)
+
+    def add(self, word):
+        """
+        Add a Word to the index
+
+        Parameters
+        ----------
+        word : Word
+            Word to add
+        """
+        index = len(self.words)
+        sequence = self.corpus_context.encode_sequence(word)
+        self.words.append(word)
+        self.sequences.append(sequence)
+        for v in deletion_variants(sequence, self.max_distance):
+            self.variants[v].append(index)
+
+    def candidates(self, query, max_distance = None):
+        """
+        Get the indices of words that share a deletion variant with the
+        query
+
+        Parameters
+        ----------
+        query : Word or tuple
+            Word, or integer-encoded sequence, to find candidates for
+        max_distance : int, optional
+            Number of deletions to make from the query, defaults to the
+            ``max_distance`` of the index
+
+        Returns
+        -------
+        set
+            Indices of candidate words
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if not isinstance(query, tuple):
+            query = self.corpus_context.encode_sequence(query)
+        candidates = set()
+        for v in deletion_variants(query, max_distance):
+            candidates.update(self.variants.get(v, []))
+        return candidates
+
+    def query(self, query, max_distance = None):
+        """
+        Find all words within an edit distance of a query
+
+        Parameters
+        ----------
+        query : Word or tuple
+            Word, or integer-encoded sequence, to find neighbors for
+        max_distance : int, optional
+            Maximum edit distance, must not be greater than the
+            ``max_distance`` of the index, defaults to it
+
+        Returns
+        -------
+        list
+            Words within the maximum edit distance of the query
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise(ValueError('The index only supports a maximum distance of {}.'.format(self.max_distance)))
+        if not isinstance(query, tuple):
+            query = self.corpus_context.encode_sequence(query)
+        matches = []
+        for i in sorted(self.candidates(query, max_distance)):
+            s = self.sequences[i]
+            if abs(len(s) - len(query)) > max_distance:
+                continue
+            if edit_distance(query, s, None, max_distance) <= max_distance:
+                matches.append(self.words[i])
+        return matches
+
+    def __len__(self):
+        return len(self.words)
+
+class SubstitutionIndex(object):
+    """
+    Index of the words of a corpus context with each position masked in
+    turn, for finding all words that differ from a query by exactly one
+    substitution.
+
+    Two sequences differ by one substitution only if they are the same
+    once the substituted position is masked, so every word sharing a
+    masked sequence with the query at a position where their segments
+    differ is a match, without any alignment.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+
+    Attributes
+    ----------
+    words : list
+        Words of the corpus context, in the order they were indexed
+    sequences : list
+        Integer-encoded sequences of the words
+    masks : dict
+        Mapping of masked sequences, with 0 at the masked position, to the
+        indices of words that have them
+    """
+    def __init__(self, corpus_context):
+        self.corpus_context = corpus_context
+        self.words = []
+        self.sequences = []
+        self.masks = defaultdict(list)
+        for w in corpus_context:
+            self.add(w)
+
+    def add(self, word):
+        """
+        Add a Word to the index
+
+        Parameters
+        ----------
+        word : Word
+            Word to add
+        """
+        index = len(self.words)
+        sequence = self.corpus_context.encode_sequence(word)
+        self.words.append(word)
+        self.sequences.append(sequence)
+        for p in range(len(sequence)):
+            self.masks[sequence[:p] + (0,) + sequence[p+1:]].append(index)
+
+    def candidates(self, query):
+        """
+        Get the indices of words that differ from the query by exactly
+        one substitution
+
+        Parameters
+        ----------
+        query : Word or tuple
+            Word, or integer-encoded sequence, to find neighbors for
+
+        Returns
+        -------
+        list
+            Indices of the words, in the order they were indexed
+        """
+        if not isinstance(query, tuple):
+            query = self.corpus_context.encode_sequence(query)
+        matches = []
+        for p in range(len(query)):
+            for i in self.masks.get(query[:p] + (0,) + query[p+1:], []):
+                if self.sequences[i][p] != query[p]:
+                    matches.append(i)
+        return sorted(matches)
+
+    def num_distinct_neighbors(self):
+        """
+        Get the number of distinct sequences that differ from each word
+        by exactly one substitution
+
+        Each such sequence shares exactly one masked sequence with the
+        word, so the counts are sums over the masked sequences of each
+        word and no pair of words is compared.
+
+        Returns
+        -------
+        list
+            Number of distinct neighboring sequences, in the order the
+            words were indexed
+        """
+        distinct = {k: len(set(self.sequences[i] for i in v)) - 1
+                    for k, v in self.masks.items()}
+        counts = []
+        for sequence in self.sequences:
+            counts.append(sum(distinct[sequence[:p] + (0,) + sequence[p+1:]]
+                                for p in range(len(sequence))))
+        return counts
+
+    def __len__(self):
+        return len(self.words)
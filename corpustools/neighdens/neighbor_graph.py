@@ -0,0 +1,368 @@
+import numpy as np
+
+from corpustools.symbolsim.edit_distance import edit_distance
+from corpustools.symbolsim.khorsi import encoded_khorsi
+from corpustools.neighdens.deletion_index import MAX_INDEXED_DISTANCE
+
+from corpustools.exceptions import NeighDenError
+
+#Operations of edges between words that differ by a single edit
+OTHER = 0
+SUBSTITUTION = 1
+INSERTION = 2
+DELETION = 3
+
+def single_edit(seq1, seq2):
+    """Returns the edit that turns one sequence into another, if they
+    differ by exactly one substitution, insertion or deletion
+
+    Parameters
+    ----------
+    seq1: tuple
+        Integer-encoded sequence to edit
+    seq2: tuple
+        Integer-encoded sequence to make
+
+    Returns
+    -------
+    tuple
+        The operation (SUBSTITUTION, INSERTION, DELETION, or OTHER if
+        the sequences do not differ by one edit), the segment ID removed
+        from seq1 and the segment ID added from seq2, with 0 for none
+    """
+    if len(seq1) == len(seq2):
+        diffs = [i for i, (x, y) in enumerate(zip(seq1, seq2)) if x != y]
+        if len(diffs) == 1:
+            return SUBSTITUTION, seq1[diffs[0]], seq2[diffs[0]]
+        return OTHER, 0, 0
+    if abs(len(seq1) - len(seq2)) != 1:
+        return OTHER, 0, 0
+    longer, shorter = (seq1, seq2) if len(seq1) > len(seq2) else (seq2, seq1)
+    i = 0
+    while i < len(shorter) and longer[i] == shorter[i]:
+        i += 1
+    if longer[i+1:] != shorter[i:]:
+        return OTHER, 0, 0
+    if longer is seq1:
+        return DELETION, longer[i], 0
+    return INSERTION, 0, longer[i]
+
+class NeighborGraph(object):
+    """
+    Graph of the words of a corpus context that are neighbors of each
+    other, as a sparse adjacency matrix in compressed sparse row (CSR)
+    format over word IDs.
+
+    Each edge is stored in both directions, and is labelled with the
+    distance between the words and, for words that differ by a single
+    edit, the operation that turns the first word into the second and
+    the segments involved.
+
+    Parameters
+    ----------
+    words : list
+        Words of the graph, their positions are their word IDs
+    segments : list
+        Segment symbols, indexed by segment ID (0 is no segment)
+    indptr : numpy.ndarray
+        Edges of word i are at positions indptr[i] to indptr[i+1]
+    indices : numpy.ndarray
+        Word ID of the neighbor of each edge
+    distances : numpy.ndarray
+        Distance of each edge
+    operations : numpy.ndarray
+        Operation of each edge
+    edits : numpy.ndarray
+        Segment IDs removed and added by each edge, one row per edge
+    algorithm : str
+        Algorithm used to determine distance
+    max_distance : float
+        Maximum distance between neighbors
+    """
+    def __init__(self, words, segments, indptr, indices, distances,
+                operations, edits, algorithm, max_distance):
+        self.words = words
+        self.segments = segments
+        self.indptr = indptr
+        self.indices = indices
+        self.distances = distances
+        self.operations = operations
+        self.edits = edits
+        self.algorithm = algorithm
+        self.max_distance = max_distance
+        self._ids = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def word_id(self, word):
+        """
+        Get the ID of a word in the graph
+
+        Parameters
+        ----------
+        word : Word
+            Word to look up
+
+        Returns
+        -------
+        int
+            ID of the word
+        """
+        if self._ids is None:
+            self._ids = {w: i for i, w in enumerate(self.words)}
+        return self._ids[word]
+
+    def neighbors(self, word_id):
+        """
+        Get the IDs of the neighbors of a word
+
+        Parameters
+        ----------
+        word_id : int
+            ID of the word
+
+        Returns
+        -------
+        numpy.ndarray
+            IDs of the neighbors
+        """
+        return self.indices[self.indptr[word_id]:self.indptr[word_id+1]]
+
+    def degrees(self):
+        """
+        Get the number of neighbors of every word
+
+        Returns
+        -------
+        numpy.ndarray
+            Number of neighbors, indexed by word ID
+        """
+        return np.diff(self.indptr)
+
+    def weighted_degrees(self, weights = None):
+        """
+        Get the sum of the weights of the neighbors of every word, such
+        as their frequencies
+
+        Parameters
+        ----------
+        weights : numpy.ndarray, optional
+            Weight of each word, indexed by word ID, defaults to the
+            frequencies of the words
+
+        Returns
+        -------
+        numpy.ndarray
+            Sum of the weights of the neighbors, indexed by word ID
+        """
+        if weights is None:
+            weights = np.array([w.frequency for w in self.words], dtype = float)
+        sums = np.zeros(len(self.words))
+        rows = np.repeat(np.arange(len(self.words)), self.degrees())
+        np.add.at(sums, rows, weights[self.indices])
+        return sums
+
+    def clustering_coefficients(self):
+        """
+        Get the local clustering coefficient of every word, the proportion
+        of pairs of its neighbors that are neighbors of each other
+
+        Returns
+        -------
+        numpy.ndarray
+            Clustering coefficients, indexed by word ID, 0 for words with
+            fewer than two neighbors
+        """
+        neighbor_sets = [set(self.neighbors(i).tolist()) for i in range(len(self.words))]
+        coefficients = np.zeros(len(self.words))
+        for i, neighbors in enumerate(neighbor_sets):
+            k = len(neighbors)
+            if k < 2:
+                continue
+            links = sum(len(neighbors & neighbor_sets[j]) for j in neighbors) / 2
+            coefficients[i] = links / (k * (k - 1) / 2)
+        return coefficients
+
+    def minimal_pairs(self, seg1, seg2):
+        """
+        Get the pairs of words that differ only by a substitution of one
+        segment for another
+
+        Parameters
+        ----------
+        seg1 : str
+            First segment
+        seg2 : str
+            Second segment
+
+        Returns
+        -------
+        list
+            Pairs of word IDs, with the word with seg1 first
+        """
+        try:
+            id1 = self.segments.index(seg1)
+            id2 = self.segments.index(seg2)
+        except ValueError:
+            return []
+        rows = np.repeat(np.arange(len(self.words)), self.degrees())
+        mask = ((self.operations == SUBSTITUTION) &
+                (self.edits[:, 0] == id1) & (self.edits[:, 1] == id2))
+        return list(zip(rows[mask].tolist(), self.indices[mask].tolist()))
+
+    def save(self, path, corpus_context):
+        """
+        Save the graph to a NumPy (.npz) file
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        corpus_context : CorpusContext
+            Context manager for the corpus of the words
+        """
+        keys = np.array([corpus_context.corpus.key(w) for w in self.words], dtype = str)
+        np.savez_compressed(path, indptr = self.indptr, indices = self.indices,
+                distances = self.distances, operations = self.operations,
+                edits = self.edits, keys = keys,
+                segments = np.array(self.segments[1:], dtype = str),
+                settings = np.array([self.algorithm, repr(self.max_distance),
+                                    corpus_context.sequence_type,
+                                    corpus_context.type_or_token], dtype = str))
+
+    @classmethod
+    def load(cls, path, corpus_context):
+        """
+        Load a graph saved with ``save`` for the words of a corpus context
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        corpus_context : CorpusContext
+            Context manager for the corpus of the words, with the same
+            words as when the graph was saved
+
+        Returns
+        -------
+        NeighborGraph
+            The loaded graph
+        """
+        with np.load(path) as data:
+            settings = data['settings'].tolist()
+            if len(settings) != 4:
+                raise(NeighDenError('The neighbor graph in {} was made for different words.'.format(path)))
+            algorithm, max_distance, sequence_type, type_or_token = settings
+            words = list(corpus_context)
+            keys = [corpus_context.corpus.key(w) for w in words]
+            if (sequence_type != corpus_context.sequence_type or
+                    type_or_token != corpus_context.type_or_token or
+                    keys != data['keys'].tolist()):
+                raise(NeighDenError('The neighbor graph in {} was made for different words.'.format(path)))
+            return cls(words, [None] + data['segments'].tolist(), data['indptr'],
+                        data['indices'], data['distances'], data['operations'],
+                        data['edits'], algorithm, float(max_distance))
+
+def build_neighbor_graph(corpus_context, algorithm = 'edit_distance', max_distance = 1,
+                        stop_check = None, call_back = None):
+    """
+    Find the neighbors of every word in a corpus context
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    algorithm : str
+        The algorithm used to determine distance
+    max_distance : float
+        Maximum distance between neighbors
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    NeighborGraph
+        Graph of the neighbors, or None if stopped early
+    """
+    words = list(corpus_context)
+    sequences = [corpus_context.encode_sequence(w) for w in words]
+    if algorithm == 'edit_distance':
+        if 0 <= max_distance < MAX_INDEXED_DISTANCE + 1:
+            index = corpus_context.get_deletion_index(int(max_distance))
+            def candidates(i):
+                return index.candidates(sequences[i])
+        else:
+            buckets = corpus_context.get_length_buckets()
+            def candidates(i):
+                return (buckets.edit_distances(sequences[i], max_distance) <= max_distance).nonzero()[0]
+        def distance(i, j):
+            return edit_distance(sequences[i], sequences[j], None, max_distance)
+    elif algorithm == 'phono_edit_distance':
+        tree = corpus_context.get_bk_tree()
+        #The tree has its own copies of the words
+        ids = {}
+        for i, w in enumerate(words):
+            ids.setdefault(w, []).append(i)
+        #Distances found by the last query, which are looked up for the
+        #candidates of that query
+        found = {}
+        def candidates(i):
+            found.clear()
+            for w, d in tree.query(words[i], max_distance):
+                for j in ids[w]:
+                    found[j] = d
+            return list(found)
+        def distance(i, j):
+            return found[j]
+    elif algorithm == 'khorsi':
+        index = corpus_context.get_surprisal_index()
+        surprisal = index.surprisal
+        def candidates(i):
+            return [index.positions[k] for k in index.candidates(sequences[i], max_distance)]
+        def distance(i, j):
+            #Similarities are negated, so that neighbors have a distance
+            #of at most -max_distance
+            return -encoded_khorsi(sequences[j], sequences[i], surprisal)
+    else:
+        raise(NeighDenError('{} is not a possible distance algorithm.'.format(algorithm)))
+    if algorithm == 'khorsi':
+        threshold = -max_distance
+    else:
+        threshold = max_distance
+
+    if call_back is not None:
+        call_back('Finding neighbors...')
+        call_back(0, len(words))
+    indptr = np.zeros(len(words) + 1, dtype = np.int64)
+    rows = []
+    for i in range(len(words)):
+        if stop_check is not None and stop_check():
+            return None
+        if call_back is not None and i % 100 == 0:
+            call_back(i)
+        row = []
+        for j in sorted(candidates(i)):
+            if j == i:
+                continue
+            d = distance(i, j)
+            if d > threshold:
+                continue
+            row.append((j, d) + single_edit(sequences[i], sequences[j]))
+        rows.append(row)
+        indptr[i+1] = indptr[i] + len(row)
+    edges = [e for row in rows for e in row]
+    indices = np.array([e[0] for e in edges], dtype = np.int32)
+    distances = np.array([e[1] for e in edges], dtype = float)
+    if algorithm == 'khorsi':
+        distances = -distances
+    operations = np.array([e[2] for e in edges], dtype = np.int8)
+    edits = np.array([e[3:] for e in edges], dtype = np.int32).reshape(len(edges), 2)
+    segment_ids = corpus_context.get_segment_ids()
+    segments = [None] * (max(segment_ids.values(), default = 0) + 1)
+    for s, i in segment_ids.items():
+        segments[i] = s
+    return NeighborGraph(words, segments, indptr, indices, distances,
+                        operations, edits, algorithm, max_distance)
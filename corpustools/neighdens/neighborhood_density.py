@@ -1,15 +1,18 @@
 from corpustools.corpus.classes import Word
 from corpustools.symbolsim.edit_distance import edit_distance
-from corpustools.symbolsim.khorsi import khorsi
+from corpustools.symbolsim.khorsi import khorsi, encoded_khorsi
 from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
-from corpustools.symbolsim.phono_align import Aligner
 
-from corpustools.multiprocessing import filter_mp, score_mp
+from corpustools.neighdens.deletion_index import MAX_INDEXED_DISTANCE
 
-from functools import partial
 
 from corpustools.exceptions import NeighDenError
 
+
+def uses_deletion_index(algorithm, max_distance):
+    return (algorithm == 'edit_distance' and
+            0 <= max_distance < MAX_INDEXED_DISTANCE + 1)
+
 def is_edit_distance_neighbor(w, query, sequence_type, max_distance):
     if len(getattr(w, sequence_type)) > len(getattr(query, sequence_type))+max_distance:
         return False
@@ -25,11 +28,14 @@ def is_khorsi_neighbor(w, query, freq_base, sequence_type, max_distance):
 
 def neighborhood_density_all_words(corpus_context,
             algorithm = 'edit_distance', max_distance = 1,
-            num_cores = -1,
+            num_cores = -1, graph_path = None,
             stop_check = None, call_back = None):
     """Calculate the neighborhood density of all words in the corpus and
     adds them as attributes of the words.
 
+    Neighbors are found once for all words, in the context's neighbor
+    graph, so multiprocessing is not used.
+
     Parameters
     ----------
     corpus_context : CorpusContext
@@ -38,40 +44,33 @@ def neighborhood_density_all_words(corpus_context,
         The algorithm used to determine distance
     max_distance : float, optional
         Maximum edit distance from the queried word to consider a word a neighbor.
+    num_cores : int, optional
+        Unused, kept for compatibility
+    graph_path : str, optional
+        File to keep the neighbor graph in between sessions, see
+        ``get_neighbor_graph``
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
     """
-    function = partial(neighborhood_density, corpus_context,
-                        algorithm = algorithm,
-                        max_distance = max_distance)
     if call_back is not None:
         call_back('Calculating neighborhood densities...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    if num_cores == -1:
-
-        for w in corpus_context:
-            if stop_check is not None and stop_check():
-                return
-            cur += 1
-            call_back(cur)
-            res = function(w)
-
-            setattr(w.original, corpus_context.attribute.name, res[0])
-    else:
-        iterable = ((w,) for w in corpus_context)
-
-
-        neighbors = score_mp(iterable, function, num_cores, call_back, stop_check, chunk_size = 1)
-        for n in neighbors:
-            #Have to look up the key, then look up the object due to how
-            #multiprocessing pickles objects
-            setattr(corpus_context.corpus.find(corpus_context.corpus.key(n[0])),
-                    corpus_context.attribute.name, n[1][0])
-
-
+    graph = corpus_context.get_neighbor_graph(algorithm, max_distance,
+                                            stop_check, call_back, path = graph_path)
+    if graph is None:
+        return
+    if call_back is not None:
+        call_back('Calculating neighborhood densities...')
+        call_back(0,len(graph))
+    for i, w in enumerate(graph.words):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None and i % 100 == 0:
+            call_back(i)
+        #Words identical to the query are not its neighbors
+        neighbors = set(graph.words[j] for j in graph.neighbors(i)) - set([w])
+        setattr(w.original, corpus_context.attribute.name, len(neighbors))
 
 def neighborhood_density(corpus_context, query,
             algorithm = 'edit_distance', max_distance = 1,
@@ -99,65 +98,90 @@ def neighborhood_density(corpus_context, query,
         Tuple of the number of neighbors and the set of neighbor Words.
     """
     matches = []
+    if uses_deletion_index(algorithm, max_distance):
+        if call_back is not None:
+            call_back('Finding neighbors...')
+        index = corpus_context.get_deletion_index(int(max_distance))
+        matches = index.query(query)
+        neighbors = set(matches)-set([query])
+        return (len(neighbors), neighbors)
+    if algorithm == 'edit_distance':
+        if call_back is not None:
+            call_back('Finding neighbors...')
+        buckets = corpus_context.get_length_buckets()
+        distances = buckets.edit_distances(query, max_distance)
+        matches = [buckets.words[i] for i in (distances <= max_distance).nonzero()[0]]
+        neighbors = set(matches)-set([query])
+        return (len(neighbors), neighbors)
+    if algorithm == 'phono_edit_distance':
+        if call_back is not None:
+            call_back('Finding neighbors...')
+        tree = corpus_context.get_bk_tree()
+        matches = [w for w, d in tree.query(query, max_distance)]
+        neighbors = set(matches)-set([query])
+        return (len(neighbors), neighbors)
+    if algorithm != 'khorsi':
+        raise(NeighDenError('{} is not a possible distance algorithm.'.format(algorithm)))
+    index = corpus_context.get_surprisal_index()
+    encoded_query = corpus_context.encode_sequence(query)
+    #Words whose similarity cannot reach the threshold are skipped
+    #without finding their longest common substring with the query
+    candidates = index.candidates(encoded_query, max_distance)
     if call_back is not None:
         call_back('Finding neighbors...')
-        call_back(0,len(corpus_context))
+        call_back(0,len(candidates))
         cur = 0
-    if algorithm == 'edit_distance':
-        is_neighbor = partial(is_edit_distance_neighbor,
-                                sequence_type = corpus_context.sequence_type,
-                                max_distance = max_distance)
-    elif algorithm == 'phono_edit_distance':
-        is_neighbor = partial(is_phono_edit_distance_neighbor,
-                                specifier = corpus_context.specifier,
-                                sequence_type = corpus_context.sequence_type,
-                                max_distance = max_distance)
-    elif algorithm == 'khorsi':
-        freq_base = freq_base = corpus_context.get_frequency_base()
-        is_neighbor = partial(is_khorsi_neighbor,
-                                freq_base = freq_base,
-                                sequence_type = corpus_context.sequence_type,
-                                max_distance = max_distance)
-    for w in corpus_context:
+    for i in candidates:
         if stop_check is not None and stop_check():
             return
         if call_back is not None:
             cur += 1
             if cur % 10 == 0:
                 call_back(cur)
-        if not is_neighbor(w, query):
+        if encoded_khorsi(index.sequences[i], encoded_query,
+                        index.surprisal, max_distance) < max_distance:
             continue
-        matches.append(w)
+        matches.append(index.words[i])
+    if call_back is not None:
+        call_back('Skipped {} of {} words with an upper bound on their similarity'.format(
+                    len(index) - len(candidates), len(index)))
     neighbors = set(matches)-set([query])
 
     return (len(neighbors), neighbors)
 
 def find_mutation_minpairs_all_words(corpus_context, num_cores = -1,
                     stop_check = None, call_back = None):
-    function = partial(find_mutation_minpairs, corpus_context)
-    if call_back is not None:
-        call_back('Calculating neighborhood densities...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    if num_cores == -1:
+    """Find the number of minimal pairs of all words in the corpus based
+    only on segment mutations, and add them as attributes of the words.
 
-        for w in corpus_context:
-            if stop_check is not None and stop_check():
-                return
-            cur += 1
-            call_back(cur)
-            res = function(w)
+    Minimal pairs are counted from the context's substitution index,
+    so multiprocessing is not used.
 
-            setattr(w.original, corpus_context.attribute.name, res[0])
-    else:
-        iterable = ((w,) for w in corpus_context)
-
-
-        neighbors = score_mp(iterable, function, num_cores, call_back, stop_check, chunk_size= 1)
-        for n in neighbors:
-            #Have to look up the key, then look up the object due to how
-            #multiprocessing pickles objects
-            setattr(corpus_context.corpus.find(corpus_context.corpus.key(n[0])), corpus_context.attribute.name, n[1][0])
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    num_cores : int, optional
+        Unused, kept for compatibility
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+    """
+    if call_back is not None:
+        call_back('Calculating neighborhood densities...')
+    index = corpus_context.get_substitution_index()
+    if stop_check is not None and stop_check():
+        return
+    counts = index.num_distinct_neighbors()
+    if call_back is not None:
+        call_back(0,len(index))
+    for i, w in enumerate(index.words):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None and i % 100 == 0:
+            call_back(i)
+        setattr(w.original, corpus_context.attribute.name, counts[i])
 
 def find_mutation_minpairs(corpus_context, query,
                     stop_check = None, call_back = None):
@@ -184,24 +208,11 @@ def find_mutation_minpairs(corpus_context, query,
     sequence_type = corpus_context.sequence_type
     if call_back is not None:
         call_back('Finding neighbors...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    al = Aligner(features_tf=False, ins_penalty=float('inf'), del_penalty=float('inf'), sub_penalty=1)
-    for w in corpus_context:
+    index = corpus_context.get_substitution_index()
+    for i in index.candidates(corpus_context.encode_sequence(query)):
         if stop_check is not None and stop_check():
             return
-        if call_back is not None:
-            cur += 1
-            if cur % 10 == 0:
-                call_back(cur)
-        if (len(getattr(w, sequence_type)) > len(getattr(query, sequence_type))+1 or
-            len(getattr(w, sequence_type)) < len(getattr(query, sequence_type))-1):
-            continue
-        m = al.make_similarity_matrix(getattr(query, sequence_type), getattr(w, sequence_type))
-        if m[-1][-1]['f'] != 1:
-            continue
-        matches.append(str(getattr(w, sequence_type)))
+        matches.append(str(getattr(index.words[i], sequence_type)))
 
     neighbors = list(set(matches)-set([str(getattr(query, sequence_type))]))
     return (len(neighbors), neighbors)
-
@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+
 from corpustools.corpus.classes import Word
 
 from corpustools.exceptions import PhonoProbError
 
 from corpustools.contextmanagers import ensure_context
 
+#Probability table of the current process, set by init_table so that it
+#is only sent once to each worker process
+_table = None
+
 def phonotactic_probability_all_words(corpus_context, algorithm,
                                     probability_type = 'unigram',
                                     num_cores = -1,
@@ -30,25 +40,124 @@ def phonotactic_probability_all_words(corpus_context, algorithm,
     ensure_context(corpus_context)
     if call_back is not None:
         call_back('Calculating phonotactic probabilities...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    num_cores = -1 # Multiprocessing not yet implemented
-    if num_cores == -1:
-        for w in corpus_context:
+    if algorithm == 'vitevitch':
+        gramsize = probability_gramsize(probability_type)
+        #Every word is scored at once, one array per word length
+        table = corpus_context.get_phone_prob_table(gramsize)
+        buckets = corpus_context.get_length_buckets()
+        if call_back is not None:
+            call_back(0,len(buckets.words))
+            cur = 0
+        scores = np.zeros(len(buckets.words))
+        for length, (ids, sequences) in buckets.buckets.items():
+            if stop_check is not None and stop_check():
+                break
+            #The table is counted from these sequences, so every n-gram is found
+            probabilities = table.gram_probabilities(sequences)
+            scores[ids] = table.mean_probabilities(probabilities)
+        for i, w in enumerate(buckets.words):
             if stop_check is not None and stop_check():
                 break
             if call_back is not None:
                 cur += 1
-                if cur % 20 == 0:
+                if cur % 1000 == 0:
                     call_back(cur)
-            if algorithm == 'vitevitch':
-                res = phonotactic_probability_vitevitch(corpus_context, w,
-                                        probability_type = probability_type,
-                                        stop_check = stop_check)
-                setattr(w.original, corpus_context.attribute.name,res)
+            setattr(w.original, corpus_context.attribute.name, float(scores[i]))
     if stop_check is not None and stop_check():
         corpus_context.corpus.remove_attribute(corpus_context.attribute)
 
+def init_table(table):
+    global _table
+    _table = table
+
+def score_batch(sequences):
+    return _table.score(sequences)
+
+def iter_phonotactic_probability(corpus_context, queries, algorithm = 'vitevitch',
+                                probability_type = 'unigram', batch_size = 1000,
+                                num_cores = -1, stop_check = None, call_back = None):
+    """Calculate the phonotactic probability of many words that need not be
+    in the corpus, such as candidate nonwords, yielding each result as it
+    is calculated.
+
+    Queries are read and scored in batches against the positional
+    probabilities of the corpus context, so any number of queries can be
+    scored from a stream with bounded memory. Queries with segments or
+    n-grams that are not in the corpus get a description of them instead
+    of raising an error.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    queries : iterable
+        Words, or sequences of segments of the sequence type of the
+        corpus context
+    algorithm : str
+        Algorithm to use for calculating phonotactic probability (currently
+        only 'vitevitch')
+    probability_type : str
+        Either 'unigram' or 'bigram' probability
+    batch_size : int
+        Number of queries to score at once
+    num_cores : int
+        Number of processes to score batches in, -1 to score them in
+        this process
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Yields
+    ------
+    tuple
+        The query, its phonotactic probability (None if it could not be
+        calculated) and a description of its segments or n-grams that are
+        not in the corpus (empty if there are none)
+    """
+    ensure_context(corpus_context)
+    if algorithm != 'vitevitch':
+        raise(PhonoProbError('{} is not a possible phonotactic probability algorithm.'.format(algorithm)))
+    if call_back is not None:
+        call_back('Calculating phonotactic probabilities...')
+    table = corpus_context.get_phone_prob_table(probability_gramsize(probability_type))
+    queries = iter(queries)
+    def batches():
+        while True:
+            batch = list(islice(queries, batch_size))
+            if not batch:
+                return
+            sequences = [getattr(q, corpus_context.sequence_type) if isinstance(q, Word)
+                        else q for q in batch]
+            yield batch, [list(s) for s in sequences]
+    if num_cores == -1:
+        for batch, sequences in batches():
+            if stop_check is not None and stop_check():
+                return
+            for q, (score, missing) in zip(batch, table.score(sequences)):
+                yield q, score, missing
+        return
+    pool = Pool(num_cores, init_table, (table,))
+    try:
+        #Only a few batches are sent ahead of the results being read, as
+        #Pool.imap would read every query before returning any results
+        pending = deque()
+        for batch, sequences in batches():
+            if stop_check is not None and stop_check():
+                return
+            pending.append((batch, pool.apply_async(score_batch, (sequences,))))
+            if len(pending) < 2 * num_cores:
+                continue
+            batch, result = pending.popleft()
+            for q, (score, missing) in zip(batch, result.get()):
+                yield q, score, missing
+        while pending:
+            batch, result = pending.popleft()
+            for q, (score, missing) in zip(batch, result.get()):
+                yield q, score, missing
+    finally:
+        pool.terminate()
+
 def phonotactic_probability(corpus_context, query, algorithm,
                                     probability_type = 'unigram',
                                     stop_check = None, call_back = None):
@@ -106,33 +215,31 @@ def phonotactic_probability_vitevitch(corpus_context, query,
     """
     ensure_context(corpus_context)
 
+    gramsize = probability_gramsize(probability_type)
+    table = corpus_context.get_phone_prob_table(gramsize)
+    encoded = table.encode(getattr(query, corpus_context.sequence_type))
+    probabilities = table.gram_probabilities(
+                    np.array(encoded, dtype = np.int64).reshape(1, len(encoded)))
+    missing = np.isnan(probabilities[0]).nonzero()[0]
+    if len(missing):
+        i = missing[0]
+        sequence = getattr(query, corpus_context.sequence_type)
+        s = list(zip(*[sequence[j:] for j in range(gramsize)]))[i]
+        notfound = []
+
+        for seg in s:
+            if seg not in corpus_context.inventory:
+                notfound.append(seg)
+        if len(notfound):
+            raise(PhonoProbError("Segments not found in the corpus: {}".format(', '.join(notfound))))
+        else:
+            raise(PhonoProbError("Segments not found in the corpus: {} at position: {}".format(', '.join(s),i)))
+    return float(table.mean_probabilities(probabilities)[0])
+
+def probability_gramsize(probability_type):
+    """Returns the size of n-grams for a type of phonotactic probability"""
     if probability_type == 'unigram':
-        gramsize = 1
+        return 1
     elif probability_type == 'bigram':
-        gramsize = 2
-
-    prob_dict = corpus_context.get_phone_probs(gramsize = gramsize)
-    sequence = zip(*[getattr(query, corpus_context.sequence_type)[i:] for i in range(gramsize)])
-
-    totprob = 0
-    tot = 0
-    for i,s in enumerate(sequence):
-        try:
-            totprob += prob_dict[s,i]
-        except KeyError:
-            notfound = []
-
-            for seg in s:
-                if seg not in corpus_context.inventory:
-                    notfound.append(seg)
-            if len(notfound):
-                raise(PhonoProbError("Segments not found in the corpus: {}".format(', '.join(notfound))))
-            else:
-                raise(PhonoProbError("Segments not found in the corpus: {} at position: {}".format(', '.join(s),i)))
-        tot += 1
-    try:
-        totprob = totprob / tot
-    except ZeroDivisionError:
-        pass
-    return totprob
-
+        return 2
+    raise(PhonoProbError('{} is not a possible probability type.'.format(probability_type)))
@@ -0,0 +1,200 @@
+import math
+
+import numpy as np
+
+class PhonoProbTable(object):
+    """
+    Positional n-gram probabilities of a corpus context as an array of
+    positions by n-gram IDs, for scoring many integer-encoded sequences
+    at once.
+
+    The probabilities are the same as those of ``get_phone_probs``
+    (normalized by the total frequency at each position, with log token
+    frequencies), but are counted from the integer-encoded sequences of
+    ``get_length_buckets`` without going through the words again.
+    N-grams of segment IDs are given a single code in base
+    ``self.base``, and n-gram IDs are the positions of the codes in
+    ``self.codes``.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    gramsize : int
+        Size of the n-grams, 1 for unigram and 2 for bigram probabilities
+
+    Attributes
+    ----------
+    segment_ids : dict
+        Integer IDs of the segments of the words of the corpus context
+    base : int
+        Base of the n-gram codes, greater than every segment ID
+    codes : numpy.ndarray
+        Sorted codes of the n-grams that occur in the corpus
+    probabilities : numpy.ndarray
+        Probability of each n-gram ID at each position, NaN if the n-gram
+        does not occur at that position
+    """
+    def __init__(self, corpus_context, gramsize = 1):
+        self.gramsize = gramsize
+        buckets = corpus_context.get_length_buckets()
+        #Only segments of the words, as encoding other sequences with the
+        #corpus context gives new IDs to segments that are not in it
+        present = set()
+        for length, (ids, sequences) in buckets.buckets.items():
+            present.update(np.unique(sequences).tolist())
+        self.segment_ids = {s: i for s, i in corpus_context.get_segment_ids().items()
+                            if i in present}
+        self.base = max(corpus_context.get_segment_ids().values(), default = 0) + 1
+        frequencies = [w.frequency for w in buckets.words]
+        if corpus_context.type_or_token != 'type':
+            frequencies = [math.log(f) for f in frequencies]
+        frequencies = np.array(frequencies, dtype = float)
+        positions = []
+        codes = []
+        weights = []
+        for length, (ids, sequences) in sorted(buckets.buckets.items()):
+            bucket_codes = self.gram_codes(sequences)
+            positions.append(np.tile(np.arange(bucket_codes.shape[1]), len(ids)))
+            codes.append(bucket_codes.ravel())
+            weights.append(np.repeat(frequencies[ids], bucket_codes.shape[1]))
+        positions = np.concatenate(positions) if positions else np.zeros(0, dtype = int)
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype = np.int64)
+        weights = np.concatenate(weights) if weights else np.zeros(0)
+        self.codes, gram_ids = np.unique(codes, return_inverse = True)
+        num_positions = positions.max() + 1 if len(positions) else 0
+        totals = np.bincount(positions, weights, minlength = num_positions)
+        pairs, pair_index = np.unique(positions * len(self.codes) + gram_ids,
+                                    return_inverse = True)
+        sums = np.bincount(pair_index, weights)
+        self.probabilities = np.full((num_positions, len(self.codes)), np.nan)
+        pair_positions = pairs // max(len(self.codes), 1)
+        self.probabilities[pair_positions, pairs % max(len(self.codes), 1)] = sums / totals[pair_positions]
+
+    def gram_codes(self, sequences):
+        """
+        Get the codes of the n-grams of sequences with the same length
+
+        Parameters
+        ----------
+        sequences : numpy.ndarray
+            Integer-encoded sequences, one per row
+
+        Returns
+        -------
+        numpy.ndarray
+            Code of the n-gram starting at each position of each sequence
+        """
+        num_grams = max(sequences.shape[1] - self.gramsize + 1, 0)
+        codes = np.zeros((sequences.shape[0], num_grams), dtype = np.int64)
+        for k in range(self.gramsize):
+            codes = codes * self.base + sequences[:, k:k + num_grams]
+        return codes
+
+    def gram_probabilities(self, sequences):
+        """
+        Get the probabilities of the n-grams of sequences with the same
+        length
+
+        Parameters
+        ----------
+        sequences : numpy.ndarray
+            Integer-encoded sequences, one per row, segment IDs from
+            outside the corpus are treated as unknown
+
+        Returns
+        -------
+        numpy.ndarray
+            Probability of the n-gram starting at each position of each
+            sequence, NaN for n-grams that do not occur at their position
+            in the corpus
+        """
+        #Segments first seen after the table was made have IDs outside the
+        #base, and 0 never occurs in the n-grams of the corpus
+        codes = self.gram_codes(np.where(sequences < self.base, sequences, 0))
+        num_grams = codes.shape[1]
+        ids = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        found = (self.codes[ids] == codes) if len(self.codes) else np.zeros(codes.shape, dtype = bool)
+        probabilities = np.full(codes.shape, np.nan)
+        for position in range(min(num_grams, self.probabilities.shape[0])):
+            column = found[:, position]
+            probabilities[column, position] = self.probabilities[position, ids[column, position]]
+        return probabilities
+
+    def mean_probabilities(self, probabilities):
+        """
+        Average the n-gram probabilities of sequences, summing positions
+        in order so that each result is identical to adding them up one
+        at a time
+
+        Parameters
+        ----------
+        probabilities : numpy.ndarray
+            N-gram probabilities from ``gram_probabilities``
+
+        Returns
+        -------
+        numpy.ndarray
+            Mean probability of each sequence, 0 for sequences shorter
+            than an n-gram
+        """
+        totals = np.zeros(probabilities.shape[0])
+        for position in range(probabilities.shape[1]):
+            totals += probabilities[:, position]
+        if probabilities.shape[1] == 0:
+            return totals
+        return totals / probabilities.shape[1]
+
+    def encode(self, sequence):
+        """Returns the segment IDs of a sequence of segments, with 0 for
+        segments that are not in the corpus context"""
+        return [self.segment_ids.get(s, 0) for s in sequence]
+
+    def score(self, sequences):
+        """
+        Calculate the mean positional n-gram probability of sequences of
+        segments of any lengths, such as nonwords
+
+        Parameters
+        ----------
+        sequences : list
+            Sequences of segments
+
+        Returns
+        -------
+        list
+            Tuples of the mean probability of each sequence and a
+            description of its segments or n-grams that are not in the
+            corpus, the probability is None if there are any
+        """
+        results = [None] * len(sequences)
+        by_length = {}
+        for i, sequence in enumerate(sequences):
+            by_length.setdefault(len(sequence), []).append(i)
+        for length, indices in by_length.items():
+            encoded = np.array([self.encode(sequences[i]) for i in indices],
+                                dtype = np.int64).reshape(len(indices), length)
+            probabilities = self.gram_probabilities(encoded)
+            means = self.mean_probabilities(probabilities)
+            missing = np.isnan(probabilities)
+            for k, i in enumerate(indices):
+                if missing[k].any():
+                    results[i] = (None, self.describe_missing(sequences[i],
+                                                    missing[k].nonzero()[0]))
+                else:
+                    results[i] = (float(means[k]), '')
+        return results
+
+    def describe_missing(self, sequence, positions):
+        """Returns a description of the segments of a sequence that are not
+        in the corpus, or if there are none, of the n-grams at positions
+        where they do not occur in the corpus"""
+        notfound = []
+        for s in sequence:
+            if s not in self.segment_ids and s not in notfound:
+                notfound.append(s)
+        if notfound:
+            return 'Segments not found in the corpus: {}'.format(', '.join(notfound))
+        return '; '.join('Segments not found in the corpus: {} at position: {}'.format(
+                            ', '.join(sequence[p:p + self.gramsize]), p)
+                        for p in positions)
@@ -1,2 +1,3 @@
 
-from .phonosearch import phonological_search
+from .phonosearch import (phonological_search, iter_phonological_search,
+                        count_phonological_search)
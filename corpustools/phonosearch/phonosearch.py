@@ -1,8 +1,121 @@
+import numpy as np
 
+from corpustools.corpus.classes.lexicon import EnvironmentFilter, Environment
+from corpustools.corpus.classes.indexes import PositionalIndex
 
-def phonological_search(corpus, envs, sequence_type = 'transcription',
+def get_positional_index(corpus, sequence_type):
+    """Returns the cached PositionalIndex of a corpus, or a new one for
+    other iterables of words"""
+    if hasattr(corpus, 'get_positional_index'):
+        return corpus.get_positional_index(sequence_type)
+    return PositionalIndex(corpus, sequence_type)
+
+def match_environments(index, envs):
+    """
+    Find the matches of several EnvironmentFilters in a PositionalIndex
+
+    Parameters
+    ----------
+    index : PositionalIndex
+        Index to search
+    envs : list
+        Environments to search in
+
+    Returns
+    -------
+    list
+        Tuples of each EnvironmentFilter and the sorted codes of the middle
+        segments of its matches
+    numpy.ndarray
+        Sorted IDs of the words with any matches
+    """
+    matches = [(env, index.match(env)) for env in envs
+                if isinstance(env, EnvironmentFilter)]
+    if not matches:
+        return matches, np.zeros(0, dtype = np.int64)
+    word_ids = np.unique(np.concatenate([codes // index.stride for env, codes in matches]))
+    return matches, word_ids
+
+def iter_phonological_search(corpus, envs, sequence_type = 'transcription',
+                            start = 0, limit = None,
                             call_back = None, stop_check = None):
     """
+    Search a corpus for segments in phonological environments, yielding
+    each word as soon as its matches are found.
+
+    Candidate words and positions are found with the PositionalIndex of
+    the tier, and the segments around each candidate position are then
+    checked against the word itself, so the work depends on the number
+    of matches rather than the size of the corpus.
+
+    Parameters
+    ----------
+    corpus : Corpus
+        Corpus to search
+    envs : list
+        Environments to search in
+    sequence_type : string
+        Specifies whether to use 'transcription' or the name of a
+        transcription tier to use for comparisons
+    start : int
+        Number of matching words to skip, defaults to 0
+    limit : int, optional
+        Maximum number of matching words to yield, defaults to all of them
+    stop_check : callable
+        Callable that returns a boolean for whether to exit before
+        finishing full calculation
+    call_back : callable
+        Function that can handle strings (text updates of progress),
+        tuples of two integers (0, total number of steps) and an integer
+        for updating progress out of the total set by a tuple
+
+    Yields
+    ------
+    tuple
+        A word and a list of the Environments that matched in it, in the
+        order of the words in the corpus
+    """
+    if call_back is not None:
+        call_back('Indexing...')
+    index = get_positional_index(corpus, sequence_type)
+    matches, word_ids = match_environments(index, envs)
+    word_ids = word_ids[start:]
+    if limit is not None:
+        word_ids = word_ids[:limit]
+    #Where the matches of each environment start and end for each word
+    bounds = [(env, codes, np.searchsorted(codes, word_ids * index.stride),
+                np.searchsorted(codes, (word_ids + 1) * index.stride))
+                for env, codes in matches]
+    if call_back is not None:
+        call_back('Searching...')
+        call_back(0, len(word_ids))
+    for k, word_id in enumerate(word_ids.tolist()):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None and k % 20 == 0:
+            call_back(k)
+        word = index.words[word_id]
+        bounded = getattr(word, sequence_type).with_word_boundaries()
+        founds = []
+        for env, codes, lower, upper in bounds:
+            lhs_num = env.lhs_count()
+            num_segs = len(env)
+            for code in codes[lower[k]:upper[k]].tolist():
+                i = code % index.stride - lhs_num
+                p = tuple(bounded[i:i + num_segs])
+                #Words edited in place since the index was made can no
+                #longer match
+                if i < 0 or len(p) < num_segs or p not in env:
+                    continue
+                founds.append(Environment(p[lhs_num], i + lhs_num,
+                                        p[:lhs_num], p[lhs_num + 1:]))
+        if founds:
+            yield word, founds
+
+def phonological_search(corpus, envs, sequence_type = 'transcription',
+                            call_back = None, stop_check = None,
+                            start = 0, limit = None):
+    """
     Perform a search of a corpus for segments, with the option of only
     searching in certain phonological environments.
 
@@ -10,8 +123,6 @@ def phonological_search(corpus, envs, sequence_type = 'transcription',
     ----------
     corpus : Corpus
         Corpus to search
-    seg_list : list of strings or Segments
-        Segments to search for
     envs : list
         Environments to search in
     sequence_type : string
@@ -24,33 +135,51 @@ def phonological_search(corpus, envs, sequence_type = 'transcription',
         Function that can handle strings (text updates of progress),
         tuples of two integers (0, total number of steps) and an integer
         for updating progress out of the total set by a tuple
+    start : int
+        Number of matching words to skip, for getting results a page at a
+        time, defaults to 0
+    limit : int, optional
+        Maximum number of matching words to return, defaults to all of them
 
     Returns
     -------
     list
         A list of tuples with the first element a word and the second
-        a tuple of the segment and the environment that matched
+        a list of the Environments that matched
     """
     if sequence_type == 'spelling':
         return None
-    if call_back is not None:
-        call_back('Searching...')
-        call_back(0, len(corpus))
-        cur = 0
     results = []
-    for word in corpus:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 20 == 0:
-                call_back(cur)
-        tier = getattr(word, sequence_type)
-        founds = []
-        for env in envs:
-            es = tier.find(env)
-            if es is not None:
-                founds.extend(es)
-        if founds:
-            results.append((word, founds))
+    for result in iter_phonological_search(corpus, envs, sequence_type,
+                            start = start, limit = limit,
+                            call_back = call_back, stop_check = stop_check):
+        results.append(result)
+    if stop_check is not None and stop_check():
+        return
     return results
+
+def count_phonological_search(corpus, envs, sequence_type = 'transcription'):
+    """
+    Count the words of a corpus that a phonological search would return,
+    without making their Environments
+
+    Parameters
+    ----------
+    corpus : Corpus
+        Corpus to search
+    envs : list
+        Environments to search in
+    sequence_type : string
+        Specifies whether to use 'transcription' or the name of a
+        transcription tier to use for comparisons
+
+    Returns
+    -------
+    int
+        Number of words with at least one match
+    """
+    if sequence_type == 'spelling':
+        return 0
+    index = get_positional_index(corpus, sequence_type)
+    matches, word_ids = match_environments(index, envs)
+    return len(word_ids)
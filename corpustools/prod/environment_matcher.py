@@ -0,0 +1,89 @@
+class EnvironmentMatcher(object):
+    """
+    Matcher for several EnvironmentFilters at once, which finds every
+    filter that matches at every position of a sequence in a single scan.
+
+    Each filter is given a bit, and for every offset from the middle
+    segment, each segment is mapped to the bits of the filters that
+    allow it at that offset (filters that do not reach that offset
+    allow anything there). A position is matched by the filters whose
+    bits are left after combining the masks of the segments around it,
+    so the work for a sequence depends on its length and the width of
+    the filters, but not on the number of filters.
+
+    Parameters
+    ----------
+    envs : list of EnvironmentFilter
+        Filters to match, their positions in the list are their indices
+        in the results
+    """
+    def __init__(self, envs):
+        self.envs = list(envs)
+        self.lhs_width = max([e.lhs_count() for e in self.envs], default = 0)
+        self.rhs_width = max([e.rhs_count() for e in self.envs], default = 0)
+        self.offsets = [d for d in range(-self.lhs_width, self.rhs_width + 1) if d != 0]
+        self.middle = {}
+        self.masks = {d: {} for d in self.offsets}
+        #Filters that do not reach an offset match whatever is there,
+        #including the edges of the sequence
+        self.unconstrained = {d: 0 for d in self.offsets}
+        for i, env in enumerate(self.envs):
+            bit = 1 << i
+            for s in env._middle:
+                self.middle[s] = self.middle.get(s, 0) | bit
+            lhs = env.lhs if env.lhs is not None else ()
+            rhs = env.rhs if env.rhs is not None else ()
+            slots = {d: segs for d, segs in zip(range(-len(lhs), 0), lhs)}
+            slots.update({d: segs for d, segs in zip(range(1, len(rhs) + 1), rhs)})
+            for d in self.offsets:
+                if d not in slots:
+                    self.unconstrained[d] |= bit
+                    continue
+                for s in slots[d]:
+                    self.masks[d][s] = self.masks[d].get(s, 0) | bit
+        for d in self.offsets:
+            for s in self.masks[d]:
+                self.masks[d][s] |= self.unconstrained[d]
+        self._indices = {}
+
+    def indices(self, bits):
+        """Returns the indices of the filters of a bit mask, in order"""
+        try:
+            return self._indices[bits]
+        except KeyError:
+            indices = tuple(i for i in range(len(self.envs)) if bits >> i & 1)
+            self._indices[bits] = indices
+            return indices
+
+    def match(self, sequence):
+        """
+        Find the filters that match at each middle segment of a sequence
+
+        Parameters
+        ----------
+        sequence : list
+            Segments to search, with any word boundaries included
+
+        Returns
+        -------
+        list
+            Tuples of the position of each segment that is a middle
+            segment of any of the filters, and the indices of the filters
+            that match there, empty if none do
+        """
+        results = []
+        n = len(sequence)
+        for p, s in enumerate(sequence):
+            bits = self.middle.get(s, 0)
+            if not bits:
+                continue
+            for d in self.offsets:
+                q = p + d
+                if 0 <= q < n:
+                    bits &= self.masks[d].get(sequence[q], self.unconstrained[d])
+                else:
+                    bits &= self.unconstrained[d]
+                if not bits:
+                    break
+            results.append((p, self.indices(bits)))
+        return results
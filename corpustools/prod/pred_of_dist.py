@@ -1,14 +1,37 @@
 from collections import defaultdict, OrderedDict
 from math import log2
+from multiprocessing import Pool
+import copy
 import os
 
-from corpustools.corpus.classes import EnvironmentFilter
+from corpustools.corpus.classes import EnvironmentFilter, Environment
+from corpustools.prod.environment_matcher import EnvironmentMatcher
 from corpustools.exceptions import ProdError, PCTError
 
+#Matcher of the current process, set by init_matcher so that the
+#environments are only sent once to each worker process
+_matcher = None
+
+def nonmatching_environments(sequence, middle, lhs_num, rhs_num):
+    """Returns the Environments of the middle segments of a sequence that
+    has no matching environments, with as many segments on each side as
+    an environment has, or None if there are none"""
+    envs = [Environment(sequence[p], p, tuple(sequence[p - lhs_num:p]),
+                        tuple(sequence[p + 1:p + 1 + rhs_num]))
+            for p, s in enumerate(sequence)
+            if s in middle and p >= lhs_num and p + rhs_num < len(sequence)]
+    if not envs:
+        return None
+    return envs
+
 def check_envs(corpus_context, envs, stop_check, call_back):
     """
     Search for the specified segments in the specified environments in
     the corpus.
+
+    All of the environments are matched together by an
+    EnvironmentMatcher, so each word is scanned once for the matches,
+    overlaps and missing environments.
 """
 
     env_matches = {env: {seg: 0 for seg in env.middle} for env in envs}
@@ -16,6 +39,12 @@ def check_envs(corpus_context, envs, stop_check, call_back):
     missing_envs = defaultdict(set)
     overlapping_envs = defaultdict(dict)
 
+    matcher = EnvironmentMatcher(envs)
+    #Keys of env_matches to count for each environment and middle segment
+    match_keys = {}
+    lhs_num = envs[0].lhs_count()
+    rhs_num = envs[0].rhs_count()
+
     if call_back is not None:
         call_back('Finding instances of environments...')
         call_back(0,len(corpus_context))
@@ -29,39 +58,225 @@ def check_envs(corpus_context, envs, stop_check, call_back):
                 call_back(cur)
 
         tier = getattr(word, corpus_context.sequence_type)
-        overlaps = defaultdict(list)
+        sequence = tier.with_word_boundaries()
         found_env = False
-        for env in envs:
-            a = env.is_applicable(tier.with_word_boundaries())
-            if not a:
+        for position, matched in matcher.match(sequence):
+            if not matched:
                 continue
-            es = tier.find(env)
-            if es is not None:
-                found_env = True
-                for e in es:
+            found_env = True
+            middle = sequence[position]
+            for i in matched:
+                env = envs[i]
+                try:
+                    keys = match_keys[i, middle]
+                except KeyError:
                     if is_sets:
-                        for x in env.middle:
-                            if e.middle in x:
-                                env_matches[env][x] += word.frequency
+                        keys = [x for x in env.middle if middle in x]
                     else:
-                        env_matches[env][e.middle] += word.frequency
-                    overlaps[e].append(env)
-
-
-        if not found_env and any(m in tier for m in envs[0].middle):
-            actual_env = tier.find_nonmatch(envs[0])
-            missing_envs[str(actual_env)].update([str(word)])
-
-        for k,v in overlaps.items():
-            if len(v) > 1:
-                k = tuple(str(env) for env in v)
+                        keys = [middle]
+                    match_keys[i, middle] = keys
+                for x in keys:
+                    env_matches[env][x] += word.frequency
+            if len(matched) > 1:
+                k = tuple(str(envs[i]) for i in matched)
                 k2 = str(k)
                 if k2 not in overlapping_envs[k]:
                     overlapping_envs[k][k2] = set()
                 overlapping_envs[k][k2].update([str(word)])
 
+        if not found_env and any(m in tier for m in envs[0].middle):
+            #Where the middle segments of the first environment are, but
+            #with its sides as they are in the word
+            actual_env = nonmatching_environments(sequence, envs[0].middle,
+                                                lhs_num, rhs_num)
+            missing_envs[str(actual_env)].update([str(word)])
+
     return env_matches, missing_envs, overlapping_envs
 
+def init_matcher(envs):
+    global _matcher
+    _matcher = EnvironmentMatcher(envs)
+
+def count_envs(words):
+    """
+    Count the segments of words in the environments of the current
+    matcher
+
+    Parameters
+    ----------
+    words : list
+        Tuples of the name, the sequence with word boundaries and the
+        frequency of each word
+
+    Returns
+    -------
+    tuple
+        Frequency of each segment in each environment keyed by the index
+        of the environment and the segment, names of the words where
+        segments are in more than one environment keyed by the segment
+        and the indices of the environments, and the name, sequence,
+        segments and segments in any environment of each word with
+        segments that are not in an environment
+    """
+    counts = defaultdict(float)
+    overlaps = defaultdict(set)
+    uncovered = []
+    for name, sequence, frequency in words:
+        present = set()
+        matched_segs = set()
+        for position, matched in _matcher.match(sequence):
+            seg = sequence[position]
+            present.add(seg)
+            if not matched:
+                continue
+            matched_segs.add(seg)
+            for i in matched:
+                counts[i, seg] += frequency
+            if len(matched) > 1:
+                overlaps[seg, matched].add(name)
+        if present - matched_segs:
+            uncovered.append((name, sequence, present, matched_segs))
+    return counts, overlaps, uncovered
+
+def calc_prod_pairs(corpus_context, segment_pairs, envs = None, strict = True,
+                all_info = False, num_cores = -1, chunk_size = 1000,
+                stop_check = None, call_back = None):
+    """
+    Calculate predictability of distribution for many pairs of segments
+    over the same environments, counting the segments in each environment
+    in one pass over the corpus instead of one pass per pair.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    segment_pairs : list
+        Pairs of segments, or of sets of segments, such as every pair of
+        a natural class from ``itertools.combinations``
+    envs : list of EnvironmentFilter, optional
+        Environments shared by all of the pairs, their middle segments
+        are ignored.  If None, predictability of distribution is
+        calculated regardless of environment, as in ``calc_prod_all_envs``
+    strict : bool
+        If true, an exception will be raised for the first pair with
+        non-exhaustive or non-unique environments.  Defaults to True.
+    all_info : bool
+        If true, all the intermediate numbers for calculating predictability
+        of distribution will be returned.  If false, only the final entropy
+        will be returned.  Defaults to False.
+    num_cores : int
+        Number of processes to count the corpus with, -1 to count in
+        this process
+    chunk_size : int
+        Number of words to count at once
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list
+        Result of each pair, as returned by ``calc_prod``, or by
+        ``calc_prod_all_envs`` if there are no environments, with the
+        frequencies of the segments in the order of the pair
+    """
+    if envs is None:
+        results = []
+        for seg1, seg2 in segment_pairs:
+            if stop_check is not None and stop_check():
+                return
+            results.append(calc_prod_all_envs(corpus_context, seg1, seg2, all_info))
+        return results
+
+    def members(seg):
+        if isinstance(seg, str):
+            return {seg}
+        return set(seg)
+    segments = set()
+    for pair in segment_pairs:
+        for seg in pair:
+            segments.update(members(seg))
+    filters = [EnvironmentFilter(segments, e.lhs, e.rhs) for e in envs]
+
+    def chunks():
+        chunk = []
+        for word in corpus_context:
+            tier = getattr(word, corpus_context.sequence_type)
+            chunk.append((str(word), tier.with_word_boundaries(), word.frequency))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if call_back is not None:
+        call_back('Finding instances of environments...')
+        call_back(0, len(corpus_context))
+        cur = 0
+    counts = defaultdict(float)
+    overlaps = defaultdict(set)
+    uncovered = []
+    pool = None
+    try:
+        if num_cores == -1:
+            init_matcher(filters)
+            results = (count_envs(c) for c in chunks())
+        else:
+            pool = Pool(num_cores, init_matcher, (filters,))
+            results = pool.imap(count_envs, chunks())
+        for chunk_counts, chunk_overlaps, chunk_uncovered in results:
+            if stop_check is not None and stop_check():
+                return
+            for k, v in chunk_counts.items():
+                counts[k] += v
+            for k, v in chunk_overlaps.items():
+                overlaps[k].update(v)
+            uncovered.extend(chunk_uncovered)
+            if call_back is not None:
+                cur += chunk_size
+                call_back(min(cur, len(corpus_context)))
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    lhs_num = envs[0].lhs_count()
+    rhs_num = envs[0].rhs_count()
+    results = []
+    for pair in segment_pairs:
+        pair_segments = set()
+        for seg in pair:
+            pair_segments.update(members(seg))
+        env_matches = OrderedDict()
+        for i, env in enumerate(envs):
+            env_matches[env] = {seg: sum(counts.get((i, s), 0) for s in members(seg))
+                                for seg in pair}
+        if strict:
+            overlap_envs = defaultdict(dict)
+            for (seg, matched), names in overlaps.items():
+                if seg not in pair_segments:
+                    continue
+                k = tuple(str(envs[i]) for i in matched)
+                overlap_envs[k].setdefault(str(k), set()).update(names)
+            miss_envs = defaultdict(set)
+            #As in check_envs, only pairs of single segments are checked
+            #for exhaustivity
+            if all(isinstance(seg, str) for seg in pair):
+                for name, sequence, present, matched_segs in uncovered:
+                    if present & pair_segments and not matched_segs & pair_segments:
+                        actual_env = nonmatching_environments(sequence,
+                                                pair_segments, lhs_num, rhs_num)
+                        miss_envs[str(actual_env)].add(name)
+            if miss_envs or overlap_envs:
+                pair_envs = []
+                for env in envs:
+                    env = copy.copy(env)
+                    env.middle = set(pair)
+                    pair_envs.append(env)
+                raise(ProdError(pair_envs, miss_envs, overlap_envs))
+        results.append(prod_entropies(env_matches, list(pair), all_info))
+    return results
+
 def calc_prod_all_envs(corpus_context, seg1, seg2, all_info = False, stop_check = None,
                 call_back = None):
     """
@@ -164,22 +379,40 @@ def calc_prod(corpus_context, envs, strict = True, all_info = False, stop_check
         if strict:
             raise(ProdError(envs, miss_envs, overlap_envs))
 
+    return prod_entropies(env_matches, seg_list, all_info)
+
+def prod_entropies(env_matches, seg_list, all_info = False):
+    """
+    Calculate the entropy of a set of segments in each environment, and
+    their entropy across all of the environments weighted by frequency,
+    from the frequencies of the segments in each environment.
+
+    Parameters
+    ----------
+    env_matches : dict
+        Keys are environments and values are dictionaries of the
+        frequency of each segment in the environment
+    seg_list : iterable
+        Segments, in the order of their frequencies in the results
+    all_info : bool
+        If true, all the intermediate numbers for calculating predictability
+        of distribution will be returned.  If false, only the final entropy
+        will be returned.  Defaults to False.
+
+    Returns
+    -------
+    dict
+        Keys are the environments and 'AVG', and values are either a list
+        of [entropy, frequency of environment, frequency of each segment]
+        if all_info is True, or just entropy if all_info is False.
+    """
     H_dict = OrderedDict()
 
     #CALCULATE ENTROPY IN INDIVIDUAL ENVIRONMENTS FIRST
     total_matches = {x: 0 for x in seg_list}
     total_frequency = 0
 
-    if call_back is not None:
-        call_back('Calculating predictability of distribution...')
-        call_back(0,len(corpus_context))
-        cur = 0
     for env in env_matches:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            call_back(cur)
         total_tokens = 0
         matches = {}
         for seg in seg_list:
@@ -0,0 +1,275 @@
+import os
+import hashlib
+from multiprocessing import Pool
+
+import numpy as np
+
+from corpustools.symbolsim.edit_distance import batch_edit_distance
+from corpustools.symbolsim.khorsi import encoded_khorsi
+from corpustools.symbolsim.phono_align import Aligner
+
+from corpustools.exceptions import StringSimilarityError
+
+#Scorer of the current process, set by init_scorer so that the sequences
+#are only sent once to each worker process
+_scorer = None
+
+class TileScorer(object):
+    """
+    Scores tiles of the matrix of string similarities between every pair
+    of words.
+
+    Parameters
+    ----------
+    algorithm : str
+        'khorsi', 'edit_distance' or 'phono_edit_distance'
+    sequences : list
+        Sequences of the words, integer-encoded for 'khorsi' and
+        'edit_distance' and lists of segments for 'phono_edit_distance'
+    surprisal : list, optional
+        Surprisal of each segment indexed by segment ID, for 'khorsi'
+    features : FeatureMatrix, optional
+        Feature system, for 'phono_edit_distance'
+    """
+    def __init__(self, algorithm, sequences, surprisal = None, features = None):
+        self.algorithm = algorithm
+        self.sequences = sequences
+        self.surprisal = surprisal
+        if algorithm == 'phono_edit_distance':
+            self.aligner = Aligner(features_tf = True, features = features)
+
+    def score(self, tile):
+        """
+        Calculate the similarities of a tile
+
+        Parameters
+        ----------
+        tile : tuple
+            First and last (exclusive) rows and columns of the tile, with
+            the first row no greater than the first column
+
+        Returns
+        -------
+        numpy.ndarray
+            Similarities of the words of the rows to the words of the
+            columns, tiles on the diagonal only have the similarities
+            on and above the diagonal, the rest are NaN
+        """
+        i0, i1, j0, j1 = tile
+        scores = np.full((i1 - i0, j1 - j0), np.nan)
+        if self.algorithm == 'edit_distance':
+            columns = self.sequences[j0:j1]
+            lengths = np.array([len(s) for s in columns], dtype = int)
+            candidates = np.zeros((len(columns), lengths.max()), dtype = int)
+            for k, s in enumerate(columns):
+                candidates[k, :len(s)] = s
+            for r in range(i1 - i0):
+                scores[r] = batch_edit_distance(self.sequences[i0 + r], candidates, lengths)
+            if i0 == j0:
+                scores[np.tril_indices(i1 - i0, -1)] = np.nan
+            return scores
+        for r in range(i1 - i0):
+            s1 = self.sequences[i0 + r]
+            for c in range(max(0, i0 + r - j0), j1 - j0):
+                s2 = self.sequences[j0 + c]
+                if self.algorithm == 'khorsi':
+                    scores[r, c] = encoded_khorsi(s1, s2, self.surprisal)
+                else:
+                    scores[r, c] = self.aligner.distance(s1, s2)
+        return scores
+
+def init_scorer(*args):
+    global _scorer
+    _scorer = TileScorer(*args)
+
+def score_tile(tile):
+    index, tile = tile
+    return index, tile, _scorer.score(tile)
+
+def make_tiles(num_words, tile_size):
+    """Returns the tiles of the upper triangle of a matrix, each tile
+    being the first and last (exclusive) rows and columns it covers"""
+    tiles = []
+    for i0 in range(0, num_words, tile_size):
+        for j0 in range(i0, num_words, tile_size):
+            tiles.append((i0, min(i0 + tile_size, num_words),
+                        j0, min(j0 + tile_size, num_words)))
+    return tiles
+
+def words_fingerprint(words, sequence_type):
+    """Returns a hash of the spellings, sequences and frequencies of a
+    list of words, to tell whether a progress file was made for the same
+    words"""
+    digest = hashlib.sha1()
+    for w in words:
+        digest.update('{}\t{}\t{}\n'.format(w.spelling,
+                    getattr(w, sequence_type), w.frequency).encode('utf-8'))
+    return digest.hexdigest()
+
+def read_progress(path, header):
+    """Returns the indices of completed tiles and the size of the output
+    file when the last tile was completed, from a progress file made for
+    the same calculation"""
+    completed = set()
+    offset = 0
+    with open(path, 'r', encoding = 'utf-8') as f:
+        if f.readline().rstrip('\n') != header:
+            raise(StringSimilarityError('{} is from a different calculation, please remove it or choose another output file.'.format(path)))
+        for line in f:
+            fields = line.split()
+            if len(fields) != 2:
+                #Incomplete line from an interrupted write
+                break
+            completed.add(int(fields[0]))
+            offset = int(fields[1])
+    return completed, offset
+
+def all_pairs_similarity(corpus_context, algorithm, output_path,
+                        output_format = 'matrix', min_rel = None, max_rel = None,
+                        tile_size = 500, num_cores = -1, dtype = 'float32',
+                        stop_check = None, call_back = None):
+    """
+    Calculate the string similarity of every pair of words in a corpus
+    and write it to disk, without keeping every pair in memory.
+
+    Only the upper triangle of the matrix of pairs is calculated, in
+    square tiles that can be divided between processes. A progress file
+    (the output path with '.progress' appended) records each tile as it
+    is written, and calling this function again with the same arguments
+    and words resumes from the completed tiles.  A progress file from any
+    other calculation raises a StringSimilarityError.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    algorithm : str
+        The algorithm of string similarity to be used, currently supports
+        'khorsi', 'edit_distance', and 'phono_edit_distance'
+    output_path : str
+        Path of the file to write to
+    output_format : str
+        'matrix' for a NumPy (.npy) file of a symmetric matrix of every
+        similarity, which can be opened with ``numpy.load(path,
+        mmap_mode = 'r')``, or 'edges' for a tab-delimited file with the
+        indices of both words and their similarity on each line, for
+        pairs within min_rel and max_rel only
+    min_rel : float, optional
+        For edges, filters out pairs lower than min_rel
+    max_rel : float, optional
+        For edges, filters out pairs higher than max_rel
+    tile_size : int
+        Number of rows and columns of each tile
+    num_cores : int
+        Number of processes to use, -1 to calculate in this process
+    dtype : str
+        Data type of the matrix
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list
+        Words of the corpus context, in the order of the rows and columns
+        of the matrix and the indices of the edges
+    """
+    if algorithm not in ['khorsi', 'edit_distance', 'phono_edit_distance']:
+        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+    if output_format not in ['matrix', 'edges']:
+        raise(StringSimilarityError('{} is not a possible output format.'.format(output_format)))
+    words = list(corpus_context)
+    surprisal = None
+    features = None
+    if algorithm == 'phono_edit_distance':
+        features = corpus_context.specifier
+        sequences = [list(getattr(w, corpus_context.sequence_type)) for w in words]
+    else:
+        sequences = [corpus_context.encode_sequence(w) for w in words]
+    if algorithm == 'khorsi':
+        #Word boundaries are not counted, as in string_similarity
+        surprisal = corpus_context.get_surprisal(word_boundaries = False)
+
+    tiles = make_tiles(len(words), tile_size)
+    progress_path = output_path + '.progress'
+    #Everything that the output depends on, so that a calculation is
+    #only resumed with the same arguments and words
+    header = ' '.join(str(x) for x in [algorithm, output_format, len(words),
+                    tile_size, dtype, min_rel, max_rel,
+                    corpus_context.sequence_type, corpus_context.type_or_token,
+                    type(corpus_context).__name__,
+                    words_fingerprint(words, corpus_context.sequence_type)])
+    completed = set()
+    offset = 0
+    if os.path.exists(progress_path) and os.path.exists(output_path):
+        completed, offset = read_progress(progress_path, header)
+    else:
+        with open(progress_path, 'w', encoding = 'utf-8') as f:
+            f.write(header + '\n')
+    if output_format == 'matrix':
+        if completed:
+            matrix = np.load(output_path, mmap_mode = 'r+')
+        else:
+            matrix = np.lib.format.open_memmap(output_path, mode = 'w+',
+                                        dtype = dtype, shape = (len(words), len(words)))
+    else:
+        if completed:
+            #Lines written after the last completed tile are removed
+            with open(output_path, 'ab') as f:
+                f.truncate(offset)
+        else:
+            open(output_path, 'wb').close()
+        edges = open(output_path, 'ab')
+    progress = open(progress_path, 'a', encoding = 'utf-8')
+
+    pending = [(i, t) for i, t in enumerate(tiles) if i not in completed]
+    if call_back is not None:
+        call_back('Calculating string similarity...')
+        call_back(len(completed), len(tiles))
+        cur = len(completed)
+    args = (algorithm, sequences, surprisal, features)
+    pool = None
+    try:
+        if num_cores == -1:
+            init_scorer(*args)
+            results = (score_tile(t) for t in pending)
+        else:
+            pool = Pool(num_cores, init_scorer, args)
+            results = pool.imap_unordered(score_tile, pending)
+        for index, (i0, i1, j0, j1), scores in results:
+            if stop_check is not None and stop_check():
+                break
+            if output_format == 'matrix':
+                if i0 == j0:
+                    scores = np.triu(scores) + np.triu(scores, 1).T
+                matrix[i0:i1, j0:j1] = scores
+                matrix[j0:j1, i0:i1] = scores.T
+                matrix.flush()
+            else:
+                keep = np.isfinite(scores)
+                if i0 == j0:
+                    keep &= np.triu(np.ones(scores.shape, dtype = bool), 1)
+                if min_rel is not None:
+                    keep &= scores >= min_rel
+                if max_rel is not None:
+                    keep &= scores <= max_rel
+                lines = ['{}\t{}\t{}\n'.format(i0 + r, j0 + c, scores[r, c])
+                            for r, c in zip(*keep.nonzero())]
+                edges.write(''.join(lines).encode('utf-8'))
+                edges.flush()
+                offset = edges.tell()
+            progress.write('{} {}\n'.format(index, offset))
+            progress.flush()
+            if call_back is not None:
+                cur += 1
+                call_back(cur)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        progress.close()
+        if output_format == 'matrix':
+            del matrix
+        else:
+            edges.close()
+    return words
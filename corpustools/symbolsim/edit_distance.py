@@ -1,3 +1,5 @@
+import numpy as np
+
 from corpustools.corpus.classes import Word
 #from corpustools.symbolsim.phono_align import Aligner
 
@@ -73,6 +75,9 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
     string_type : string
         String specifying what attribute of the Word objects to compare,
         can be "spelling", "transcription" or a tier
+    max_distance : int, optional
+        If specified, only distances up to this value are calculated
+        exactly, see ``banded_edit_distance``
 
     Returns
     -------
@@ -89,6 +94,9 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
     else:
         s2 = word2
 
+    if max_distance is not None:
+        return banded_edit_distance(s1, s2, max_distance)
+
     if len(s1) >= len(s2):
         longer = s1
         shorter = s2
@@ -96,6 +104,8 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
         longer = s2
         shorter = s1
 
+    if 0 < len(shorter) <= BIT_PARALLEL_LENGTH:
+        return bit_parallel_edit_distance(shorter, longer)
 
     previous_row = range(len(shorter) + 1)
     for i, c1 in enumerate(longer):
@@ -106,7 +116,212 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
             substitutions = previous_row[j] + (c1 != c2)
             current_row.append(min(insertions, deletions, substitutions))
         previous_row = current_row
-        #if max_distance is not None and previous_row[-1] > max_distance:
-        #    break
     return previous_row[-1]
 
+def banded_edit_distance(s1, s2, max_distance):
+    """Returns the Levenshtein edit distance between two sequences if it
+    is not greater than a maximum distance (Ukkonen 1985).
+
+    Only the cells of the distance matrix within max_distance of its
+    diagonal are computed, and the calculation is abandoned as soon as
+    every cell of a row is greater than max_distance.
+
+    Parameters
+    ----------
+    s1: sequence
+        the first sequence to be compared
+    s2: sequence
+        the second sequence to be compared
+    max_distance : int
+        Maximum distance to calculate exactly
+
+    Returns
+    -------
+    int:
+        the edit distance between the sequences if it is not greater
+        than max_distance, otherwise a number greater than max_distance
+    """
+    if len(s1) >= len(s2):
+        longer = s1
+        shorter = s2
+    else:
+        longer = s2
+        shorter = s1
+    k = int(max_distance)
+    if len(longer) - len(shorter) > k:
+        return len(longer) - len(shorter)
+    too_far = k + 1
+    m = len(shorter)
+
+    previous_row = [j if j <= k else too_far for j in range(m + 1)]
+    for i, c1 in enumerate(longer, 1):
+        current_row = [too_far] * (m + 1)
+        if i <= k:
+            current_row[0] = i
+        for j in range(max(1, i - k), min(m, i + k) + 1):
+            d = min(previous_row[j] + 1,
+                    current_row[j - 1] + 1,
+                    previous_row[j - 1] + (c1 != shorter[j - 1]))
+            if d < too_far:
+                current_row[j] = d
+        if min(current_row) == too_far:
+            return too_far
+        previous_row = current_row
+    return previous_row[m]
+
+#Longest sequence that bit_parallel_edit_distance is used for, so that
+#its bit vectors fit into a machine word
+BIT_PARALLEL_LENGTH = 64
+
+def bit_parallel_edit_distance(pattern, text):
+    """Returns the Levenshtein edit distance between two sequences,
+    computing each column of the distance matrix at once from bit vectors
+    of the vertical differences between cells (Myers 1999, Hyyrö 2001).
+
+    Parameters
+    ----------
+    pattern: sequence
+        Non-empty sequence whose bit vectors are used, should be the
+        shorter sequence and no longer than ``BIT_PARALLEL_LENGTH``
+    text: sequence
+        The other sequence, for example integer-encoded segments
+
+    Returns
+    -------
+    int:
+        the edit distance between the sequences
+    """
+    m = len(pattern)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    peq = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    pv = full
+    mv = 0
+    score = m
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+def batch_edit_distance(query, candidates, lengths = None):
+    """Returns the Levenshtein edit distances between a query sequence and
+    many candidate sequences at once.
+
+    The distance matrices of all candidates are filled one query segment
+    at a time, with insertions resolved by a cumulative minimum along
+    each row.
+
+    Parameters
+    ----------
+    query: sequence of int
+        Integer-encoded query sequence
+    candidates: numpy.ndarray
+        Two-dimensional array of integer-encoded candidate sequences, one
+        per row, padded at the end with 0
+    lengths : numpy.ndarray, optional
+        Length of each candidate sequence, defaults to all candidates
+        having the length of the rows
+
+    Returns
+    -------
+    numpy.ndarray
+        Edit distance between the query and each candidate
+    """
+    num_candidates, length = candidates.shape
+    columns = np.arange(length + 1)
+    previous_rows = np.tile(columns, (num_candidates, 1))
+    current_rows = np.empty_like(previous_rows)
+    for i, c in enumerate(query, 1):
+        current_rows[:, 0] = i
+        np.minimum(previous_rows[:, :-1] + (candidates != c),
+                    previous_rows[:, 1:] + 1, out = current_rows[:, 1:])
+        current_rows -= columns
+        np.minimum.accumulate(current_rows, axis = 1, out = current_rows)
+        current_rows += columns
+        previous_rows, current_rows = current_rows, previous_rows
+    if lengths is None:
+        return previous_rows[:, -1]
+    return previous_rows[np.arange(num_candidates), lengths]
+
+class LengthBuckets(object):
+    """
+    Integer-encoded sequences of every word in a corpus context, grouped
+    into arrays of sequences with the same length, for calculating the
+    edit distance from a query to every word with ``batch_edit_distance``.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+
+    Attributes
+    ----------
+    words : list
+        Words of the corpus context, their positions are their word IDs
+    buckets : dict
+        Mapping of sequence lengths to a tuple of an array of the word IDs
+        with that length and a two-dimensional array of their sequences
+    """
+    def __init__(self, corpus_context):
+        self.corpus_context = corpus_context
+        self.words = []
+        by_length = {}
+        #Not list(), which would iterate over the context to get its length
+        words = [w for w in corpus_context]
+        corpus_context.get_segment_ids(words)
+        for w in words:
+            sequence = corpus_context.encode_sequence(w)
+            if len(sequence) not in by_length:
+                by_length[len(sequence)] = ([], [])
+            by_length[len(sequence)][0].append(len(self.words))
+            by_length[len(sequence)][1].append(sequence)
+            self.words.append(w)
+        self.buckets = {}
+        for length, (ids, sequences) in by_length.items():
+            self.buckets[length] = (np.array(ids, dtype = int),
+                    np.array(sequences, dtype = int).reshape(len(ids), length))
+
+    def edit_distances(self, query, max_distance = None):
+        """
+        Calculate the edit distance from a query to every word
+
+        Parameters
+        ----------
+        query : Word or tuple
+            Word, or integer-encoded sequence, to compare to every word
+        max_distance : int, optional
+            If specified, words whose lengths differ from the query by more
+            than this are not compared, and get the length difference
+            (which is greater than max_distance) as their distance
+
+        Returns
+        -------
+        numpy.ndarray
+            Edit distances, indexed by word ID
+        """
+        if not isinstance(query, tuple):
+            query = self.corpus_context.encode_sequence(query)
+        distances = np.empty(len(self.words), dtype = int)
+        for length, (ids, sequences) in self.buckets.items():
+            difference = abs(length - len(query))
+            if max_distance is not None and difference > max_distance:
+                distances[ids] = difference
+                continue
+            distances[ids] = batch_edit_distance(query, sequences)
+        return distances
+
+    def __len__(self):
+        return len(self.words)
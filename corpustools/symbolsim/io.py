@@ -22,9 +22,10 @@ def print_one_word_results(output_filename, query, string_type, related_data, mi
             outf.write(w + '\t' + str(score) + '\n')
 
 def read_pairs_file(path):
-    output = []
+    return list(iter_pairs_file(path))
+
+def iter_pairs_file(path):
     with open(path,'r') as f:
         for line in f:
             fields = line.strip().split('\t')
-            output.append(fields)
-    return output
+            yield fields
@@ -1,7 +1,12 @@
 
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 from math import log
 
+#Relative margin added to upper bounds, so that rounding errors in
+#summing surprisals in a different order never prune an exact match
+BOUND_TOLERANCE = 1e-9
+
 def lcs(x1, x2):
     """Returns the longest common sequence of two lists of characters
     and the remainder elements not in the longest common sequence
@@ -29,45 +34,64 @@ def lcs(x1, x2):
     else:
         longer = x2
         shorter = x1
-    stringMatches = []
-    largestMatch = None
-    for i in range(len(shorter),0,-1):
-        #Get all possible substrings of word x1
-        shorter_strings = substring_set(shorter, i)
-        longer_strings = substring_set(longer, i)
-
-        s = shorter_strings & longer_strings
-
-        if len(s):
-            break
-    else:
-        return [], longer+shorter
-
+    begin, longer_begin, length = longest_common_substring(shorter, longer)
+    if not length:
+        return [], list(longer) + list(shorter)
+    end = begin + length
+    longer_end = longer_begin + length
     leftover = []
-    for i in range(len(shorter)):
-
-        begin = i
-        for lcs in s:
-            lcs = lcs.split('.') #back to list
-            end = i+len(lcs)
-            if shorter[begin:end] == lcs:
-                break
-        else:
-            lcs = None
-        if lcs is not None:
-            break
-    if lcs is None:
-        lcs = []
     leftover.extend(shorter[:begin])
     leftover.extend(shorter[end:])
-    for i in range(len(longer)):
-        begin = i
-        end = i+len(lcs)
-        if longer[begin:end] == lcs:
-            break
-    leftover.extend(longer[:begin])
-    leftover.extend(longer[end:])
-    return lcs,leftover
+    leftover.extend(longer[:longer_begin])
+    leftover.extend(longer[longer_end:])
+    return list(shorter[begin:end]), leftover
+
+def longest_common_substring(shorter, longer):
+    """Returns the position and length of the longest common substring
+    of two sequences, using dynamic programming over the lengths of
+    common suffixes of their prefixes
+
+    Ties are broken by the earliest position in the shorter sequence,
+    and then by the earliest position in the longer sequence.
+
+    Parameters
+    ----------
+    shorter: sequence
+        First sequence, elements can be any hashable type (such as
+        segment symbols or integer segment IDs)
+
+    longer: sequence
+        Second sequence
+
+    Returns
+    -------
+    int
+        Index of the start of the substring in the first sequence
+
+    int
+        Index of the start of the substring in the second sequence
+
+    int
+        Length of the substring, 0 if the sequences have no elements in
+        common
+    """
+    best = 0
+    best_i = best_j = -1
+    previous = [0] * (len(longer) + 1)
+    for i, x in enumerate(shorter):
+        current = [0]
+        for j, y in enumerate(longer):
+            if x == y:
+                length = previous[j] + 1
+                if length > best:
+                    best = length
+                    best_i = i
+                    best_j = j
+                current.append(length)
+            else:
+                current.append(0)
+        previous = current
+    return best_i - best + 1, best_j - best + 1, best
 
 def substring_set(w, l):
     """Returns all substrings of a word w of length l
@@ -139,3 +163,190 @@ def khorsi(word1, word2, freq_base, sequence_type, max_distance = None):
             break
     return khorsi_sum
 
+def surprisal_list(freq_base, segment_ids, word_boundaries = True):
+    """Returns the surprisal, log(1/p), of each segment, indexed by
+    segment ID
+
+    Parameters
+    ----------
+    freq_base: dictionary
+        a dictionary where each segment is mapped to its frequency of
+        occurrence in a corpus
+
+    segment_ids: dictionary
+        a dictionary where each segment is mapped to its integer ID
+
+    word_boundaries: bool
+        If False, word boundaries are not counted in the total frequency
+
+    Returns
+    -------
+    list
+        Surprisal of each segment at the index of its ID, segments
+        that do not occur in the corpus have a surprisal of None
+    """
+    total = freq_base['total']
+    if not word_boundaries:
+        total -= freq_base.get('#', 0)
+    surprisal = [None] * (max(segment_ids.values(), default = 0) + 1)
+    for s, i in segment_ids.items():
+        if s not in freq_base or (s == '#' and not word_boundaries):
+            continue
+        surprisal[i] = log(1/(freq_base[s]/total))
+    return surprisal
+
+def khorsi_upper_bound(seq1, seq2, surprisal):
+    """Returns an upper bound on the Khorsi (2012) similarity of two
+    integer-encoded sequences, without finding their longest common
+    substring
+
+    The similarity is the surprisal of the longest common substring
+    minus the surprisal of the leftover segments of both words, which is
+    3 * S(lcs) - S(seq1) - S(seq2).  The common substring can be no more
+    surprising than either word, so the similarity is at most
+    2 * min(S(seq1), S(seq2)) - max(S(seq1), S(seq2)).
+
+    Parameters
+    ----------
+    seq1: tuple
+        Integer-encoded sequence of the first word
+
+    seq2: tuple
+        Integer-encoded sequence of the second word
+
+    surprisal: list
+        Surprisal of each segment, indexed by segment ID
+
+    Returns
+    -------
+    float
+        Upper bound on the similarity of the two sequences, with a small
+        margin for rounding errors
+    """
+    total1 = sum(surprisal[x] for x in seq1)
+    total2 = sum(surprisal[x] for x in seq2)
+    if total1 > total2:
+        total1, total2 = total2, total1
+    return 2 * total1 - total2 + BOUND_TOLERANCE * (total1 + total2)
+
+def encoded_khorsi(seq1, seq2, surprisal, max_distance = None):
+    """Calculate the string similarity of two integer-encoded sequences
+    based on Khorsi (2012), given the surprisal of each segment
+
+    Parameters
+    ----------
+    seq1: tuple
+        Integer-encoded sequence of the first word
+
+    seq2: tuple
+        Integer-encoded sequence of the second word
+
+    surprisal: list
+        Surprisal of each segment, indexed by segment ID (see
+        ``CorpusContext.get_surprisal``)
+
+    max_distance: float, optional
+        If specified, the calculation stops once the similarity falls
+        below it
+
+    Returns
+    -------
+    float
+        A number representing the relatedness of two words based on Khorsi (2012)
+    """
+    longest, left_over = lcs(seq1, seq2)
+    khorsi_sum = 0
+    for x in longest:
+        khorsi_sum += surprisal[x]
+    for x in left_over:
+        khorsi_sum -= surprisal[x]
+        if max_distance is not None and khorsi_sum < max_distance:
+            break
+    return khorsi_sum
+
+
+class SurprisalIndex(object):
+    """
+    Integer-encoded sequences of every word in a corpus context, sorted by
+    their total surprisal, for finding the words whose Khorsi (2012)
+    similarity to a query can reach a threshold.
+
+    By the bound in ``khorsi_upper_bound``, a word with total surprisal t
+    can only reach a similarity of m to a query with total surprisal q if
+    (m + q) / 2 <= t <= 2 * q - m, so every other word is skipped with a
+    binary search.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    word_boundaries : bool
+        If False, word boundaries are not counted in the total frequency
+        of segments
+
+    Attributes
+    ----------
+    surprisal : list
+        Surprisal of each segment, indexed by segment ID
+    words : list
+        Words of the corpus context, sorted by total surprisal
+    sequences : list
+        Integer-encoded sequences of the words
+    totals : list
+        Total surprisal of the words
+    positions : list
+        Positions of the words in the corpus context
+    """
+    def __init__(self, corpus_context, word_boundaries = True):
+        self.surprisal = corpus_context.get_surprisal(word_boundaries)
+        entries = []
+        for i, w in enumerate(corpus_context):
+            sequence = corpus_context.encode_sequence(w)
+            entries.append((self.total(sequence), i, w, sequence))
+        entries.sort(key = lambda x: (x[0], x[1]))
+        self.totals = [x[0] for x in entries]
+        self.positions = [x[1] for x in entries]
+        self.words = [x[2] for x in entries]
+        self.sequences = [x[3] for x in entries]
+
+    def total(self, sequence):
+        """
+        Calculate the total surprisal of an integer-encoded sequence
+
+        Parameters
+        ----------
+        sequence : tuple
+            Integer-encoded sequence
+
+        Returns
+        -------
+        float
+            Sum of the surprisals of the segments
+        """
+        return sum(self.surprisal[x] for x in sequence)
+
+    def candidates(self, query, min_similarity):
+        """
+        Find the words whose similarity to a query can reach a threshold
+
+        Parameters
+        ----------
+        query : tuple
+            Integer-encoded sequence of the query
+        min_similarity : float
+            Minimum similarity to the query
+
+        Returns
+        -------
+        list
+            Indices of the candidate words, in the order of the corpus
+            context
+        """
+        q = self.total(query)
+        margin = BOUND_TOLERANCE * (abs(q) + abs(min_similarity) + 1)
+        low = bisect_left(self.totals, (min_similarity + q) / 2 - margin)
+        high = bisect_right(self.totals, 2 * q - min_similarity + margin)
+        return sorted(range(low, high), key = lambda i: self.positions[i])
+
+    def __len__(self):
+        return len(self.words)
@@ -7,6 +7,12 @@
 from collections import defaultdict
 from codecs import open
 
+#Flags of the directions that an alignment can come from, in the
+#traceback of the alignment matrix
+ABOVELEFT = 1
+ABOVE = 2
+LEFT = 4
+
 class Aligner(object):
 
     def __init__(self, features_tf=True, ins_penalty=1, del_penalty=1,
@@ -21,6 +27,8 @@ class Aligner(object):
         self.features = features
         self.underspec_cost = underspec_cost # should be set to 1.0 to disable underspecification
         self.ins_del_basis = ins_del_basis
+        self._segment_costs = None
+        self._segment_distances = None
 
         if features_tf:
             if self.ins_del_basis == 'empty':
@@ -32,66 +40,207 @@ class Aligner(object):
                     for feature in feature_names:
                         self.silence_features[feature] = '0'
             elif self.ins_del_basis == 'average':
-                total = 0
-                for segment1 in self.features:
-                    for segment2 in self.features:
-                        if segment1 != segment2:
-                            total += self.compare_segments(segment1, segment2, self.underspec_cost)
-                self.ins_del_difference = total / (len(self.features)^2 - len(self.features))
+                #Average distance between two different segments
+                indices, distances = self.features.segment_distances(self.underspec_cost)
+                num_segments = len(distances) - 1
+                self.ins_del_difference = (distances[:-1, :-1].sum() /
+                                            (num_segments ** 2 - num_segments))
 
     def align(self, seq1=None, seq2=None):
-        similarity_matrix = self.make_similarity_matrix(seq1, seq2)
-        alignment = self.generate_alignment(seq1, seq2, similarity_matrix)
-        return alignment
-
-
-
-    def make_similarity_matrix(self, seq1=None, seq2=None):
-
-        d = []
-
         seq1 = list(seq1)
         seq2 = list(seq2)
+        f, trace = self.fill_matrix(seq1, seq2, traceback = True)
+        alignment = self.trace_alignment(seq1, seq2, trace)
+        return alignment
 
-        def compare(x, y):
-            return x - y <= self.tolerance
-
-        initial_vals = {'aboveleft': 0,
-                        'above': 0,
-                        'left': 0,
-                        'trace': 0,
-                        'f': None}
-
-        d = [[initial_vals.copy() for y in seq2+[' ']] for x in seq1+[' ']]
-        d[0][0]['f'] = 0
+    def segment_costs(self):
+        """
+        Generate (and cache) the costs of substituting, inserting and
+        deleting every segment of the feature system, from the feature
+        system's segment distances.
+
+        Returns
+        -------
+        dict
+            Mapping of segment symbols to rows and columns of the cost
+            matrix, 'empty' is mapped to the last row and column
+        list
+            Cost matrix as nested lists, where the cost of aligning
+            segment i of the first sequence with segment j of the second
+            is in row i and column j
+        """
+        indices, distances = self.features.segment_distances(self.underspec_cost)
+        if self._segment_distances is not distances:
+            costs = distances * self.sub_penalty
+            if self.ins_del_basis == 'empty':
+                costs[:, -1] = distances[:, -1] * self.del_penalty
+                costs[-1, :] = distances[-1, :] * self.ins_penalty
+            elif self.ins_del_basis == 'average':
+                costs[:, -1] = self.ins_del_difference * self.del_penalty
+                costs[-1, :] = self.ins_del_difference * self.ins_penalty
+            costs[-1, -1] = 0
+            self._segment_costs = (indices, costs.tolist())
+            self._segment_distances = distances
+        return self._segment_costs
+
+    def alignment_costs(self, seq1, seq2):
+        """
+        Get the costs of every operation for aligning two sequences
+
+        Parameters
+        ----------
+        seq1 : list
+            First sequence of segments
+        seq2 : list
+            Second sequence of segments
+
+        Returns
+        -------
+        list
+            Costs of substituting each segment of seq1 (rows) with each
+            segment of seq2 (columns)
+        list
+            Costs of deleting each segment of seq1
+        list
+            Costs of inserting each segment of seq2
+        """
+        if not self.features_tf:
+            substitutions = [[int(x != y) * self.sub_penalty for y in seq2] for x in seq1]
+            return (substitutions, [self.del_penalty] * len(seq1),
+                    [self.ins_penalty] * len(seq2))
+        indices, costs = self.segment_costs()
+        seq1 = [indices[x if isinstance(x, str) else x.symbol] for x in seq1]
+        seq2 = [indices[y if isinstance(y, str) else y.symbol] for y in seq2]
+        empty = len(costs) - 1
+        substitutions = []
+        deletions = []
+        for x in seq1:
+            row = costs[x]
+            substitutions.append([row[y] for y in seq2])
+            deletions.append(row[empty])
+        insertions = [costs[empty][y] for y in seq2]
+        return substitutions, deletions, insertions
+
+    def fill_matrix(self, seq1, seq2, traceback = False):
+        """
+        Calculate the costs of aligning every prefix of two sequences, using
+        costs looked up from ``alignment_costs``
+
+        Parameters
+        ----------
+        seq1 : list
+            First sequence of segments
+        seq2 : list
+            Second sequence of segments
+        traceback : bool
+            If True, return the full matrix and the directions that each
+            cell can come from, otherwise only the last row is kept
+
+        Returns
+        -------
+        list
+            The matrix of costs, or just its last row if traceback is False
+        list or None
+            Matrix of direction flags (``ABOVELEFT``, ``ABOVE`` and
+            ``LEFT``) if traceback is True
+        """
+        substitutions, deletions, insertions = self.alignment_costs(seq1, seq2)
+        tolerance = self.tolerance
+        previous = [0]
+        for c in insertions:
+            previous.append(previous[-1] + c)
+        if traceback:
+            matrix = [previous]
+            trace = [[0] + [ABOVE] * len(seq2)]
+        for sub_row, deletion in zip(substitutions, deletions):
+            current = [previous[0] + deletion]
+            if traceback:
+                trace_row = [LEFT]
+            for y, insertion in enumerate(insertions):
+                aboveleft = previous[y] + sub_row[y]
+                left = previous[y + 1] + deletion
+                above = current[y] + insertion
+                best = aboveleft
+                if left < best:
+                    best = left
+                if above < best:
+                    best = above
+                current.append(best)
+                if traceback:
+                    flags = 0
+                    if aboveleft - best <= tolerance:
+                        flags |= ABOVELEFT
+                    if above - best <= tolerance:
+                        flags |= ABOVE
+                    if left - best <= tolerance:
+                        flags |= LEFT
+                    trace_row.append(flags)
+            previous = current
+            if traceback:
+                matrix.append(current)
+                trace.append(trace_row)
+        if traceback:
+            return matrix, trace
+        return previous, None
+
+    def distance(self, seq1, seq2):
+        """
+        Get the cost of the best alignment of two sequences
+
+        Parameters
+        ----------
+        seq1 : list
+            First sequence of segments
+        seq2 : list
+            Second sequence of segments
+
+        Returns
+        -------
+        float
+            Cost of the best alignment
+        """
+        last_row, trace = self.fill_matrix(list(seq1), list(seq2))
+        return last_row[-1]
+
+    def trace_alignment(self, seq1, seq2, trace):
+        """
+        Generate an alignment from the matrix of direction flags made by
+        ``fill_matrix``, see ``generate_alignment`` for the format
+        """
+        x = len(seq1)
+        y = len(seq2)
+        current_alignment = []
 
-        for x in range(1, len(seq1)+1):
-            d[x][0]['f'] = d[x-1][0]['f'] + self.compare_segments(seq1[x-1], 'empty', self.underspec_cost)
-            d[x][0]['left'] = 1
+        while x > 0 or y > 0:
+            if trace[x][y] & ABOVELEFT:
+                current_element = {'elem1': seq1[x-1], 'elem2': seq2[y-1], 'dir': 'aboveleft'}
+                x -= 1
+                y -= 1
+            elif trace[x][y] & ABOVE:
+                current_element = {'elem1': None, 'elem2': seq2[y-1], 'dir': 'above'}
+                y -= 1
+            else:
+                current_element = {'elem1': seq1[x-1], 'elem2': None, 'dir': 'left'}
+                x -= 1
+            current_alignment.append(current_element)
+        current_alignment.reverse()
+        return current_alignment
 
-        for y in range(1, len(seq2)+1):
-            d[0][y]['f'] = d[0][y-1]['f'] + self.compare_segments('empty', seq2[y-1], self.underspec_cost)
-            d[0][y]['above'] = 1
 
-        for x in range(1, len(seq1)+1):
-            for y in range(1, len(seq2)+1):
-                aboveleft = (d[x - 1][y - 1]['f'] + self.compare_segments(seq1[x-1], seq2[y-1], self.underspec_cost))
-                left = d[x - 1][y]['f'] + self.compare_segments(seq1[x-1], 'empty', self.underspec_cost)
-                above = d[x][y - 1]['f'] + self.compare_segments('empty', seq2[y-1], self.underspec_cost)
 
-                if compare(aboveleft,above) and compare(aboveleft,left):
-                    d[x][y]['f'] = aboveleft
-                    d[x][y]['aboveleft'] = 1
+    def make_similarity_matrix(self, seq1=None, seq2=None):
 
-                if compare(above,aboveleft) and compare(above,left):
-                    d[x][y]['f'] = above
-                    d[x][y]['above'] = 1
+        seq1 = list(seq1)
+        seq2 = list(seq2)
 
-                if compare(left,aboveleft) and compare(left,above):
-                    d[x][y]['f'] = left
-                    d[x][y]['left'] = 1
+        f, trace = self.fill_matrix(seq1, seq2, traceback = True)
 
-                d[x][y]['f'] = min(aboveleft, above, left)
+        d = [[{'aboveleft': int(bool(t & ABOVELEFT)),
+                'above': int(bool(t & ABOVE)),
+                'left': int(bool(t & LEFT)),
+                'trace': 0,
+                'f': v} for v, t in zip(f_row, trace_row)]
+                for f_row, trace_row in zip(f, trace)]
 
         return d
 
@@ -122,7 +271,7 @@ class Aligner(object):
                     distance = (sum(check_feature_difference('0',
                             sign, underspec_cost) for sign in fs2.features.values()))
                 elif self.ins_del_basis == 'average':
-                    distance = ins_del_difference
+                    distance = self.ins_del_difference
                 return distance * self.ins_penalty
 
             elif segment2 == 'empty':
@@ -131,7 +280,7 @@ class Aligner(object):
                     distance = (sum(check_feature_difference(sign,
                         '0', underspec_cost) for sign in fs1.features.values()))
                 elif self.ins_del_basis == 'average':
-                    distance = ins_del_difference
+                    distance = self.ins_del_difference
                 return distance * self.del_penalty
             else:
                 fs1 = self.features[segment1symbol]
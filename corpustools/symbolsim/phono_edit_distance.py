@@ -2,6 +2,10 @@
 
 from corpustools.symbolsim.phono_align import Aligner
 
+#Aligner for the most recently used feature system, reused so that its
+#segment costs are only looked up once
+_aligner = None
+
 def phono_edit_distance(word1, word2, sequence_type, features):
     """Returns an analogue to Levenshtein edit distance but uses
     phonological features instead of characters
@@ -32,10 +36,9 @@ def phono_edit_distance(word1, word2, sequence_type, features):
     w1 = getattr(word1,sequence_type)
     w2 = getattr(word2,sequence_type)
 
+    global _aligner
+    if _aligner is None or _aligner.features is not features:
+        _aligner = Aligner(features_tf=True, features=features)
 
-    a = Aligner(features_tf=True, features=features)
-
-    m = a.make_similarity_matrix(w1, w2)
-
-    return m[-1][-1]['f']
+    return _aligner.distance(w1, w2)
 
@@ -1,6 +1,7 @@
+import heapq
 from functools import partial
 from corpustools.corpus.classes import Word
-from corpustools.symbolsim.khorsi import khorsi
+from corpustools.symbolsim.khorsi import khorsi, encoded_khorsi, khorsi_upper_bound
 from corpustools.symbolsim.edit_distance import edit_distance
 from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
 
@@ -9,14 +10,15 @@ from corpustools.multiprocessing import score_mp, PCTMultiprocessingError
 from corpustools.exceptions import StringSimilarityError
 
 def khorsi_wrapper(w1, w2, freq_base,sequence_type, max_distance):
-    score = khorsi(w1, w2, freq_base = freq_base, sequence_type = sequence_type)
+    score = khorsi(w1, w2, freq_base = freq_base, sequence_type = sequence_type,
+                    max_distance = max_distance)
     if score >= max_distance:
         return score
     else:
         return None
 
 def edit_distance_wrapper(w1, w2, sequence_type, max_distance):
-    score = edit_distance(w1, w2, sequence_type)
+    score = edit_distance(w1, w2, sequence_type, max_distance)
     if score <= max_distance:
         return score
     else:
@@ -29,6 +31,38 @@ def phono_edit_distance_wrapper(w1, w2, sequence_type, features, max_distance):
     else:
         return None
 
+def most_related(related_data, algorithm, top_k = None):
+    """
+    Sort string similarity results from most to least related.
+
+    Parameters
+    ----------
+    related_data : iterable
+        Results from ``iter_string_similarity``, sequences whose final
+        element is a relatedness score
+    algorithm : string
+        The algorithm of string similarity used, higher scores are more
+        related for 'khorsi' and lower scores are more related otherwise
+    top_k : int or None
+        If specified, only the top_k most related results are returned,
+        keeping at most that many results in memory at once
+
+    Returns
+    -------
+    list
+        The results, most related first
+    """
+    if algorithm == 'khorsi':
+        #Ties are kept in the reverse of the order they were produced in
+        key = lambda x: (x[1][-1], x[0])
+        if top_k is None:
+            return [x for i, x in sorted(enumerate(related_data), key = key, reverse = True)]
+        return [x for i, x in heapq.nlargest(top_k, enumerate(related_data), key = key)]
+    key = lambda x: x[-1]
+    if top_k is None:
+        return sorted(related_data, key = key)
+    return heapq.nsmallest(top_k, related_data, key = key)
+
 def string_similarity(corpus_context, query, algorithm, **kwargs):
     """
     This function computes similarity of pairs of words across a corpus.
@@ -50,6 +84,9 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
         Filters out all words that are higher than max_rel from a relatedness measure
     min_rel: double
         Filters out all words that are lower than min_rel from a relatedness measure
+    top_k: int
+        If specified and the query is a single word, only the top_k words
+        most related to it are returned
     stop_check : callable or None
         Optional function to check whether to gracefully terminate early
     call_back : callable or None
@@ -62,31 +99,67 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
         and the final element is their relatedness score
     """
     stop_check = kwargs.get('stop_check', None)
+    top_k = kwargs.get('top_k', None)
+    related_data = iter_string_similarity(corpus_context, query, algorithm, **kwargs)
+    if isinstance(query, Word):
+        #Sort the list by most morphologically related
+        related_data = most_related(related_data, algorithm, top_k)
+    else:
+        related_data = list(related_data)
+    if stop_check is not None and stop_check():
+        return
+    return related_data
+
+def iter_string_similarity(corpus_context, query, algorithm, **kwargs):
+    """
+    Generate the similarity of pairs of words across a corpus, in the
+    order they are calculated, without keeping them in memory.
+
+    Takes the same arguments as ``string_similarity``, except for top_k.
+
+    Yields
+    ------
+    tuple
+        The two words that were compared and their relatedness score
+    """
+    stop_check = kwargs.get('stop_check', None)
     call_back = kwargs.get('call_back', None)
     min_rel = kwargs.get('min_rel', None)
     max_rel = kwargs.get('max_rel', None)
 
+    #Function to check whether a pair can be skipped without calculating
+    #its relatedness, because it would be filtered out anyway
+    can_prune = None
     if algorithm == 'khorsi':
-        freq_base = corpus_context.get_frequency_base()
-        try:
-            bound_count = freq_base['#']
-            freq_base = {k:v for k,v in freq_base.items() if k != '#'}
-            freq_base['total'] -= bound_count
-        except KeyError:
-            pass
-        relate_func = partial(khorsi, freq_base=freq_base,
-                                sequence_type = corpus_context.sequence_type)
+        #Word boundaries are not counted in the segment frequencies
+        surprisal = corpus_context.get_surprisal(word_boundaries = False)
+        def relate_func(w1, w2, max_distance = None):
+            return encoded_khorsi(corpus_context.encode_sequence(w1),
+                                corpus_context.encode_sequence(w2),
+                                surprisal, max_distance = max_distance)
+        #Scores below min_rel are filtered out when comparing more than one
+        #pair, so the calculation can stop once a score falls below it
+        filtered_func = partial(relate_func, max_distance = min_rel)
+        if min_rel is not None:
+            def can_prune(w1, w2):
+                return khorsi_upper_bound(corpus_context.encode_sequence(w1),
+                                        corpus_context.encode_sequence(w2),
+                                        surprisal) < min_rel
     elif algorithm == 'edit_distance':
         relate_func =  partial(edit_distance,
                                 sequence_type = corpus_context.sequence_type)
+        #Distances above max_rel are filtered out when comparing more than
+        #one pair, so they do not need to be calculated exactly
+        filtered_func = partial(relate_func, max_distance = max_rel)
     elif algorithm == 'phono_edit_distance':
         relate_func = partial(phono_edit_distance,
                                 sequence_type = corpus_context.sequence_type,
                                 features = corpus_context.specifier)
+        filtered_func = relate_func
     else:
         raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
 
-    related_data = []
+    pruned = 0
     if isinstance(query,Word):
         if call_back is not None:
             total = len(corpus_context)
@@ -96,33 +169,43 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
             call_back('Calculating string similarity...')
             call_back(cur,total)
         targ_word = query
-        relate = list()
-        for word in corpus_context:
+        if algorithm == 'edit_distance':
+            #Distances to every word are calculated at once, in batches
+            #of words with the same length
+            buckets = corpus_context.get_length_buckets()
+            distances = buckets.edit_distances(targ_word, max_rel)
+            words = zip(buckets.words, (int(d) for d in distances))
+        elif can_prune is not None:
+            #Only words whose similarity can reach min_rel are compared
+            index = corpus_context.get_surprisal_index(word_boundaries = False)
+            candidates = index.candidates(corpus_context.encode_sequence(targ_word), min_rel)
+            pruned = len(index) - len(candidates)
+            words = ((index.words[i], None) for i in candidates)
+        else:
+            words = ((word, None) for word in corpus_context)
+        for word, relatedness in words:
             if stop_check is not None and stop_check():
                 return
             if call_back is not None:
                 cur += 1
                 if cur % 50 == 0:
                     call_back(cur)
-            relatedness = relate_func(targ_word, word)
+            if relatedness is None:
+                relatedness = filtered_func(targ_word, word)
 
             if min_rel is not None and relatedness < min_rel:
                 continue
             if max_rel is not None and relatedness > max_rel:
                 continue
-            related_data.append( (targ_word,word,relatedness) )
-        #Sort the list by most morphologically related
-        related_data.sort(key=lambda t:t[-1])
-        if related_data[0][1] != targ_word:
-            related_data.reverse()
+            yield (targ_word,word,relatedness)
     elif isinstance(query, tuple):
         w1 = query[0]
         w2 = query[1]
         relatedness = relate_func(w1,w2)
-        related_data.append((w1,w2,relatedness))
+        yield (w1,w2,relatedness)
     elif hasattr(query,'__iter__'):
         if call_back is not None:
-            total = len(query)
+            total = len(query) if hasattr(query, '__len__') else 0
             cur = 0
             call_back('Calculating string similarity...')
             if total:
@@ -136,12 +219,15 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
                     call_back(cur)
             w1 = q1
             w2 = q2
-            relatedness = relate_func(w1,w2)
+            if can_prune is not None and can_prune(w1, w2):
+                pruned += 1
+                continue
+            relatedness = filtered_func(w1,w2)
             if min_rel is not None and relatedness < min_rel:
                 continue
             if max_rel is not None and relatedness > max_rel:
                 continue
-            related_data.append( (w1,w2,relatedness) )
-
-    return related_data
+            yield (w1,w2,relatedness)
+    if can_prune is not None and call_back is not None:
+        call_back('Skipped {} pairs with an upper bound on their similarity'.format(pruned))
 
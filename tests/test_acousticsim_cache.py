@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import numpy as np
+from scipy.io import wavfile
+
+from corpustools.acousticsim.cache import RepresentationCache
+from corpustools.acousticsim.main import acoustic_similarity_mapping
+import corpustools.acousticsim.main as acousticsim_main
+
+def make_wavs(directory, num_files):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    rng = np.random.RandomState(5)
+    sr = 16000
+    paths = []
+    for i in range(num_files):
+        t = np.arange(int(sr * rng.uniform(0.1, 0.2))) / sr
+        signal = np.sin(2 * np.pi * rng.choice([150, 300, 500]) * t) + 0.05 * rng.randn(len(t))
+        path = os.path.join(directory, 'token{}.wav'.format(i))
+        wavfile.write(path, sr, (signal / 2 * 32767).astype(np.int16))
+        paths.append(path)
+    return paths
+
+def test_representation_cache(export_test_dir):
+    cache_dir = os.path.join(export_test_dir, 'rep_cache')
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+    paths = make_wavs(os.path.join(export_test_dir, 'cached_wavs'), 3)
+    calls = []
+    def to_rep(path):
+        calls.append(path)
+        return np.arange(6, dtype = float).reshape(3, 2) * len(calls)
+
+    cache = RepresentationCache(cache_dir)
+    params = {'rep': 'mfcc', 'num_filters': 26}
+    first = cache.load(paths[0], params, to_rep)
+    assert(np.array_equal(cache.load(paths[0], params, to_rep), first))
+    assert(len(calls) == 1)
+
+    #New runs find the same entries, but not for other parameters
+    cache = RepresentationCache(cache_dir)
+    assert(np.array_equal(cache.load(paths[0], params, to_rep), first))
+    assert(len(calls) == 1)
+    cache.load(paths[0], {'rep': 'mfcc', 'num_filters': 20}, to_rep)
+    assert(len(calls) == 2)
+
+    #Only the most recently used entries are kept
+    size = os.path.getsize(cache.entry_path(paths[0], params))
+    for name in os.listdir(cache_dir):
+        os.utime(os.path.join(cache_dir, name), (0, 0))
+    cache = RepresentationCache(cache_dir, max_size = 2 * size)
+    cache.load(paths[1], params, to_rep)
+    cache.load(paths[2], params, to_rep)
+    entries = [x for x in os.listdir(cache_dir) if x.endswith('.npy')]
+    assert(len(entries) == 2)
+    assert(cache.get(paths[0], params) is None)
+    assert(cache.get(paths[2], params) is not None)
+
+def test_mapping_cache(export_test_dir, monkeypatch):
+    cache_dir = os.path.join(export_test_dir, 'mapping_cache')
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+    paths = make_wavs(os.path.join(export_test_dir, 'cached_wavs'), 3)
+    mapping = [(x, y) for x in paths for y in paths if x != y]
+    expected = acoustic_similarity_mapping(mapping, cache = cache_dir)
+
+    #Warm runs do not compute any representations
+    def fail(*args, **kwargs):
+        raise(AssertionError('Representation was computed again'))
+    monkeypatch.setattr(acousticsim_main, 'to_mfcc', fail)
+    assert(acoustic_similarity_mapping(mapping, cache = cache_dir) == expected)
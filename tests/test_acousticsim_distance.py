@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+from scipy.io import wavfile
+
+from corpustools.acousticsim.distance_functions import (dtw_distance, regularDTW,
+                                                    generate_distance_matrix,
+                                                    lb_kim, lb_keogh)
+from corpustools.acousticsim.main import (acoustic_nearest_neighbors,
+                                        acoustic_similarity_mapping)
+
+def reference_dtw(distMat, window = None):
+    sLen, tLen = distMat.shape
+    if window is not None:
+        window = max(window, abs(sLen - tLen))
+    total = np.full((sLen, tLen), np.inf)
+    for i in range(sLen):
+        for j in range(tLen):
+            if window is not None and abs(i - j) > window:
+                continue
+            if i == 0 and j == 0:
+                total[i, j] = distMat[i, j]
+            elif i == 0:
+                total[i, j] = total[i, j-1] + distMat[i, j]
+            elif j == 0:
+                total[i, j] = total[i-1, j] + distMat[i, j]
+            else:
+                total[i, j] = min(total[i-1, j-1] + 2 * distMat[i, j],
+                                total[i-1, j] + distMat[i, j],
+                                total[i, j-1] + distMat[i, j])
+    return total[-1, -1] / (sLen + tLen)
+
+def test_distance_matrix():
+    rng = np.random.RandomState(1)
+    source = rng.rand(7, 4)
+    target = rng.rand(5, 4)
+    distMat = generate_distance_matrix(source, target)
+    for i in range(7):
+        for j in range(5):
+            assert(abs(distMat[i, j] - np.sqrt(np.sum((source[i] - target[j]) ** 2))) < 1e-12)
+
+def test_dtw():
+    rng = np.random.RandomState(2)
+    for sLen, tLen in [(1, 1), (1, 6), (6, 1), (9, 14), (20, 20)]:
+        one = rng.rand(sLen, 8)
+        two = rng.rand(tLen, 8)
+        distMat = generate_distance_matrix(one, two)
+        expected = reference_dtw(distMat)
+        assert(abs(dtw_distance(one, two) - expected) < 1e-12)
+        assert(abs(dtw_distance(one, two, norm = False) - expected * (sLen + tLen)) < 1e-9)
+        for window in [0, 2, 5]:
+            expected = reference_dtw(distMat, window)
+            distance = regularDTW(distMat, window = window)
+            assert(abs(distance - expected) < 1e-12)
+            assert(regularDTW(distMat, window = window, threshold = distance) == distance)
+            assert(regularDTW(distMat, window = window, threshold = distance * 0.9) == np.inf)
+
+def test_dtw_threshold_rounding():
+    rng = np.random.RandomState(4)
+    for i in range(200):
+        distMat = rng.rand(3, 4)
+        distance = regularDTW(distMat)
+        assert(regularDTW(distMat, threshold = distance) == distance)
+        raw = regularDTW(distMat, norm = False)
+        assert(regularDTW(distMat, norm = False, threshold = raw) == raw)
+
+def test_lower_bounds():
+    rng = np.random.RandomState(3)
+    for sLen, tLen in [(1, 1), (1, 6), (6, 1), (9, 14), (20, 20)]:
+        one = rng.rand(sLen, 8)
+        two = rng.rand(tLen, 8)
+        for window in [None, 0, 2, 5]:
+            distance = dtw_distance(one, two, window = window)
+            assert(lb_kim(one, two) <= distance + 1e-12)
+            assert(lb_keogh(one, two, window) <= distance + 1e-12)
+            assert(lb_keogh(two, one, window) <= distance + 1e-12)
+
+def test_nearest_neighbors(export_test_dir):
+    directory = os.path.join(export_test_dir, 'nearest_neighbors')
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    rng = np.random.RandomState(4)
+    sr = 16000
+    paths = []
+    for i in range(8):
+        t = np.arange(int(sr * rng.uniform(0.1, 0.3))) / sr
+        signal = np.sin(2 * np.pi * rng.choice([150, 300, 500]) * t) + 0.05 * rng.randn(len(t))
+        path = os.path.join(directory, 'token{}.wav'.format(i))
+        wavfile.write(path, sr, (signal / 2 * 32767).astype(np.int16))
+        paths.append(path)
+    neighbors, stats = acoustic_nearest_neighbors(paths, num_neighbors = 2,
+                                                output_sim = False)
+    assert(stats['comparisons'] == 8 * 7)
+    assert(stats['lb_kim'] + stats['lb_keogh'] + stats['abandoned'] + stats['dtw'] == 8 * 7)
+    distances = acoustic_similarity_mapping([(x, y) for x in paths for y in paths if x != y],
+                                        output_sim = False)
+    for x in paths:
+        name = os.path.basename(x)
+        expected = sorted((d, y) for (q, y), d in distances.items() if q == name)[:2]
+        assert([y for y, d in neighbors[name]] == [y for d, y in expected])
+        assert(np.allclose([d for y, d in neighbors[name]], [d for d, y in expected]))
@@ -3,7 +3,10 @@
 import sys
 import os
 
-from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.symbolsim.string_similarity import (string_similarity,
+                                                iter_string_similarity)
+from corpustools.symbolsim.edit_distance import (edit_distance,
+                                    banded_edit_distance, bit_parallel_edit_distance)
 from corpustools.contextmanagers import CanonicalVariantContext, MostFrequentVariantContext, WeightedVariantContext
 
 def test_spelling(unspecified_test_corpus):
@@ -95,3 +98,57 @@ def test_transcription(unspecified_test_corpus):
     calced.sort(key=lambda t:t[1])
     for i, v in enumerate(expected):
         assert(calced[i] == v)
+
+
+def test_banded_and_bit_parallel(unspecified_test_corpus):
+    words = list(unspecified_test_corpus)
+    for sequence_type in ['spelling', 'transcription']:
+        for w1 in words:
+            for w2 in words:
+                s1 = getattr(w1, sequence_type)
+                s2 = getattr(w2, sequence_type)
+                expected = edit_distance(w1, w2, sequence_type)
+                if len(s1) <= len(s2):
+                    assert(bit_parallel_edit_distance(s1, s2) == expected)
+                for max_distance in range(4):
+                    result = banded_edit_distance(s1, s2, max_distance)
+                    if expected <= max_distance:
+                        assert(result == expected)
+                    else:
+                        assert(result > max_distance)
+
+def test_length_buckets(unspecified_test_corpus):
+    for sequence_type in ['spelling', 'transcription']:
+        with CanonicalVariantContext(unspecified_test_corpus, sequence_type, 'type') as c:
+            buckets = c.get_length_buckets()
+            for q in unspecified_test_corpus:
+                distances = buckets.edit_distances(q)
+                for w, d in zip(buckets.words, distances):
+                    assert(d == edit_distance(w, q, sequence_type))
+
+def test_top_k_and_iter(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
+        for algorithm in ['edit_distance', 'khorsi']:
+            for q in c:
+                full = string_similarity(c, q, algorithm)
+                for top_k in [1, 3, len(full) + 1]:
+                    calced = string_similarity(c, q, algorithm, top_k = top_k)
+                    assert(calced == full[:top_k])
+                streamed = list(iter_string_similarity(c, q, algorithm))
+                assert(sorted(streamed, key = lambda x: str(x[1])) ==
+                        sorted(full, key = lambda x: str(x[1])))
+
+def test_max_rel_pairs(unspecified_test_corpus):
+    atema = unspecified_test_corpus.find('atema')
+    enuta = unspecified_test_corpus.find('enuta')
+    mashomisi = unspecified_test_corpus.find('mashomisi')
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        #A single pair is never filtered, so its distance is exact
+        calced = string_similarity(c, (atema, enuta), 'edit_distance', max_rel = 2)
+        assert(calced == [(atema, enuta, 4)])
+        calced = string_similarity(c, (atema, mashomisi), 'edit_distance', max_rel = 2)
+        assert(calced == [(atema, mashomisi, 6)])
+
+        calced = string_similarity(c, [(atema, enuta), (atema, atema)],
+                                    'edit_distance', max_rel = 2)
+        assert(calced == [(atema, atema, 0)])
@@ -2,7 +2,8 @@
 import sys
 import os
 
-from corpustools.freqalt.freq_of_alt import calc_freq_of_alt
+from corpustools.freqalt.freq_of_alt import (calc_freq_of_alt, alternation_candidates,
+                                            AlternationScorer)
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                             MostFrequentVariantContext)
 
@@ -58,3 +59,30 @@ def test_freqalt(specified_test_corpus):
 
         result = calc_freq_of_alt(c,'s','ʃ','phono_edit_distance', max_rel = 20, phono_align=False)
         assert(result==(8,6,0.75))
+
+def test_freqalt_candidates(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'token') as c:
+        words = [w for w in c]
+        ids1 = [i for i, w in enumerate(words) if 's' in w.transcription]
+        ids2 = [i for i, w in enumerate(words) if 'ʃ' in w.transcription]
+        for algorithm, min_rel, max_rel in [('khorsi', -15, None), ('khorsi', 5, None),
+                                            ('edit_distance', None, 2),
+                                            ('edit_distance', None, 4),
+                                            ('phono_edit_distance', None, 6)]:
+            if algorithm == 'phono_edit_distance':
+                sequences = [list(w.transcription) for w in words]
+            else:
+                sequences = [c.encode_sequence(w) for w in words]
+            scorer = AlternationScorer(algorithm, sequences,
+                                    [list(w.transcription) for w in words], 's', 'ʃ',
+                                    c.get_surprisal(word_boundaries = False),
+                                    c.specifier, min_rel, max_rel, min_pairs_okay = True)
+            #Blocking never skips a pair that is related enough
+            for i, candidates in alternation_candidates(c, algorithm, ids1, ids2,
+                                            sequences, min_rel, max_rel, c.specifier):
+                expected = scorer.score(i, [j for j in ids2 if j != i])
+                assert(scorer.score(i, candidates) == expected)
+        for num_cores in [-1, 2]:
+            result = calc_freq_of_alt(c,'s','ʃ','khorsi', min_rel = -15,
+                                    phono_align=True, num_cores = num_cores)
+            assert(result==(8,3,0.375))
@@ -4,3 +4,19 @@ from corpustools.gui.klgui import *
 def test_klgui(qtbot, specified_test_corpus, settings):
     dialog = KLDialog(None, settings,specified_test_corpus, True)
     qtbot.addWidget(dialog)
+
+def test_klworker_all_pairs(qtbot, unspecified_test_corpus):
+    worker = KLWorker()
+    results = []
+    errors = []
+    worker.dataReady.connect(results.extend)
+    worker.errorEncountered.connect(errors.append)
+    worker.setParams({'corpus': unspecified_test_corpus,
+                    'context': ContextWidget.canonical_value,
+                    'type_token': 'type', 'sequence_type': 'transcription',
+                    'segment_pairs': [], 'side': 'r', 'all_pairs': True})
+    worker.run()
+    assert(not errors)
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        expected = all_pairs_kl(c, 'r')
+    assert(results == expected)
@@ -1,7 +1,30 @@
 
 
 from corpustools.gui.migui import *
+from corpustools.mutualinfo.mutual_information import pointwise_mi
 
 def test_migui(qtbot, specified_test_corpus, settings):
     dialog = MIDialog(None, settings,specified_test_corpus, True)
     qtbot.addWidget(dialog)
+
+def test_miworker(qtbot, unspecified_test_corpus):
+    worker = MIWorker()
+    results = []
+    errors = []
+    worker.dataReady.connect(results.extend)
+    worker.errorEncountered.connect(errors.append)
+    pairs = [('e', 'm'), ('t', 'ɑ')]
+    for in_word in [False, True]:
+        del results[:]
+        worker.setParams({'corpus': unspecified_test_corpus,
+                        'context': ContextWidget.canonical_value,
+                        'type_token': 'type', 'sequence_type': 'transcription',
+                        'segment_pairs': pairs, 'in_word': in_word,
+                        'halve_edges': True})
+        worker.run()
+        assert(not errors)
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+            expected = [pointwise_mi(c, pair, halve_edges = True, in_word = in_word)
+                        for pair in pairs]
+        assert(len(results) == len(expected))
+        assert(all(abs(r - e) < 1e-12 for r, e in zip(results, expected)))
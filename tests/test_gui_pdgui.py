@@ -1,6 +1,28 @@
 
 from corpustools.gui.pdgui import *
+from corpustools.corpus.classes import EnvironmentFilter
 
 def test_pdgui(qtbot, specified_test_corpus, settings):
     dialog = PDDialog(None, settings,specified_test_corpus, True)
     qtbot.addWidget(dialog)
+
+def test_pdworker(qtbot, specified_test_corpus):
+    worker = PDWorker()
+    results = []
+    errors = []
+    worker.dataReady.connect(results.extend)
+    worker.errorEncountered.connect(errors.append)
+    pairs = [('s', 'ʃ'), ('t', 'n')]
+    envs = [EnvironmentFilter([], None, [['#']]),
+            EnvironmentFilter([], None, [specified_test_corpus.features_to_segments('-voc')]),
+            EnvironmentFilter([], None, [specified_test_corpus.features_to_segments('+voc')])]
+    worker.setParams({'corpus': specified_test_corpus,
+                    'context': ContextWidget.canonical_value,
+                    'type_token': 'type', 'sequence_type': 'transcription',
+                    'segment_pairs': pairs, 'envs': envs, 'strict': True,
+                    'num_cores': -1})
+    worker.run()
+    assert(not errors)
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        expected = calc_prod_pairs(c, pairs, envs, all_info = True)
+    assert(results == expected)
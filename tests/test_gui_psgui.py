@@ -1,7 +1,76 @@
 
 
 from corpustools.gui.psgui import *
+from corpustools.phonosearch import phonological_search
+from corpustools.gui.main import MainWindow
+from corpustools.gui.models import CorpusModel
+
+class MessagingApp(QWidget):
+    messageFromOtherInstance = Signal(object)
 
 def test_psgui(qtbot, specified_test_corpus, settings):
     dialog = PhonoSearchDialog(None, settings, specified_test_corpus, True)
     qtbot.addWidget(dialog)
+
+def test_psworker(qtbot, specified_test_corpus):
+    worker = PSWorker()
+    worker.batch_size = 2
+    batches = []
+    results = []
+    errors = []
+    worker.resultsFound.connect(batches.append)
+    worker.dataReady.connect(results.extend)
+    worker.errorEncountered.connect(errors.append)
+    envs = [EnvironmentFilter(specified_test_corpus.features_to_segments('+voc'))]
+    worker.setParams({'corpus': specified_test_corpus, 'envs': envs,
+                    'sequence_type': 'transcription'})
+    worker.run()
+    assert(not errors)
+    assert(len(batches) > 1)
+    assert(all(len(b) <= 2 for b in batches))
+    assert([r for b in batches for r in b] == results)
+    assert(len(results) == len(phonological_search(specified_test_corpus, envs)))
+
+def test_ps_results_shown_as_found(qtbot, monkeypatch, specified_test_corpus, settings):
+    window = MainWindow(MessagingApp())
+    qtbot.addWidget(window)
+    window.corpusModel = CorpusModel(specified_test_corpus, settings)
+    envs = [EnvironmentFilter(specified_test_corpus.features_to_segments('+voc'))]
+    counts = []
+    stop = []
+
+    def exec_(dialog):
+        qtbot.addWidget(dialog)
+        dialog.generateKwargs = lambda: {'corpus': specified_test_corpus,
+                                        'envs': envs,
+                                        'sequence_type': 'transcription'}
+        #The search is run in this thread, and the progress dialog is
+        #never shown
+        dialog.thread.start = dialog.thread.run
+        dialog.progressDialog.exec_ = lambda: True
+        dialog.thread.updateProgress.disconnect()
+        dialog.thread.batch_size = 2
+        #Words in the results table after each batch is found
+        dialog.thread.resultsFound.connect(
+                lambda batch: counts.append(len(window.PhonoSearchWindow.table.model().allData)))
+        dialog.thread.resultsFound.connect(
+                lambda batch: dialog.thread.stop() if stop else None)
+        dialog.newTable()
+        return True
+
+    monkeypatch.setattr(PhonoSearchDialog, 'exec_', exec_)
+    window.phonoSearch()
+    first = window.PhonoSearchWindow
+    expected = set(first.dialog.resultRows(phonological_search(specified_test_corpus, envs)))
+    assert(len(counts) > 1)
+    assert(counts[0] < counts[-1])
+    assert(first.table.model().allData == expected)
+
+    #Cancelled searches leave the table as it was
+    stop.append(True)
+    first.dialog.oldTable()
+    assert(first.table.model().allData == expected)
+    first.dialog.newTable()
+    assert(first.table.model().allData == expected)
+    window.phonoSearch()
+    assert(window.PhonoSearchWindow is first)
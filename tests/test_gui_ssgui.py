@@ -3,6 +3,10 @@
 from corpustools.gui.ssgui import *
 
 from corpustools.gui.models import CorpusModel
+from corpustools.gui.main import MainWindow
+
+class MessagingApp(QWidget):
+    messageFromOtherInstance = Signal(object)
 
 def test_ssgui(qtbot, specified_test_corpus, settings):
     dialog = SSDialog(None, settings, CorpusModel(specified_test_corpus, settings), True)
@@ -27,6 +31,16 @@ def test_ssgui(qtbot, specified_test_corpus, settings):
     assert(kwargs['query'].spelling == 'atema')
     assert(kwargs['min_rel'] is None)
     assert(kwargs['max_rel'] is None)
+    assert(kwargs['top_k'] is None)
+
+    dialog.topEdit.setText('5')
+    kwargs = dialog.generateKwargs()
+    assert(kwargs['top_k'] == 5)
+
+    dialog.addResults([(kwargs['query'], specified_test_corpus.find('mata'), 2),
+                        (kwargs['query'], kwargs['query'], 0)])
+    dialog.setResults(None)
+    assert([r[-1] for r in dialog.results] == [0, 2])
 
     dialog.algorithmWidget.click(2)
     assert(dialog.algorithmWidget.value() == 'khorsi')
@@ -57,3 +71,55 @@ def test_ssgui(qtbot, specified_test_corpus, settings):
     assert(kwargs['min_rel'] is None)
     assert(kwargs['max_rel'] is None)
 
+
+def test_ss_results_shown_as_calculated(qtbot, monkeypatch, specified_test_corpus, settings):
+    window = MainWindow(MessagingApp())
+    qtbot.addWidget(window)
+    window.corpusModel = CorpusModel(specified_test_corpus, settings)
+    counts = []
+    stop = []
+
+    def exec_(dialog):
+        qtbot.addWidget(dialog)
+        dialog.oneWordRadio.clicked.emit()
+        dialog.algorithmWidget.click(0)
+        dialog.oneWordEdit.setText('atema')
+        #The calculation is run in this thread, and the progress dialog
+        #is never shown
+        dialog.thread.start = dialog.thread.run
+        dialog.progressDialog.exec_ = lambda: True
+        dialog.thread.updateProgress.disconnect()
+        dialog.thread.batch_size = 2
+        #Rows in the results table after each batch is calculated
+        dialog.thread.dataAdded.connect(
+                lambda batch: counts.append(window.SSWindow.table.model().rowCount()))
+        dialog.thread.dataAdded.connect(
+                lambda batch: dialog.thread.stop() if stop else None)
+        dialog.newTable()
+        return True
+
+    monkeypatch.setattr(SSDialog, 'exec_', exec_)
+    window.stringSim()
+    total = len(specified_test_corpus)
+    assert(len(counts) > 1)
+    assert(counts == [min(2 * (i + 1), total) for i in range(len(counts))])
+    first = window.SSWindow
+    dialog = first.dialog
+    rows = list(first.table.model().rows)
+    assert(rows == dialog.results)
+    assert([r[-1] for r in rows] == sorted(r[-1] for r in rows))
+
+    dialog.oldTable()
+    assert(window.SSWindow.table.model().rows == rows + rows)
+
+    #Cancelled calculations leave the table as it was
+    stop.append(True)
+    del counts[:]
+    dialog.oldTable()
+    assert(counts == [2 * len(rows) + 2])
+    assert(window.SSWindow.table.model().rows == rows + rows)
+    dialog.newTable()
+    assert(window.SSWindow.table.model().rows == rows + rows)
+    window.stringSim()
+    assert(window.SSWindow is first)
+    assert(window.SSWindow.table.model().rows == rows + rows)
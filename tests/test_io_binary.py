@@ -11,6 +11,19 @@ def test_save(export_test_dir, unspecified_test_corpus):
 
     assert(unspecified_test_corpus == c)
 
+def test_save_feature_distances(export_test_dir, spe_specifier):
+    save_path = os.path.join(export_test_dir, 'testsave.feature')
+    save_binary(spe_specifier, save_path)
+
+    fm = load_binary(save_path)
+
+    for underspec_cost in [0.25, 1]:
+        assert(underspec_cost in fm._segment_distances)
+        indices, distances = fm.segment_distances(underspec_cost)
+        expected_indices, expected_distances = spe_specifier.segment_distances(underspec_cost)
+        assert(indices == expected_indices)
+        assert((distances == expected_distances).all())
+
 
 #class BinaryCorpusLoadTest(unittest.TestCase):
     #def setUp(self):
@@ -3,7 +3,7 @@ import unittest
 import sys
 import os
 
-from corpustools.symbolsim.khorsi import lcs
+from corpustools.symbolsim.khorsi import lcs, khorsi, encoded_khorsi
 from corpustools.symbolsim.string_similarity import string_similarity
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
@@ -159,6 +159,17 @@ def test_lcs_transcription(unspecified_test_corpus):
         calced = (calced[0],sorted(calced[1]))
         assert(calced == (v[2],sorted(v[3])))
 
+def test_encoded_khorsi(unspecified_test_corpus):
+    for sequence_type in ['spelling', 'transcription']:
+        with CanonicalVariantContext(unspecified_test_corpus, sequence_type, 'token') as c:
+            freq_base = c.get_frequency_base()
+            surprisal = c.get_surprisal()
+            for w1 in c:
+                for w2 in c:
+                    expected = khorsi(w1, w2, freq_base, sequence_type)
+                    calced = encoded_khorsi(c.encode_sequence(w1),
+                                            c.encode_sequence(w2), surprisal)
+                    assert(calced == expected)
 
 def test_mass_relate_spelling_type(unspecified_test_corpus):
     expected = [(unspecified_test_corpus.find('atema'),unspecified_test_corpus.find('atema'),11.0766887),
@@ -339,3 +350,32 @@ def test_mass_relate_transcription_token(unspecified_test_corpus):
         calced = string_similarity(c,unspecified_test_corpus.find('sasi'),'khorsi')
     for i, v in enumerate(expected):
         assert(abs(calced[i][2] - v[2]) < 0.0001)
+
+def test_min_rel_pruning(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for min_rel in [-15, -10, -5]:
+            for q in c:
+                messages = []
+                def call_back(*args):
+                    if isinstance(args[0], str):
+                        messages.append(args[0])
+                full = string_similarity(c, q, 'khorsi')
+                expected = [x for x in full if x[2] >= min_rel]
+                calced = string_similarity(c, q, 'khorsi', min_rel = min_rel,
+                                            call_back = call_back)
+                assert(calced == expected)
+                assert(messages[-1].startswith('Skipped'))
+
+def test_min_rel_pairs(unspecified_test_corpus):
+    atema = unspecified_test_corpus.find('atema')
+    enuta = unspecified_test_corpus.find('enuta')
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        expected = string_similarity(c, (atema, enuta), 'khorsi')
+        assert(abs(expected[0][2] - (-13.357)) < 0.001)
+        #A single pair is never filtered, so its score is exact
+        calced = string_similarity(c, (atema, enuta), 'khorsi', min_rel = -5)
+        assert(calced == expected)
+
+        calced = string_similarity(c, [(atema, enuta), (atema, atema)],
+                                    'khorsi', min_rel = -5)
+        assert([x[:2] for x in calced] == [(atema, atema)])
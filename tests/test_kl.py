@@ -2,7 +2,7 @@ import pytest
 import sys
 import os
 
-from corpustools.kl.kl import KullbackLeibler as KL
+from corpustools.kl.kl import KullbackLeibler as KL, all_pairs_kl
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
                                         WeightedVariantContext)
@@ -48,3 +48,20 @@ def test_error(specified_test_corpus):
             KL(c, 's', '!','')
 
 
+
+def test_all_pairs(specified_test_corpus):
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(specified_test_corpus, 'transcription', type_or_token) as c:
+            for side in ['r', 'l', 'b']:
+                results = all_pairs_kl(c, side)
+                segments = set(s.symbol for s in c.inventory) - set(['#'])
+                assert(len(results) == len(segments) * (len(segments) - 1) / 2)
+                assert([r[4] for r in results] == sorted((r[4] for r in results), reverse = True))
+                for seg1, seg2, seg1_entropy, seg2_entropy, distance, ur, is_spurious in results:
+                    expected = KL(c, seg1, seg2, side)
+                    assert(abs(seg1_entropy - expected[0]) < 1e-9)
+                    assert(abs(seg2_entropy - expected[1]) < 1e-9)
+                    assert(abs(distance - expected[2]) < 1e-9)
+                    if abs(seg1_entropy - seg2_entropy) > 1e-9:
+                        assert([ur] == expected[3])
+                        assert(is_spurious == expected[4])
@@ -478,3 +478,44 @@ def test_redundant_features(specified_test_corpus):
 
     assert('round' in r)
 
+
+def test_suffix_array(unspecified_test_corpus, export_test_dir):
+    path = os.path.join(export_test_dir, 'suffix_array.npz')
+    if os.path.exists(path):
+        os.remove(path)
+    index = unspecified_test_corpus.get_suffix_array('transcription', path)
+    assert(os.path.exists(path))
+    for sequence in [['ɑ'], ['t', 'ɑ'], ['#', 'm'], ['i', '#'], ['ʃ', 'o', 'm'], ['x'], ['t', '#', 'm']]:
+        expected = []
+        count = 0
+        weighted = 0
+        for w in unspecified_test_corpus:
+            bounded = ['#'] + list(w.transcription) + ['#']
+            k = sum(1 for i in range(len(bounded) - len(sequence) + 1)
+                    if bounded[i:i + len(sequence)] == sequence)
+            if k:
+                expected.append(w)
+            count += k
+            weighted += k * w.frequency
+        assert([index.words[i] for i in index.word_ids(sequence)] == expected)
+        assert(index.count(sequence) == count)
+        assert(index.count(sequence, weighted = True) == weighted)
+
+    bigrams = {}
+    for w in unspecified_test_corpus:
+        segs = list(w.transcription)
+        for i in range(len(segs) - 1):
+            bigrams[tuple(segs[i:i + 2])] = bigrams.get(tuple(segs[i:i + 2]), 0) + 1
+    assert(index.substring_counts(2) == bigrams)
+
+    unspecified_test_corpus._indexes = {}
+    loaded = unspecified_test_corpus.get_suffix_array('transcription', path)
+    assert((loaded.suffixes == index.suffixes).all())
+    assert((loaded.lcp == index.lcp).all())
+
+    #The saved suffix array no longer matches once words are added
+    before = loaded.count(['t', 'ɑ'])
+    unspecified_test_corpus.add_word(Word(spelling = 'tata', transcription = ['t', 'ɑ', 't', 'ɑ'],
+                                        frequency = 1.0))
+    index = unspecified_test_corpus.get_suffix_array('transcription', path)
+    assert(index.count(['t', 'ɑ']) == before + 2)
@@ -2,7 +2,12 @@
 import sys
 import os
 
-from corpustools.mutualinfo.mutual_information import pointwise_mi, all_mis
+import math
+
+import pytest
+
+from corpustools.mutualinfo.mutual_information import pointwise_mi, all_mis, mi_matrix
+from corpustools.exceptions import MutualInfoError
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
                                         WeightedVariantContext)
@@ -28,3 +33,68 @@ def test_pointwise_mi(unspecified_test_corpus):
     #with CanonicalVariantContext(unspecified_test_corpus, 'spelling', 'type') as c:
     #   result = pointwise_mi(c, query = ('t', 'a'))
     #   assert(result == 0)
+
+def test_mi_matrix(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for halve_edges in [False, True]:
+            matrix = mi_matrix(c, halve_edges = halve_edges)
+            assert(set(matrix.segments) == set(s.symbol for s in c.inventory))
+            expected = []
+            for s1 in matrix.segments:
+                for s2 in matrix.segments:
+                    try:
+                        mi = pointwise_mi(c, (s1, s2), halve_edges = halve_edges)
+                    except MutualInfoError:
+                        with pytest.raises(MutualInfoError):
+                            matrix[(s1, s2)]
+                        continue
+                    assert(abs(matrix[(s1, s2)] - mi) < 1e-12)
+                    expected.append(((s1, s2), mi))
+            result = all_mis(c, halve_edges = halve_edges)
+            assert(len(result) == len(expected))
+            assert([float(mi) for pair, mi in result] == sorted(float(mi) for pair, mi in result))
+            for pair, mi in result:
+                assert(abs(float(mi) - dict(expected)[pair]) < 1e-12)
+        with pytest.raises(MutualInfoError):
+            matrix[('x', 't')]
+
+def test_in_word_mi_matrix(unspecified_test_corpus):
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', type_or_token) as c:
+            words = list(c)
+            def frequency(segments):
+                return sum(w.frequency for w in words
+                        if all(s in w.transcription for s in segments)) / len(words)
+            matrix = mi_matrix(c, in_word = True)
+            assert('#' not in matrix.segments)
+            for s1 in matrix.segments:
+                for s2 in matrix.segments:
+                    bigram = frequency((s1, s2))
+                    if bigram == 0:
+                        with pytest.raises(MutualInfoError):
+                            matrix[(s1, s2)]
+                        with pytest.raises(MutualInfoError):
+                            pointwise_mi(c, (s1, s2), in_word = True)
+                        continue
+                    expected = math.log(bigram / (frequency((s1,)) * frequency((s2,))), 2)
+                    assert(abs(matrix[(s1, s2)] - expected) < 1e-12)
+                    assert(abs(pointwise_mi(c, (s1, s2), in_word = True) - expected) < 1e-12)
+            assert(len(all_mis(c, in_word = True)) == len(matrix.pairs()))
+
+def test_mi_matrix_stop_check(unspecified_test_corpus):
+    for in_word in [False, True]:
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+            assert(mi_matrix(c, in_word = in_word, stop_check = lambda: True) is None)
+            assert(all_mis(c, in_word = in_word, stop_check = lambda: True) is None)
+            #Counts are not kept from a stopped calculation
+            matrix = mi_matrix(c, in_word = in_word)
+            assert(matrix.pairs() == mi_matrix(c, in_word = in_word).pairs())
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        calls = []
+        def stop_check():
+            calls.append(None)
+            return len(calls) > 5
+        assert(mi_matrix(c, stop_check = stop_check) is None)
+        expected = all_mis(c)
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        assert(all_mis(c) == expected)
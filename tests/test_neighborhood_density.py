@@ -4,8 +4,16 @@ import os
 
 from corpustools.corpus.classes import Word
 
+from corpustools.corpus.classes.lexicon import Attribute
 from corpustools.neighdens.neighborhood_density import (neighborhood_density,
-                                                        find_mutation_minpairs)
+                                                        neighborhood_density_all_words,
+                                                        find_mutation_minpairs,
+                                                        find_mutation_minpairs_all_words)
+from corpustools.neighdens.neighbor_graph import NeighborGraph, SUBSTITUTION
+from corpustools.symbolsim.edit_distance import edit_distance
+from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
+from corpustools.symbolsim.khorsi import khorsi
+from corpustools.symbolsim.phono_align import Aligner
 
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
@@ -28,6 +36,142 @@ def test_basic_corpus_nd(specified_test_corpus):
                     'max_distance':1})
         assert(abs(result[0]-1.0) < 0.0001)
 
+def test_deletion_index_nd(specified_test_corpus):
+    for sequence_type in ['transcription', 'spelling']:
+        with CanonicalVariantContext(specified_test_corpus, sequence_type, 'type') as c:
+            for max_distance in [0, 1, 2]:
+                for q in specified_test_corpus:
+                    expected = set(w for w in c
+                            if edit_distance(w, q, sequence_type) <= max_distance)
+                    expected -= set([q])
+                    result = neighborhood_density(c, q, max_distance = max_distance)
+                    assert(result[0] == len(expected))
+                    assert(result[1] == expected)
+
+def test_bk_tree_nd(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        for max_distance in [1, 3, 6.5, 12]:
+            for q in specified_test_corpus:
+                expected = set(w for w in c
+                        if phono_edit_distance(w, q, 'transcription',
+                                specified_test_corpus.specifier) <= max_distance)
+                expected -= set([q])
+                result = neighborhood_density(c, q, algorithm = 'phono_edit_distance',
+                                                max_distance = max_distance)
+                assert(result[0] == len(expected))
+                assert(result[1] == expected)
+
+def test_khorsi_nd(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        freq_base = c.get_frequency_base()
+        for max_distance in [-15, -5, 0, 5]:
+            for q in specified_test_corpus:
+                messages = []
+                def call_back(*args):
+                    if isinstance(args[0], str):
+                        messages.append(args[0])
+                expected = set(w for w in c
+                        if khorsi(w, q, freq_base, 'transcription') >= max_distance)
+                expected -= set([q])
+                result = neighborhood_density(c, q, algorithm = 'khorsi',
+                                                max_distance = max_distance,
+                                                call_back = call_back)
+                assert(result[0] == len(expected))
+                assert(result[1] == expected)
+                assert(messages[-1].startswith('Skipped'))
+
+def test_neighbor_graph(specified_test_corpus, export_test_dir):
+    calls = [('edit_distance', 1), ('edit_distance', 4),
+            ('phono_edit_distance', 3), ('khorsi', -5)]
+    for algorithm, max_distance in calls:
+        attribute = Attribute('neighbors', 'numeric')
+        with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type',
+                                    attribute) as c:
+            neighborhood_density_all_words(c, algorithm = algorithm,
+                                            max_distance = max_distance)
+            graph = c.get_neighbor_graph(algorithm, max_distance)
+            for i, w in enumerate(graph.words):
+                expected = neighborhood_density(c, w, algorithm = algorithm,
+                                                max_distance = max_distance)
+                assert(getattr(w.original, 'neighbors') == expected[0])
+                assert(set(graph.words[j] for j in graph.neighbors(i)) == expected[1])
+            path = os.path.join(export_test_dir, 'graph.npz')
+            graph.save(path, c)
+            loaded = NeighborGraph.load(path, c)
+            assert((loaded.indptr == graph.indptr).all())
+            assert((loaded.indices == graph.indices).all())
+            assert((loaded.edits == graph.edits).all())
+            assert(loaded.segments == graph.segments)
+
+def test_neighbor_graph_path(specified_test_corpus, export_test_dir):
+    path = os.path.join(export_test_dir, 'graph_cache.npz')
+    if os.path.exists(path):
+        os.remove(path)
+    attribute = Attribute('neighbors', 'numeric')
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type',
+                                attribute) as c:
+        neighborhood_density_all_words(c, graph_path = path)
+        graph = c.get_neighbor_graph()
+    assert(os.path.exists(path))
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        loaded = c.get_neighbor_graph(path = path)
+        assert((loaded.indices == graph.indices).all())
+        assert((loaded.operations == graph.operations).all())
+    #A graph saved for another maximum distance is made again
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        other = c.get_neighbor_graph(max_distance = 2, path = path)
+        assert(other.max_distance == 2)
+        assert(len(other.indices) > len(graph.indices))
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        assert(NeighborGraph.load(path, c).max_distance == 2)
+
+def test_neighbor_graph_measures(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        graph = c.get_neighbor_graph('edit_distance', 2)
+        for seg1, seg2 in [('m', 'n'), ('ɑ', 'i'), ('s', 'ʃ')]:
+            expected = [(i, j) for i, w1 in enumerate(graph.words)
+                        for j, w2 in enumerate(graph.words)
+                        if len(w1.transcription) == len(w2.transcription) and
+                        [(x, y) for x, y in zip(w1.transcription, w2.transcription)
+                            if x != y] == [(seg1, seg2)]]
+            assert(sorted(graph.minimal_pairs(seg1, seg2)) == expected)
+        neighbors = [set(graph.neighbors(i).tolist()) for i in range(len(graph))]
+        frequencies = graph.weighted_degrees()
+        coefficients = graph.clustering_coefficients()
+        for i in range(len(graph)):
+            assert(frequencies[i] == sum(graph.words[j].frequency for j in neighbors[i]))
+            pairs = [(j, k) for j in neighbors[i] for k in neighbors[i] if j < k]
+            if pairs:
+                linked = [(j, k) for j, k in pairs if k in neighbors[j]]
+                assert(abs(coefficients[i] - len(linked) / len(pairs)) < 1e-9)
+            else:
+                assert(coefficients[i] == 0)
+
+def test_mutation_minpairs_all_words(specified_test_corpus):
+    attribute = Attribute('minpairs', 'numeric')
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type',
+                                attribute) as c:
+        find_mutation_minpairs_all_words(c)
+        for w in c:
+            assert(getattr(w.original, 'minpairs') == find_mutation_minpairs(c, w)[0])
+
+def test_substitution_index_minpairs(specified_test_corpus):
+    al = Aligner(features_tf=False, ins_penalty=float('inf'),
+                del_penalty=float('inf'), sub_penalty=1)
+    queries = list(specified_test_corpus) + [
+                Word(**{'transcription': ['s', 'ɑ', 't', 'ɑ'], 'spelling': 'sata'}),
+                Word(**{'transcription': ['x', 'ɑ', 't'], 'spelling': 'xat'})]
+    for sequence_type in ['transcription', 'spelling']:
+        with CanonicalVariantContext(specified_test_corpus, sequence_type, 'type') as c:
+            for q in queries:
+                seq = getattr(q, sequence_type)
+                expected = set(str(getattr(w, sequence_type)) for w in c
+                        if abs(len(getattr(w, sequence_type)) - len(seq)) <= 1 and
+                        al.make_similarity_matrix(seq, getattr(w, sequence_type))[-1][-1]['f'] == 1)
+                expected -= set([str(seq)])
+                result = find_mutation_minpairs(c, q)
+                assert(result[0] == len(expected))
+                assert(set(result[1]) == expected)
 
 def test_basic_corpus_mutation_minpairs(specified_test_corpus):
     calls = [({'query':Word(**{'transcription': ['s', 'ɑ', 't', 'ɑ']}),
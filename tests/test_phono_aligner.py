@@ -1 +1,44 @@
 
+from corpustools.symbolsim.phono_align import Aligner
+
+def reference_distance(aligner, seq1, seq2):
+    def compare(segment1, segment2):
+        return aligner.compare_segments(segment1, segment2, aligner.underspec_cost)
+    d = [[0] * (len(seq2) + 1) for x in range(len(seq1) + 1)]
+    for x in range(1, len(seq1) + 1):
+        d[x][0] = d[x-1][0] + compare(seq1[x-1], 'empty')
+    for y in range(1, len(seq2) + 1):
+        d[0][y] = d[0][y-1] + compare('empty', seq2[y-1])
+    for x in range(1, len(seq1) + 1):
+        for y in range(1, len(seq2) + 1):
+            d[x][y] = min(d[x-1][y-1] + compare(seq1[x-1], seq2[y-1]),
+                        d[x-1][y] + compare(seq1[x-1], 'empty'),
+                        d[x][y-1] + compare('empty', seq2[y-1]))
+    return d[-1][-1]
+
+def test_segment_costs(specified_test_corpus):
+    specifier = specified_test_corpus.specifier
+    aligner = Aligner(features_tf = True, features = specifier, ins_penalty = 2)
+    indices, costs = aligner.segment_costs()
+    segments = [s for s in specifier.segments if s != '#']
+    for s1 in segments:
+        for s2 in segments + ['empty']:
+            assert(costs[indices[s1]][indices[s2]] ==
+                    aligner.compare_segments(s1, s2))
+            assert(costs[indices[s2]][indices[s1]] ==
+                    aligner.compare_segments(s2, s1))
+
+def test_distance(specified_test_corpus):
+    specifier = specified_test_corpus.specifier
+    aligners = [Aligner(features_tf = True, features = specifier),
+                Aligner(features_tf = True, features = specifier,
+                        underspec_cost = 0.5, sub_penalty = 2),
+                Aligner(features_tf = False)]
+    for aligner in aligners:
+        for w1 in specified_test_corpus:
+            for w2 in specified_test_corpus:
+                seq1 = list(w1.transcription)
+                seq2 = list(w2.transcription)
+                expected = reference_distance(aligner, seq1, seq2)
+                assert(aligner.distance(seq1, seq2) == expected)
+                assert(aligner.make_similarity_matrix(seq1, seq2)[-1][-1]['f'] == expected)
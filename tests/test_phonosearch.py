@@ -2,8 +2,8 @@
 import sys
 import os
 
-from corpustools.phonosearch import phonological_search
-from corpustools.corpus.classes import EnvironmentFilter, Environment
+from corpustools.phonosearch import phonological_search, count_phonological_search
+from corpustools.corpus.classes import EnvironmentFilter, Environment, Word
 
 def test_non_minimal_pair_corpus_minpair(unspecified_test_corpus):
     envs = [EnvironmentFilter(['n'],['#'])]
@@ -15,3 +15,49 @@ def test_non_minimal_pair_corpus_minpair(unspecified_test_corpus):
     print(expected_e.middle, expected_e.position, expected_e.lhs, expected_e.rhs)
     assert(e == expected_e)
 
+
+def reference_search(corpus, envs, sequence_type = 'transcription'):
+    results = []
+    for word in corpus:
+        founds = []
+        for env in envs:
+            es = getattr(word, sequence_type).find(env)
+            if es is not None:
+                founds.extend(es)
+        if founds:
+            results.append((word, founds))
+    return results
+
+def as_tuples(results):
+    return [(w.spelling, [(e.middle, e.position, e.lhs, e.rhs) for e in founds])
+            for w, founds in results]
+
+def test_indexed_search(specified_test_corpus):
+    vowels = specified_test_corpus.features_to_segments('+voc')
+    consonants = specified_test_corpus.features_to_segments('-voc')
+    env_lists = [[EnvironmentFilter(['n'], ['#'])],
+                [EnvironmentFilter(['ɑ'], None, ['#'])],
+                [EnvironmentFilter(['t', 'm'], [vowels], [vowels])],
+                [EnvironmentFilter(vowels, [consonants, vowels]),
+                EnvironmentFilter(['ɑ', 'i'], None, [['#']]),
+                EnvironmentFilter(['s'])],
+                [EnvironmentFilter(['i'], [['#', 's']], [['#', 'm']])],
+                [EnvironmentFilter(['x'])]]
+    for envs in env_lists:
+        expected = reference_search(specified_test_corpus, envs)
+        results = phonological_search(specified_test_corpus, envs)
+        assert(as_tuples(results) == as_tuples(expected))
+        assert(count_phonological_search(specified_test_corpus, envs) == len(expected))
+        assert(as_tuples(phonological_search(specified_test_corpus, envs,
+                                start = 1, limit = 2)) == as_tuples(expected[1:3]))
+
+def test_search_after_adding_words(unspecified_test_corpus):
+    envs = [EnvironmentFilter(['n'], ['#'])]
+    assert(count_phonological_search(unspecified_test_corpus, envs) == 1)
+    unspecified_test_corpus.add_word(Word(spelling = 'nata',
+                                        transcription = ['n', 'ɑ', 't', 'ɑ'],
+                                        frequency = 1.0))
+    results = phonological_search(unspecified_test_corpus, envs)
+    assert(len(results) == 2)
+    assert('nata' in [w.spelling for w, founds in results])
+    assert(count_phonological_search(unspecified_test_corpus, envs) == 2)
@@ -3,7 +3,14 @@ import unittest
 import sys
 import os
 
-from corpustools.phonoprob.phonotactic_probability import phonotactic_probability_vitevitch
+import pytest
+
+from corpustools.corpus.classes import Word
+from corpustools.corpus.classes.lexicon import Attribute
+from corpustools.phonoprob.phonotactic_probability import (phonotactic_probability_vitevitch,
+                                                    phonotactic_probability_all_words,
+                                                    iter_phonotactic_probability)
+from corpustools.exceptions import PhonoProbError
 from corpustools.contextmanagers import CanonicalVariantContext, MostFrequentVariantContext, WeightedVariantContext
 
 def test_basic_corpus_probs(unspecified_test_corpus):
@@ -87,6 +94,70 @@ def test_basic_phonoprob(unspecified_test_corpus):
             res = phonotactic_probability_vitevitch(c, unspecified_test_corpus.find(k), 'bigram')
         assert(abs(v - res) < 0.0001)
 
+def reference_vitevitch(corpus_context, query, gramsize):
+    prob_dict = corpus_context.get_phone_probs(gramsize = gramsize)
+    sequence = zip(*[getattr(query, corpus_context.sequence_type)[i:] for i in range(gramsize)])
+    totprob = 0
+    tot = 0
+    for i,s in enumerate(sequence):
+        totprob += prob_dict[s,i]
+        tot += 1
+    if tot:
+        totprob = totprob / tot
+    return totprob
+
+def test_all_words_phonoprob(unspecified_test_corpus):
+    for type_token in ['type', 'token']:
+        for probability_type, gramsize in [('unigram', 1), ('bigram', 2)]:
+            attribute = Attribute('phonoprob', 'numeric')
+            with CanonicalVariantContext(unspecified_test_corpus, 'transcription',
+                                        type_token, attribute) as c:
+                phonotactic_probability_all_words(c, 'vitevitch',
+                                        probability_type = probability_type)
+                for w in c:
+                    expected = reference_vitevitch(c, w, gramsize)
+                    res = phonotactic_probability_vitevitch(c, w, probability_type)
+                    assert(abs(res - expected) < 1e-12)
+                    assert(getattr(w.original, 'phonoprob') == res)
+
+def test_phonoprob_not_found(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
+        with pytest.raises(PhonoProbError) as e:
+            phonotactic_probability_vitevitch(c,
+                    Word(**{'transcription': ['t', 'x', 'ɑ']}), 'unigram')
+        assert(str(e.value) == 'Segments not found in the corpus: x')
+        with pytest.raises(PhonoProbError) as e:
+            phonotactic_probability_vitevitch(c,
+                    Word(**{'transcription': ['t', 'ɑ', 'ɑ']}),
+                    'unigram')
+        assert(str(e.value) == 'Segments not found in the corpus: ɑ at position: 2')
+        assert(phonotactic_probability_vitevitch(c,
+                    Word(**{'transcription': ['t']}), 'bigram') == 0)
+
+def test_iter_phonoprob(unspecified_test_corpus):
+    queries = [w.transcription for w in unspecified_test_corpus] + [
+                ['t', 'x', 'ɑ', 'y'], ['t', 'ɑ', 'ɑ', 'ɑ'], ['m', 'ɑ', 't'], ['t'], []]
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
+        for probability_type in ['unigram', 'bigram']:
+            expected = []
+            for q in queries:
+                try:
+                    expected.append(phonotactic_probability_vitevitch(c,
+                                    Word(**{'transcription': q}), probability_type))
+                except PhonoProbError:
+                    expected.append(None)
+            for num_cores in [-1, 2]:
+                results = list(iter_phonotactic_probability(c, iter(queries),
+                                        probability_type = probability_type,
+                                        batch_size = 3, num_cores = num_cores))
+                assert([r[0] for r in results] == queries)
+                assert([r[1] for r in results] == expected)
+                for q, score, missing in results:
+                    assert((score is None) == (missing != ''))
+            assert(results[len(queries) - 5][2] == 'Segments not found in the corpus: x, y')
+        assert(results[len(queries) - 4][2] == ('Segments not found in the corpus: ɑ, ɑ at position: 1; '
+                                'Segments not found in the corpus: ɑ, ɑ at position: 2'))
+
 #def test_iphod(self):
     #return
     #if not os.path.exists(TEST_DIR):
@@ -4,7 +4,9 @@ import os
 import pytest
 
 from corpustools.prod.pred_of_dist import (check_envs, calc_prod,
+                                        calc_prod_all_envs, calc_prod_pairs,
                                         EnvironmentFilter)
+from corpustools.exceptions import ProdError
 
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
@@ -130,3 +132,67 @@ def test_prod_wordtokens_type(specified_discourse_corpus):
 
 def test_prod_pronunciation_variants(pronunciation_variants_corpus):
     pass
+
+def test_check_envs_single_pass(unspecified_test_corpus):
+    vowels = ['ɑ', 'e', 'i', 'o', 'u']
+    env_list = [EnvironmentFilter(['s', 'ʃ'], [['#']], None),
+                EnvironmentFilter(['s', 'ʃ'], None, [['i']]),
+                EnvironmentFilter(['s', 'ʃ'], [vowels], [['ɑ', 'o'], ['m', 't']])]
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        env_matches, missing, overlapping = check_envs(c, env_list, None, None)
+        for env in env_list:
+            expected = {'s': 0, 'ʃ': 0}
+            for word in c:
+                found = word.transcription.find(env)
+                if found is not None:
+                    for e in found:
+                        expected[e.middle] += word.frequency
+            assert(env_matches[env] == expected)
+        expected_missing = {}
+        for word in c:
+            if not any(word.transcription.find(env) for env in env_list) and \
+                    any(m in word.transcription for m in ['s', 'ʃ']):
+                actual = word.transcription.find_nonmatch(env_list[0])
+                expected_missing.setdefault(str(actual), set()).add(str(word))
+        assert(dict(missing) == expected_missing)
+    #Word-initial segments before [i] are in the first two environments
+    key = (str(env_list[0]), str(env_list[1]))
+    assert(overlapping[key][str(key)] == {'shisata', 'ʃi'})
+
+def test_prod_pairs(specified_test_corpus):
+    envs = [EnvironmentFilter(['s', 'ʃ'], None, [specified_test_corpus.features_to_segments(k)])
+            for k in ['-voc', '+voc,+high', '+voc,-high']]
+    envs.append(EnvironmentFilter(['s', 'ʃ'], None, [['#']]))
+    pairs = [('s', 'ʃ'), ('t', 'n'), ('m', 'n'), ('ʃ', 's')]
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'token') as c:
+        for num_cores in [-1, 2]:
+            results = calc_prod_pairs(c, pairs, envs, strict = False, all_info = True,
+                                    num_cores = num_cores, chunk_size = 4)
+            assert(len(results) == len(pairs))
+            for pair, result in zip(pairs, results):
+                for env in envs:
+                    env.middle = set(pair)
+                expected = calc_prod(c, envs, strict = False, all_info = True)
+                assert(list(result.keys()) == list(expected.keys()))
+                for k, v in result.items():
+                    assert(abs(v[0] - expected[k][0]) < 1e-12)
+                    assert(v[1] == expected[k][1])
+                    #Frequencies are in the order of the pair
+                    assert(sorted(v[2:]) == sorted(expected[k][2:]))
+                    assert(v[2] == sum(expected[k][2:]) - v[3])
+        #Word-final vowels are not in any environment without [#], and
+        #word-initial [s] and [ʃ] are also in [#_]
+        for other_envs, good, bad in [(envs[:3], ('s', 'ʃ'), ('ɑ', 'i')),
+                                (envs + [EnvironmentFilter(['s'], [['#']])], ('o', 'i'), ('s', 'ʃ'))]:
+            assert(len(calc_prod_pairs(c, [good], other_envs)) == 1)
+            for env in other_envs:
+                env.middle = set(bad)
+            with pytest.raises(ProdError) as expected:
+                calc_prod(c, other_envs)
+            with pytest.raises(ProdError) as error:
+                calc_prod_pairs(c, [good, bad], other_envs)
+            assert(error.value.missing == expected.value.missing)
+            assert(error.value.overlapping == expected.value.overlapping)
+        results = calc_prod_pairs(c, pairs, all_info = True)
+        assert(results == [calc_prod_all_envs(c, seg1, seg2, all_info = True)
+                            for seg1, seg2 in pairs])
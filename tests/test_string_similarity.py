@@ -1 +1,73 @@
+import os
 
+import numpy as np
+import pytest
+
+from corpustools.symbolsim.all_pairs import all_pairs_similarity
+from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.contextmanagers import CanonicalVariantContext
+from corpustools.exceptions import StringSimilarityError
+
+def expected_matrix(c, words, algorithm):
+    expected = np.zeros((len(words), len(words)))
+    for i, w1 in enumerate(words):
+        for j, w2 in enumerate(words[i:], i):
+            expected[i, j] = expected[j, i] = string_similarity(c, (w1, w2), algorithm)[0][2]
+    return expected
+
+def test_all_pairs_matrix(specified_test_corpus, export_test_dir):
+    path = os.path.join(export_test_dir, 'all_pairs.npy')
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        for algorithm in ['edit_distance', 'khorsi', 'phono_edit_distance']:
+            for num_cores in [-1, 2]:
+                if os.path.exists(path + '.progress'):
+                    os.remove(path + '.progress')
+                words = all_pairs_similarity(c, algorithm, path, tile_size = 4,
+                                            num_cores = num_cores, dtype = 'float64')
+                matrix = np.load(path, mmap_mode = 'r')
+                assert(np.allclose(matrix, expected_matrix(c, words, algorithm)))
+
+def test_all_pairs_resume(specified_test_corpus, export_test_dir):
+    path = os.path.join(export_test_dir, 'all_pairs_edges.txt')
+    if os.path.exists(path + '.progress'):
+        os.remove(path + '.progress')
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        calls = []
+        def stop_check():
+            calls.append(None)
+            return len(calls) > 3
+        words = all_pairs_similarity(c, 'edit_distance', path, output_format = 'edges',
+                            max_rel = 3, tile_size = 3, stop_check = stop_check)
+        with open(path) as f:
+            partial = f.read().splitlines()
+        words = all_pairs_similarity(c, 'edit_distance', path, output_format = 'edges',
+                            max_rel = 3, tile_size = 3)
+        with open(path) as f:
+            edges = f.read().splitlines()
+        assert(0 < len(partial) < len(edges))
+        assert(edges[:len(partial)] == partial)
+        expected = expected_matrix(c, words, 'edit_distance')
+        expected = set((i, j) for i in range(len(words)) for j in range(i + 1, len(words))
+                        if expected[i, j] <= 3)
+        calced = [tuple(int(x) for x in line.split('\t')[:2]) for line in edges]
+        assert(len(calced) == len(expected))
+        assert(set(calced) == expected)
+
+def test_all_pairs_resume_mismatch(specified_test_corpus, export_test_dir):
+    path = os.path.join(export_test_dir, 'all_pairs_edges.txt')
+    if os.path.exists(path + '.progress'):
+        os.remove(path + '.progress')
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        calls = []
+        def stop_check():
+            calls.append(None)
+            return len(calls) > 3
+        all_pairs_similarity(c, 'edit_distance', path, output_format = 'edges',
+                            max_rel = 3, tile_size = 3, stop_check = stop_check)
+        with pytest.raises(StringSimilarityError):
+            all_pairs_similarity(c, 'edit_distance', path, output_format = 'edges',
+                            max_rel = 2, tile_size = 3)
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'token') as c:
+        with pytest.raises(StringSimilarityError):
+            all_pairs_similarity(c, 'edit_distance', path, output_format = 'edges',
+                            max_rel = 3, tile_size = 3)